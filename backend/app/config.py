@@ -11,6 +11,24 @@ class Config(BaseSettings):
     CLERK_API_URL: str
     CLERK_SECRET_KEY: str
     FRONTEND_URLS: str = "http://localhost:3000"
+    SOLVER_PROCESSES: int | None = None
+    SOLVER_BACKEND: str = "CP_SAT"
+    SOLVE_TIME_SECONDS: float = 60
+    SOLVE_MAX_TIME_SECONDS: float = 600
+    SOLVE_MAX_RELATIVE_GAP_LIMIT: float = 0.1
+    SOLVE_MAX_WORKERS: int = 8
+    SOLVE_CANCEL_POLL_SECONDS: float = 0.5
+    SOLVE_DIAGNOSTIC_TIME_SECONDS: float = 5
+    DIET_JOB_STREAM: str = "diet-jobs"
+    DIET_JOB_GROUP: str = "diet-solvers"
+    DIET_JOB_CLAIM_IDLE_SECONDS: int = 300
+    RUN_DIET_JOB_CONSUMER: bool = True
+    SOLUTION_CACHE_TTL_SECONDS: int = 60 * 60 * 24 * 7
+    PROFILE_FRAGMENT_TTL_SECONDS: int = 60 * 60 * 24 * 7
+    UNIT_REGISTRY_CHECK_SECONDS: int = 60
+    OPTIMIZER_LOAD_CONNECTIONS: int = 4
+    DIET_OUTPUT_LOCK_TIMEOUT_SECONDS: int = 30
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 60 * 60 * 24
 
     @property
     def CORS_ORIGINS(self) -> list[str]:
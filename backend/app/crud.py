@@ -1,6 +1,6 @@
 
 from app import models
-from sqlalchemy import or_, select
+from sqlalchemy import func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
@@ -288,20 +288,6 @@ async def get_child_ingredients_with_overrides(
     return [(x, ingredient_overrides_dict.get(x.id)) for x in ingredients]
 
 
-async def get_units(
-    db: AsyncSession,
-    ids: list[str],
-) -> list[models.Unit]:
-    units = await db.scalars(
-        select(models.Unit).where(
-            models.Unit.id.in_(ids),
-            models.Unit.archived == False,
-        )
-    )
-
-    return list(units)
-
-
 async def get_profile_ingredient_nutrient_values(
     db: AsyncSession,
     ids: list[int],
@@ -370,3 +356,27 @@ async def get_profiles(
     )
 
     return list(profiles)
+
+
+async def create_diet_output_version(
+    db: AsyncSession,
+    diet_id: int,
+    status: str,
+) -> models.DietOutputVersion:
+    version = (
+        await db.scalar(
+            select(func.max(models.DietOutputVersion.version)).where(
+                models.DietOutputVersion.diet_id == diet_id
+            )
+        )
+        or 0
+    ) + 1
+    diet_output_version = models.DietOutputVersion(
+        diet_id=diet_id,
+        status=status,
+        version=version,
+    )
+    db.add(diet_output_version)
+    await db.flush()
+
+    return diet_output_version
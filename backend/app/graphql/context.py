@@ -99,6 +99,25 @@ async def get_user(request: Request = None, websocket: WebSocket = None, connect
     return await JWTVerifier.verify(jwt_token)
 
 
+async def get_connection_user(info: Info) -> UserContext | None:
+    """
+    Websocket clients may only authenticate through their connection params,
+    which are not available when the request context is built.
+    """
+
+    if info.context.user is not None:
+        return info.context.user
+
+    if info.context.connection_params is None:
+        return None
+
+    auth_token = info.context.connection_params.get("authToken")
+    if auth_token is None:
+        return None
+
+    return await JWTVerifier.verify(auth_token.split(" ")[1])
+
+
 async def get_context(
     user: Annotated[UserContext | None, Depends(get_user)],
 ) -> Context:
@@ -3,6 +3,7 @@ from typing import Callable, Iterable, TypeVar
 from app import crud, models
 from app.db import DB
 from app.graphql import schemas
+from app.units import UNITS
 from strawberry.dataloader import DataLoader
 
 T = TypeVar("T")
@@ -72,12 +73,15 @@ async def _load_ingredient(
 async def _load_unit(
     keys: list[str],
 ) -> list["schemas.Unit"]:
-    async with DB.async_session() as db:
-        units = await crud.get_units(db, keys)
-        return [
-            schemas.Unit.from_model(unit)
-            for unit in _order_by_ids(keys, units, lambda unit: unit.id)
-        ]
+    units = await UNITS.get()
+    return [
+        schemas.Unit.from_model(unit)
+        for unit in _order_by_ids(
+            keys,
+            [unit for unit in units.values() if not unit.archived],
+            lambda unit: unit.id,
+        )
+    ]
 
 
 async def _load_profile_ingredient_nutrient_value(
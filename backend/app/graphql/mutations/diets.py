@@ -1,8 +1,9 @@
-from app import models
+from app import crud, jobs, models, optimizer
+from app.config import CONFIG
 from app.db import DB
 from app.graphql import context, schemas, utils
 from app.graphql.access import AuthError
-from app.optimizer import generate_diet
+from app.solver import SolveProfile
 from sqlalchemy import func, select
 
 
@@ -44,6 +45,11 @@ async def update_diet(
         if utils.is_set(input.description):
             diet.description = input.description
 
+        if utils.is_set(input.solver_backend):
+            diet.solver_backend = (
+                input.solver_backend.value if input.solver_backend is not None else None
+            )
+
         await db.commit()
 
         return schemas.Diet.from_model(diet)
@@ -129,27 +135,204 @@ async def update_diet_profiles(
         return schemas.Diet.from_model(diet)
 
 
+def _make_solve_profile(
+    input: "schemas.SolveProfileInput | None",
+) -> SolveProfile | None:
+    if input is None:
+        return None
+
+    if (
+        (input.max_time_in_seconds is not None and input.max_time_in_seconds <= 0)
+        or (input.relative_gap_limit is not None and input.relative_gap_limit < 0)
+        or (input.workers is not None and input.workers <= 0)
+    ):
+        raise Exception("Solve profile values must be positive")
+
+    # clients can ask for less effort than the server allows, never more
+    return SolveProfile(
+        max_time_in_seconds=min(
+            input.max_time_in_seconds or CONFIG.SOLVE_TIME_SECONDS,
+            CONFIG.SOLVE_MAX_TIME_SECONDS,
+        ),
+        relative_gap_limit=min(
+            input.relative_gap_limit or 0, CONFIG.SOLVE_MAX_RELATIVE_GAP_LIMIT
+        ),
+        workers=min(input.workers or 0, CONFIG.SOLVE_MAX_WORKERS),
+    )
+
+
 async def generate_diet_output(
     info: context.Info, input: "schemas.GenerateDietOutputInput"
 ) -> "schemas.DietOutputVersion":
     if not context.has_org(info.context.user):
         raise AuthError
 
+    solve_profile = _make_solve_profile(input.solve_profile)
+
     async with DB.async_session() as db:
         diet = await db.get(models.Diet, int(input.diet_id.node_id))
 
         if diet is None or diet.organization_id != info.context.user.org_id:
             raise Exception("Diet not found")
 
-        diet_output_version = await generate_diet(db, diet)
+        configuration_version = (
+            await db.scalar(
+                select(func.max(models.DietConfigurationVersion.version)).where(
+                    models.DietConfigurationVersion.diet_id == diet.id
+                )
+            )
+            or 0
+        )
+
+        # retries and concurrent requests for the same configuration share one
+        # solve, and versions are only numbered under the lock
+        async with jobs.lock_diet_outputs([diet.id]):
+            # a retry gets whatever its first request was answered with
+            job = await jobs.get_idempotent_diet_job(diet.id, input.idempotency_key)
+
+            if job is None:
+                job = await jobs.get_in_flight_diet_job(
+                    diet.id, configuration_version, solve_profile
+                )
+                diet_output_version = (
+                    await db.get(models.DietOutputVersion, (job.diet_id, job.version))
+                    if job is not None
+                    else None
+                )
+
+                if diet_output_version is None:
+                    diet_output_version = await crud.create_diet_output_version(
+                        db, diet.id, schemas.DietOutputStatus.QUEUED.value
+                    )
+                    await db.commit()
+
+                    # the solve happens on a job consumer, clients poll or
+                    # subscribe for the result
+                    job = jobs.DietJob(
+                        diet_id=diet_output_version.diet_id,
+                        version=diet_output_version.version,
+                        solve_profile=solve_profile,
+                    )
+                    await jobs.enqueue_diet_outputs(db, [(job, diet_output_version)])
+
+                await jobs.set_in_flight_diet_job(
+                    job, configuration_version, input.idempotency_key
+                )
+
+            await jobs.add_diet_job_watcher(
+                job, info.context.user.user_id, input.watch_key
+            )
+            diet_output_version = await db.get(
+                models.DietOutputVersion, (job.diet_id, job.version)
+            )
+
+        if diet_output_version is None:
+            raise Exception("Diet output version not found")
+
+        return schemas.DietOutputVersion.from_model(diet_output_version)
+
+
+async def generate_diet_outputs(
+    info: context.Info, input: "schemas.GenerateDietOutputsInput"
+) -> list["schemas.DietOutputVersion"]:
+    if not context.has_org(info.context.user):
+        raise AuthError
+
+    diet_ids = [int(diet_id.node_id) for diet_id in input.diet_ids]
+    async with DB.async_session() as db, jobs.lock_diet_outputs(diet_ids):
+        diet_output_versions = []
+        for diet_id in diet_ids:
+            diet = await db.get(models.Diet, diet_id)
+
+            if diet is None or diet.organization_id != info.context.user.org_id:
+                raise Exception("Diet not found")
+
+            if any(x.diet_id == diet.id for x in diet_output_versions):
+                raise Exception(f"Duplicate diet id: {diet_id}")
+
+            diet_output_versions.append(
+                await crud.create_diet_output_version(
+                    db, diet.id, schemas.DietOutputStatus.QUEUED.value
+                )
+            )
         await db.commit()
-        db.expunge_all()
+
+        # one entry per diet, so every solve takes its own consumer slot and
+        # is claimed on its own
+        await jobs.enqueue_diet_outputs(
+            db,
+            [
+                (
+                    jobs.DietJob(
+                        diet_id=diet_output_version.diet_id,
+                        version=diet_output_version.version,
+                    ),
+                    diet_output_version,
+                )
+                for diet_output_version in diet_output_versions
+            ],
+        )
+
+        return [
+            schemas.DietOutputVersion.from_model(diet_output_version)
+            for diet_output_version in diet_output_versions
+        ]
+
+
+async def cancel_diet_generation(
+    info: context.Info, input: "schemas.CancelDietGenerationInput"
+) -> "schemas.DietOutputVersion":
+    if not context.has_org(info.context.user):
+        raise AuthError
+
+    async with DB.async_session() as db:
+        diet = await db.get(models.Diet, int(input.diet_id.node_id))
+
+        if diet is None or diet.organization_id != info.context.user.org_id:
+            raise Exception("Diet not found")
+
         diet_output_version = await db.get(
-            models.DietOutputVersion,
-            (diet_output_version.diet_id, diet_output_version.version),
+            models.DietOutputVersion, (diet.id, input.version)
         )
 
         if diet_output_version is None:
-            raise Exception("Diet output not found after generation")
+            raise Exception("Diet output version not found")
+
+        # a running solve reports CANCELLED once its solver has stopped
+        await jobs.cancel_diet_output(db, diet_output_version)
 
         return schemas.DietOutputVersion.from_model(diet_output_version)
+
+
+async def solve_diet_cost_scenarios(
+    info: context.Info, input: "schemas.SolveDietCostScenariosInput"
+) -> list["schemas.DietCostScenario"]:
+    if not context.has_org(info.context.user):
+        raise AuthError
+
+    async with DB.async_session() as db:
+        diet = await db.get(models.Diet, int(input.diet_id.node_id))
+
+        if diet is None or diet.organization_id != info.context.user.org_id:
+            raise Exception("Diet not found")
+
+        formulations = await optimizer.generate_cost_scenarios(
+            diet,
+            cost_multipliers=[
+                {
+                    int(cost_override.ingredient_id.node_id): cost_override.multiplier
+                    for cost_override in scenario.cost_overrides
+                }
+                for scenario in input.scenarios
+            ],
+        )
+
+        return [
+            schemas.DietCostScenario.from_outputs(
+                scenario.name,
+                formulation.status,
+                formulation.ingredient_outputs,
+                formulation.summary_output,
+            )
+            for scenario, formulation in zip(input.scenarios, formulations)
+        ]
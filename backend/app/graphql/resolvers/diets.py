@@ -1,10 +1,12 @@
-from typing import Iterable, Optional
+import contextlib
+from typing import AsyncGenerator, Iterable, Optional
 
-from app import models
+from app import jobs, models, optimizer
 from app.db import DB
 from app.graphql import context, schemas, utils
 from app.graphql.access import AuthError
 from sqlalchemy import func, select
+from strawberry import relay
 
 
 async def get_diets(info: "context.Info") -> list["schemas.Diet"]:
@@ -24,6 +26,33 @@ async def get_diets(info: "context.Info") -> list["schemas.Diet"]:
         return [schemas.Diet.from_model(diet) for diet in diets]
 
 
+async def get_slow_diet_output_versions(
+    info: "context.Info", min_seconds: float, limit: int = 50
+) -> list["schemas.DietOutputVersion"]:
+    if not context.has_org(info.context.user):
+        raise AuthError
+
+    total_seconds = (
+        func.coalesce(models.DietOutputVersion.load_seconds, 0)
+        + func.coalesce(models.DietOutputVersion.build_seconds, 0)
+        + func.coalesce(models.DietOutputVersion.solve_seconds, 0)
+        + func.coalesce(models.DietOutputVersion.decode_seconds, 0)
+    )
+    async with DB.async_session() as db:
+        versions = await db.scalars(
+            select(models.DietOutputVersion)
+            .join(models.Diet)
+            .where(
+                models.Diet.organization_id == info.context.user.org_id,
+                total_seconds >= min_seconds,
+            )
+            .order_by(total_seconds.desc())
+            .limit(limit)
+        )
+
+        return [schemas.DietOutputVersion.from_model(x) for x in versions]
+
+
 async def resolve_diet_nodes(
     info: "context.Info", node_ids: Iterable[str], required: bool = False
 ) -> list[Optional["schemas.Diet"]]:
@@ -318,3 +347,129 @@ async def resolve_diet_output_version_ingredients(
         )
 
         return [schemas.DietIngredientOutput.from_model(x) for x in ingredients]
+
+
+async def resolve_diet_output_version_conflicts(
+    info: "context.Info", node_id: str
+) -> "schemas.DietOutputConflicts":
+    if not context.has_org(info.context.user):
+        raise AuthError
+
+    diet_id, version = schemas.DietOutputVersion.parse_node_id(node_id)
+    async with DB.async_session() as db:
+        conflicts = list(
+            await db.scalars(
+                select(models.DietOutputConflict).where(
+                    models.DietOutputConflict.diet_id == diet_id,
+                    models.DietOutputConflict.version == version,
+                )
+            )
+        )
+
+        ingredient_constraints = await db.scalars(
+            select(models.ProfileIngredientConstraint)
+            .where(
+                models.ProfileIngredientConstraint.id.in_(
+                    x.profile_ingredient_constraint_id for x in conflicts
+                )
+            )
+            .order_by(models.ProfileIngredientConstraint.id)
+        )
+        nutrient_constraints = await db.scalars(
+            select(models.ProfileNutrientConstraint)
+            .where(
+                models.ProfileNutrientConstraint.id.in_(
+                    x.profile_nutrient_constraint_id for x in conflicts
+                )
+            )
+            .order_by(models.ProfileNutrientConstraint.id)
+        )
+        profile_constraints = await db.scalars(
+            select(models.ProfileConstraint)
+            .where(
+                models.ProfileConstraint.id.in_(
+                    x.profile_constraint_id for x in conflicts
+                )
+            )
+            .order_by(models.ProfileConstraint.id)
+        )
+
+        return schemas.DietOutputConflicts(
+            ingredient_constraints=[
+                schemas.ProfileIngredientConstraint.from_model(x)
+                for x in ingredient_constraints
+            ],
+            nutrient_constraints=[
+                schemas.ProfileNutrientConstraint.from_model(x)
+                for x in nutrient_constraints
+            ],
+            profile_constraints=[
+                schemas.ProfileConstraint.from_model(x) for x in profile_constraints
+            ],
+        )
+
+
+def _watch_diet_jobs(user: "context.UserContext", watch_key: str | None):
+    # solves generated with the subscription's watch key are cancelled once it
+    # disconnects
+    if watch_key is not None:
+        return jobs.watch_diet_jobs(user.user_id, watch_key)
+
+    return contextlib.nullcontext()
+
+
+async def subscribe_diet_output_versions(
+    info: "context.Info", diet_id: relay.GlobalID, watch_key: str | None = None
+) -> AsyncGenerator["schemas.DietOutputVersion", None]:
+    user = await context.get_connection_user(info)
+    if not context.has_org(user):
+        raise AuthError
+
+    async with DB.async_session() as db:
+        diet = await db.get(models.Diet, int(diet_id.node_id))
+
+        if diet is None or diet.organization_id != user.org_id:
+            raise Exception("Diet not found")
+
+    async with _watch_diet_jobs(user, watch_key):
+        async for state in jobs.subscribe_diet_jobs(diet.id):
+            yield schemas.DietOutputVersion.from_model(
+                models.DietOutputVersion(
+                    diet_id=state.diet_id,
+                    version=state.version,
+                    status=state.status,
+                )
+            )
+
+
+async def subscribe_diet_solve_progress(
+    info: "context.Info", diet_id: relay.GlobalID, watch_key: str | None = None
+) -> AsyncGenerator["schemas.DietSolveProgress", None]:
+    user = await context.get_connection_user(info)
+    if not context.has_org(user):
+        raise AuthError
+
+    async with DB.async_session() as db:
+        diet = await db.get(models.Diet, int(diet_id.node_id))
+
+        if diet is None or diet.organization_id != user.org_id:
+            raise Exception("Diet not found")
+
+    async with _watch_diet_jobs(user, watch_key):
+        async for progress in optimizer.subscribe_solve_progress(diet.id):
+            yield schemas.DietSolveProgress(
+                diet_id=utils.global_id(schemas.Diet, progress.diet_id),
+                version=progress.version,
+                objective_value=progress.objective_value,
+                objective_bound=progress.objective_bound,
+                wall_seconds=progress.wall_seconds,
+                ingredients=[
+                    schemas.DietSolveProgressIngredient(
+                        ingredient_id=utils.global_id(
+                            schemas.Ingredient, ingredient_id
+                        ),
+                        share=share,
+                    )
+                    for ingredient_id, share in progress.ingredient_shares.items()
+                ],
+            )
@@ -1,11 +1,11 @@
 from enum import Enum
-from typing import Iterable, Optional
+from typing import AsyncGenerator, Iterable, Optional
 
 import strawberry
 import strawberry.fastapi
 from app import models
 from app.graphql import mutations, resolvers
-from app.graphql.auth import IsAuthenticatedWithOrganization
+from app.graphql.auth import IsAuthenticatedWithOrganization, WSIsAuthenticated
 from app.graphql.context import Info, get_context
 from app.graphql.utils import global_id, strawberry_id
 from strawberry import relay
@@ -887,11 +887,14 @@ class DietConfigurationVersion(relay.Node):
 
 @strawberry.enum
 class DietOutputStatus(Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
     UNKNOWN = "UNKNOWN"
     MODEL_INVALID = "MODEL_INVALID"
     INFEASIBLE = "INFEASIBLE"
     OPTIMAL = "OPTIMAL"
     FEASIBLE = "FEASIBLE"
+    CANCELLED = "CANCELLED"
 
 
 @strawberry.type
@@ -1279,12 +1282,79 @@ class DietSummaryOutput(relay.Node):
         )  # type: ignore
 
 
+@strawberry.type
+class DietOutputConflicts:
+    ingredient_constraints: list[ProfileIngredientConstraint]
+    nutrient_constraints: list[ProfileNutrientConstraint]
+    profile_constraints: list[ProfileConstraint]
+
+
+@strawberry.type
+class DietOutputStatistics:
+    load_seconds: float | None
+    build_seconds: float | None
+    solve_seconds: float | None
+    decode_seconds: float | None
+    solver_conflicts: int | None
+    solver_branches: int | None
+    objective_value: float | None
+    objective_bound: float | None
+    relative_gap: float | None
+    variable_count: int | None
+    constraint_count: int | None
+
+    @staticmethod
+    def from_model(
+        version: models.DietOutputVersion,
+    ) -> Optional["DietOutputStatistics"]:
+        if version.load_seconds is None:
+            return None
+
+        return DietOutputStatistics(
+            load_seconds=version.load_seconds,
+            build_seconds=version.build_seconds,
+            solve_seconds=version.solve_seconds,
+            decode_seconds=version.decode_seconds,
+            solver_conflicts=version.solver_conflicts,
+            solver_branches=version.solver_branches,
+            objective_value=version.objective_value,
+            objective_bound=version.objective_bound,
+            relative_gap=version.relative_gap,
+            variable_count=version.variable_count,
+            constraint_count=version.constraint_count,
+        )
+
+
+@strawberry.type
+class DietSolveProgressIngredient:
+    ingredient_id: relay.GlobalID
+    # share of the diet
+    share: float
+
+    @strawberry.field
+    async def ingredient(self, info: Info) -> Ingredient:
+        return await info.context.loaders.ingredient.load(
+            int(self.ingredient_id.node_id)
+        )
+
+
+@strawberry.type
+class DietSolveProgress:
+    diet_id: relay.GlobalID
+    version: int
+    objective_value: float
+    objective_bound: float
+    wall_seconds: float
+    ingredients: list[DietSolveProgressIngredient]
+
+
 @strawberry.type
 class DietOutputVersion(relay.Node):
     id: relay.NodeID[strawberry.ID]
     diet_id: relay.GlobalID
     version: int
     status: DietOutputStatus
+    statistics: DietOutputStatistics | None
 
     @strawberry.field
     async def summary_output(self, info: Info) -> DietSummaryOutput:
@@ -1300,6 +1370,13 @@ class DietOutputVersion(relay.Node):
             self.id,
         )
 
+    @strawberry.field
+    async def conflicts(self, info: Info) -> DietOutputConflicts:
+        return await resolvers.diets.resolve_diet_output_version_conflicts(
+            info,
+            self.id,
+        )
+
     @staticmethod
     def from_model(
         version: models.DietOutputVersion,
@@ -1309,6 +1386,7 @@ class DietOutputVersion(relay.Node):
             diet_id=global_id(Diet, version.diet_id),
             version=version.version,
             status=DietOutputStatus(version.status),
+            statistics=DietOutputStatistics.from_model(version),
         )
 
     @staticmethod
@@ -1333,12 +1411,22 @@ class DietOutputVersion(relay.Node):
         )  # type: ignore
 
 
+@strawberry.enum
+class SolverBackend(Enum):
+    CP_SAT = "CP_SAT"
+    GLOP = "GLOP"
+    PDLP = "PDLP"
+    # race the backends that can express the diet and keep the first proof
+    PORTFOLIO = "PORTFOLIO"
+
+
 @strawberry.type
 class Diet(relay.Node):
     id: relay.NodeID[strawberry.ID]
     organization_id: str
     name: str
     description: str | None
+    solver_backend: SolverBackend | None
 
     @strawberry.field
     async def latest_configuration_version(
@@ -1363,6 +1451,11 @@ class Diet(relay.Node):
             organization_id=diet.organization_id,
             name=diet.name,
             description=diet.description,
+            solver_backend=(
+                SolverBackend(diet.solver_backend)
+                if diet.solver_backend is not None
+                else None
+            ),
         )
 
     @classmethod
@@ -1372,6 +1465,84 @@ class Diet(relay.Node):
         return await resolvers.diets.resolve_diet_nodes(info, node_ids, required)  # type: ignore
 
 
+@strawberry.type
+class DietCostScenarioIngredient:
+    ingredient_id: relay.GlobalID
+    amount: float
+    amount_unit_id: relay.GlobalID
+    cost: float | None
+    cost_unit_id: relay.GlobalID | None
+
+    @strawberry.field
+    async def ingredient(self, info: Info) -> Ingredient:
+        return await info.context.loaders.ingredient.load(
+            int(self.ingredient_id.node_id)
+        )
+
+    @strawberry.field
+    async def amount_unit(self, info: Info) -> Unit:
+        return await info.context.loaders.unit.load(self.amount_unit_id.node_id)
+
+    @strawberry.field
+    async def cost_unit(self, info: Info) -> Optional[Unit]:
+        if self.cost_unit_id is None:
+            return None
+
+        return await info.context.loaders.unit.load(self.cost_unit_id.node_id)
+
+    @staticmethod
+    def from_model(output: models.DietIngredientOutput) -> "DietCostScenarioIngredient":
+        return DietCostScenarioIngredient(
+            ingredient_id=global_id(Ingredient, output.ingredient_id),
+            amount=output.amount,
+            amount_unit_id=global_id(Unit, output.amount_unit_id),
+            cost=output.cost,
+            cost_unit_id=(
+                None
+                if output.cost_unit_id is None
+                else global_id(Unit, output.cost_unit_id)
+            ),
+        )
+
+
+@strawberry.type
+class DietCostScenario:
+    name: str | None
+    status: DietOutputStatus
+    cost: float | None
+    cost_unit_id: relay.GlobalID | None
+    ingredients: list[DietCostScenarioIngredient]
+
+    @strawberry.field
+    async def cost_unit(self, info: Info) -> Optional[Unit]:
+        if self.cost_unit_id is None:
+            return None
+
+        return await info.context.loaders.unit.load(self.cost_unit_id.node_id)
+
+    @staticmethod
+    def from_outputs(
+        name: str | None,
+        status: str,
+        ingredient_outputs: list[models.DietIngredientOutput],
+        summary_output: models.DietSummaryOutput | None,
+    ) -> "DietCostScenario":
+        return DietCostScenario(
+            name=name,
+            status=DietOutputStatus(status),
+            cost=None if summary_output is None else summary_output.cost,
+            cost_unit_id=(
+                None
+                if summary_output is None or summary_output.cost_unit_id is None
+                else global_id(Unit, summary_output.cost_unit_id)
+            ),
+            ingredients=[
+                DietCostScenarioIngredient.from_model(output)
+                for output in ingredient_outputs
+            ],
+        )
+
+
 @strawberry.input
 class DeleteNodeInput:
     ids: list[relay.GlobalID]
@@ -1616,6 +1787,7 @@ class UpdateDietInput:
     id: relay.GlobalID
     name: str | None = strawberry.UNSET
     description: str | None = strawberry.UNSET
+    solver_backend: SolverBackend | None = strawberry.UNSET
 
 
 @strawberry.input
@@ -1624,9 +1796,51 @@ class UpdateDietProfilesInput:
     profile_ids: list[relay.GlobalID]
 
 
+@strawberry.input
+class SolveProfileInput:
+    # each is capped by the server, unset ones use the server default
+    max_time_in_seconds: float | None = None
+    relative_gap_limit: float | None = None
+    workers: int | None = None
+
+
 @strawberry.input
 class GenerateDietOutputInput:
     diet_id: relay.GlobalID
+    # retries with the same key get the output version of the first request
+    idempotency_key: str | None = None
+    solve_profile: SolveProfileInput | None = None
+    # cancel the solve once the subscription holding this watch key disconnects
+    watch_key: str | None = None
+
+
+@strawberry.input
+class GenerateDietOutputsInput:
+    diet_ids: list[relay.GlobalID]
+
+
+@strawberry.input
+class CancelDietGenerationInput:
+    diet_id: relay.GlobalID
+    version: int
+
+
+@strawberry.input
+class IngredientCostOverrideInput:
+    ingredient_id: relay.GlobalID
+    multiplier: float
+
+
+@strawberry.input
+class DietCostScenarioInput:
+    name: str | None = None
+    cost_overrides: list[IngredientCostOverrideInput]
+
+
+@strawberry.input
+class SolveDietCostScenariosInput:
+    diet_id: relay.GlobalID
+    scenarios: list[DietCostScenarioInput]
 
 
 @strawberry.type
@@ -1677,6 +1891,10 @@ class Query:
         resolver=resolvers.diets.get_diets,
         permission_classes=[IsAuthenticatedWithOrganization],
     )
+    slow_diet_output_versions: list[DietOutputVersion] = strawberry.field(
+        resolver=resolvers.diets.get_slow_diet_output_versions,
+        permission_classes=[IsAuthenticatedWithOrganization],
+    )
 
 
 @strawberry.type
@@ -1848,9 +2066,38 @@ class Mutation:
         resolver=mutations.diets.generate_diet_output,
         permission_classes=[IsAuthenticatedWithOrganization],
     )
+    generate_diet_outputs: list[DietOutputVersion] = strawberry.field(
+        resolver=mutations.diets.generate_diet_outputs,
+        permission_classes=[IsAuthenticatedWithOrganization],
+    )
+    cancel_diet_generation: DietOutputVersion = strawberry.field(
+        resolver=mutations.diets.cancel_diet_generation,
+        permission_classes=[IsAuthenticatedWithOrganization],
+    )
+    solve_diet_cost_scenarios: list[DietCostScenario] = strawberry.field(
+        resolver=mutations.diets.solve_diet_cost_scenarios,
+        permission_classes=[IsAuthenticatedWithOrganization],
+    )
+
+
+@strawberry.type
+class Subscription:
+    # diets
+    diet_output_versions: AsyncGenerator[DietOutputVersion, None] = (
+        strawberry.subscription(
+            resolver=resolvers.diets.subscribe_diet_output_versions,
+            permission_classes=[WSIsAuthenticated],
+        )
+    )
+    diet_solve_progress: AsyncGenerator[DietSolveProgress, None] = (
+        strawberry.subscription(
+            resolver=resolvers.diets.subscribe_diet_solve_progress,
+            permission_classes=[WSIsAuthenticated],
+        )
+    )
 
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(query=Query, mutation=Mutation, subscription=Subscription)
 
 graphql_app = strawberry.fastapi.GraphQLRouter(
     schema,
@@ -0,0 +1,553 @@
+import asyncio
+import logging
+import os
+import socket
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime
+from typing import AsyncGenerator
+
+from app import models, optimizer
+from app.config import CONFIG
+from app.db import DB
+from app.graphql import schemas
+from app.redis import REDIS
+from app.solver import SolveProfile
+from pydantic import BaseModel
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+JOB_STATE_TTL_SECONDS = 60 * 60 * 24
+CONSUMER_MAX_BACKOFF_SECONDS = 30
+
+
+class DietJob(BaseModel):
+    diet_id: int
+    version: int
+    solve_profile: SolveProfile | None = None
+
+
+class DietJobState(BaseModel):
+    diet_id: int
+    version: int
+    status: str
+    updated_at: datetime
+
+
+def _job_key(job: DietJob) -> str:
+    return f"diet-job:{job.diet_id}:{job.version}"
+
+
+def _job_channel(diet_id: int) -> str:
+    return f"diet-job-events:{diet_id}"
+
+
+def _output_lock_key(diet_id: int) -> str:
+    return f"diet-output-lock:{diet_id}"
+
+
+def _in_flight_key(
+    diet_id: int,
+    configuration_version: int,
+    solve_profile: SolveProfile | None,
+) -> str:
+    # a quick preview never stands in for a full solve, or the other way round
+    solve_profile_key = (
+        solve_profile.model_dump_json() if solve_profile is not None else ""
+    )
+    return (
+        f"diet-output-in-flight:{diet_id}:{configuration_version}:{solve_profile_key}"
+    )
+
+
+def _idempotency_key(diet_id: int, idempotency_key: str) -> str:
+    return f"diet-output-idempotent-job:{diet_id}:{idempotency_key}"
+
+
+def _watcher(user_id: str, watch_key: str | None) -> str:
+    # stands in for a request that never asked for its job to be cancelled
+    if watch_key is None:
+        return "*"
+
+    return f"{user_id}:{watch_key}"
+
+
+def _job_watchers_key(job: DietJob) -> str:
+    return f"diet-job-watchers:{job.diet_id}:{job.version}"
+
+
+def _watched_jobs_key(watcher: str) -> str:
+    return f"diet-job-watch:{watcher}"
+
+
+async def set_diet_job_status(job: DietJob, status: "schemas.DietOutputStatus") -> None:
+    state = DietJobState(
+        diet_id=job.diet_id,
+        version=job.version,
+        status=status.value,
+        updated_at=datetime.now(),
+    )
+
+    async with REDIS.get_connection() as conn:
+        await conn.set(_job_key(job), state.model_dump_json(), ex=JOB_STATE_TTL_SECONDS)
+        await conn.publish(_job_channel(job.diet_id), state.model_dump_json())
+
+
+async def get_diet_job_state(job: DietJob) -> DietJobState | None:
+    async with REDIS.get_connection() as conn:
+        state = await conn.get(_job_key(job))
+
+    if state is None:
+        return None
+
+    return DietJobState.model_validate_json(state)
+
+
+async def subscribe_diet_jobs(diet_id: int) -> AsyncGenerator[DietJobState, None]:
+    async with REDIS.get_connection() as conn:
+        async with conn.pubsub() as pubsub:
+            await pubsub.subscribe(_job_channel(diet_id))
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+
+                yield DietJobState.model_validate_json(message["data"])
+
+
+@asynccontextmanager
+async def lock_diet_outputs(diet_ids: list[int]) -> AsyncGenerator[None, None]:
+    """
+    Hold the output lock of every diet, so new output versions can be numbered
+    and in-flight solves looked up without racing other API pods. Locks are
+    taken in id order so overlapping batches can't deadlock.
+    """
+
+    async with REDIS.get_connection() as conn, AsyncExitStack() as stack:
+        for diet_id in sorted(set(diet_ids)):
+            await stack.enter_async_context(
+                conn.lock(
+                    _output_lock_key(diet_id),
+                    timeout=CONFIG.DIET_OUTPUT_LOCK_TIMEOUT_SECONDS,
+                    blocking_timeout=CONFIG.DIET_OUTPUT_LOCK_TIMEOUT_SECONDS,
+                )
+            )
+
+        yield
+
+
+async def get_idempotent_diet_job(
+    diet_id: int, idempotency_key: str | None
+) -> DietJob | None:
+    """
+    The job a request's idempotency key was first answered with, whatever its
+    state. Call with the diet's output lock held.
+    """
+
+    if idempotency_key is None:
+        return None
+
+    async with REDIS.get_connection() as conn:
+        job = await conn.get(_idempotency_key(diet_id, idempotency_key))
+
+    if job is None:
+        return None
+
+    return DietJob.model_validate_json(job)
+
+
+async def get_in_flight_diet_job(
+    diet_id: int,
+    configuration_version: int,
+    solve_profile: SolveProfile | None,
+) -> DietJob | None:
+    """
+    The job a request should share instead of starting its own: the solve of
+    the same diet configuration and solve profile that is still queued or
+    running. Call with the diet's output lock held.
+    """
+
+    async with REDIS.get_connection() as conn:
+        version = await conn.get(
+            _in_flight_key(diet_id, configuration_version, solve_profile)
+        )
+
+    if version is None:
+        return None
+
+    job = DietJob(diet_id=diet_id, version=int(version), solve_profile=solve_profile)
+    state = await get_diet_job_state(job)
+    if state is None or schemas.DietOutputStatus(state.status) not in (
+        schemas.DietOutputStatus.QUEUED,
+        schemas.DietOutputStatus.RUNNING,
+    ):
+        return None
+
+    return job
+
+
+async def set_in_flight_diet_job(
+    job: DietJob, configuration_version: int, idempotency_key: str | None
+) -> None:
+    async with REDIS.get_connection() as conn:
+        await conn.set(
+            _in_flight_key(job.diet_id, configuration_version, job.solve_profile),
+            job.version,
+            ex=JOB_STATE_TTL_SECONDS,
+        )
+
+        if idempotency_key is not None:
+            # the whole job, so a retry can't pass its own solve profile off
+            # as the one the job is solving with
+            await conn.set(
+                _idempotency_key(job.diet_id, idempotency_key),
+                job.model_dump_json(),
+                ex=CONFIG.IDEMPOTENCY_KEY_TTL_SECONDS,
+            )
+
+
+async def cancel_diet_output(
+    db: AsyncSession, diet_output_version: models.DietOutputVersion
+) -> None:
+    """
+    Stop the solve of a queued or running output version. A queued one is
+    cancelled right away; a running one once its solver notices the request and
+    stops, which frees its slot for the next job in the stream.
+    """
+
+    status = schemas.DietOutputStatus(diet_output_version.status)
+    if status not in (
+        schemas.DietOutputStatus.QUEUED,
+        schemas.DietOutputStatus.RUNNING,
+    ):
+        return
+
+    await optimizer.cancel_solve(
+        diet_output_version.diet_id, diet_output_version.version
+    )
+
+    if status == schemas.DietOutputStatus.QUEUED:
+        diet_output_version.status = schemas.DietOutputStatus.CANCELLED.value
+        await db.commit()
+        await set_diet_job_status(
+            _make_diet_job(diet_output_version), schemas.DietOutputStatus.CANCELLED
+        )
+
+
+async def add_diet_job_watcher(
+    job: DietJob, user_id: str, watch_key: str | None
+) -> None:
+    """
+    Record a request waiting on a job. Requests without a watch key never want
+    the job cancelled for them, so a job shared with one is never cancelled on
+    disconnect.
+    """
+
+    watcher = _watcher(user_id, watch_key)
+    async with REDIS.get_connection() as conn:
+        await conn.sadd(_job_watchers_key(job), watcher)
+        await conn.expire(_job_watchers_key(job), JOB_STATE_TTL_SECONDS)
+
+        if watch_key is not None:
+            await conn.sadd(_watched_jobs_key(watcher), _job_key(job))
+            await conn.expire(_watched_jobs_key(watcher), JOB_STATE_TTL_SECONDS)
+
+
+@asynccontextmanager
+async def watch_diet_jobs(user_id: str, watch_key: str) -> AsyncGenerator[None, None]:
+    """
+    Hold a watch key for as long as a subscription stays connected. When it
+    goes away, the jobs generated with the key are cancelled unless another
+    request is still waiting on them.
+    """
+
+    try:
+        yield
+    finally:
+        await _release_diet_job_watcher(_watcher(user_id, watch_key))
+
+
+async def _release_diet_job_watcher(watcher: str) -> None:
+    orphaned = []
+    async with REDIS.get_connection() as conn:
+        job_keys = await conn.smembers(_watched_jobs_key(watcher))
+        await conn.delete(_watched_jobs_key(watcher))
+
+        for job_key in job_keys:
+            _, diet_id, version = job_key.decode().split(":")
+            job = DietJob(diet_id=int(diet_id), version=int(version))
+            await conn.srem(_job_watchers_key(job), watcher)
+            if not await conn.exists(_job_watchers_key(job)):
+                orphaned.append(job)
+
+    if not orphaned:
+        return
+
+    async with DB.session_maker() as db:
+        for job in orphaned:
+            diet_output_version = await db.get(
+                models.DietOutputVersion, (job.diet_id, job.version)
+            )
+            if diet_output_version is not None:
+                await cancel_diet_output(db, diet_output_version)
+
+
+async def _is_cancelled(diet_output_version: models.DietOutputVersion) -> bool:
+    if diet_output_version.status == schemas.DietOutputStatus.CANCELLED.value:
+        return True
+
+    return await optimizer.is_solve_cancelled(
+        diet_output_version.diet_id, diet_output_version.version
+    )
+
+
+async def enqueue_diet_job(job: DietJob) -> None:
+    await set_diet_job_status(job, schemas.DietOutputStatus.QUEUED)
+
+    async with REDIS.get_connection() as conn:
+        await conn.xadd(CONFIG.DIET_JOB_STREAM, {"job": job.model_dump_json()})
+
+
+async def enqueue_diet_outputs(
+    db: AsyncSession, queued: list[tuple[DietJob, models.DietOutputVersion]]
+) -> None:
+    """
+    Enqueue the jobs of committed QUEUED output versions. If that fails, the
+    versions not enqueued yet are marked UNKNOWN, since no consumer will ever
+    pick them up.
+    """
+
+    for i, (job, _) in enumerate(queued):
+        try:
+            await enqueue_diet_job(job)
+        except Exception:
+            for _, diet_output_version in queued[i:]:
+                diet_output_version.status = schemas.DietOutputStatus.UNKNOWN.value
+            await db.commit()
+
+            for job, _ in queued[i:]:
+                try:
+                    await set_diet_job_status(job, schemas.DietOutputStatus.UNKNOWN)
+                except Exception:
+                    logging.exception(f"Failed to publish diet job status: {job}")
+
+            raise
+
+
+async def _set_unfinished_diet_output_status(
+    db: AsyncSession, job: DietJob, status: "schemas.DietOutputStatus"
+) -> bool:
+    """
+    Move a queued or running output version on to `status` and commit. Returns
+    False, changing nothing, if the version has already finished.
+    """
+
+    result = await db.execute(
+        update(models.DietOutputVersion)
+        .where(
+            models.DietOutputVersion.diet_id == job.diet_id,
+            models.DietOutputVersion.version == job.version,
+            models.DietOutputVersion.status.in_(
+                [
+                    schemas.DietOutputStatus.QUEUED.value,
+                    schemas.DietOutputStatus.RUNNING.value,
+                ]
+            ),
+        )
+        .values(status=status.value)
+    )
+    await db.commit()
+
+    return result.rowcount > 0
+
+
+async def run_diet_job(job: DietJob) -> None:
+    async with DB.async_session() as db:
+        diet = await db.get(models.Diet, job.diet_id)
+        diet_output_version = await db.get(
+            models.DietOutputVersion, (job.diet_id, job.version)
+        )
+
+        if diet is None or diet_output_version is None:
+            logging.warning(f"Dropping diet job for missing output: {job}")
+            return
+
+        # a redelivered or reclaimed entry of a job that already finished
+        if schemas.DietOutputStatus(diet_output_version.status) not in (
+            schemas.DietOutputStatus.QUEUED,
+            schemas.DietOutputStatus.RUNNING,
+        ):
+            logging.info(f"Dropping diet job for finished output: {job}")
+            return
+
+        if await _is_cancelled(diet_output_version):
+            if await _set_unfinished_diet_output_status(
+                db, job, schemas.DietOutputStatus.CANCELLED
+            ):
+                await set_diet_job_status(job, schemas.DietOutputStatus.CANCELLED)
+            return
+
+        if not await _set_unfinished_diet_output_status(
+            db, job, schemas.DietOutputStatus.RUNNING
+        ):
+            logging.info(f"Dropping diet job for finished output: {job}")
+            return
+
+        await set_diet_job_status(job, schemas.DietOutputStatus.RUNNING)
+
+        try:
+            await optimizer.generate_diet(
+                db, diet, diet_output_version, job.solve_profile
+            )
+            await db.commit()
+        except Exception:
+            logging.exception(f"Diet job failed: {job}")
+            await db.rollback()
+
+            # never stamp over a result that did get written
+            await _set_unfinished_diet_output_status(
+                db, job, schemas.DietOutputStatus.UNKNOWN
+            )
+
+        await db.refresh(diet_output_version)
+        await set_diet_job_status(
+            job, schemas.DietOutputStatus(diet_output_version.status)
+        )
+
+
+def _make_diet_job(diet_output_version: models.DietOutputVersion) -> DietJob:
+    return DietJob(
+        diet_id=diet_output_version.diet_id, version=diet_output_version.version
+    )
+
+
+async def _ensure_consumer_group() -> None:
+    async with REDIS.get_connection() as conn:
+        try:
+            await conn.xgroup_create(
+                CONFIG.DIET_JOB_STREAM,
+                CONFIG.DIET_JOB_GROUP,
+                id="0",
+                mkstream=True,
+            )
+        except ResponseError as e:
+            # the group already exists
+            if "BUSYGROUP" not in str(e):
+                raise
+
+
+async def _heartbeat(consumer: str, message_id: bytes) -> None:
+    # claiming the entry again resets its idle time, so it is only picked up by
+    # another consumer once this one stops beating, however long the solve is
+    while True:
+        await asyncio.sleep(CONFIG.DIET_JOB_CLAIM_IDLE_SECONDS / 3)
+        try:
+            async with REDIS.get_connection() as conn:
+                await conn.xclaim(
+                    CONFIG.DIET_JOB_STREAM,
+                    CONFIG.DIET_JOB_GROUP,
+                    consumer,
+                    min_idle_time=0,
+                    message_ids=[message_id],
+                    justid=True,
+                )
+        except Exception:
+            logging.exception(f"Diet job heartbeat failed: {message_id!r}")
+
+
+async def _run_and_ack(
+    consumer: str, message_id: bytes, fields: dict[bytes, bytes]
+) -> None:
+    # a job that is cancelled part way stays pending, so another consumer
+    # claims and reruns it. One that fails is acked, rerunning won't fix it.
+    heartbeat = asyncio.create_task(_heartbeat(consumer, message_id))
+    try:
+        await run_diet_job(DietJob.model_validate_json(fields[b"job"]))
+    except Exception:
+        logging.exception(f"Diet job entry failed: {message_id!r}")
+    finally:
+        heartbeat.cancel()
+
+    try:
+        async with REDIS.get_connection() as conn:
+            await conn.xack(CONFIG.DIET_JOB_STREAM, CONFIG.DIET_JOB_GROUP, message_id)
+    except RedisError:
+        logging.exception(f"Failed to ack diet job entry: {message_id!r}")
+
+
+async def consume_diet_jobs(concurrency: int) -> None:
+    """
+    Pull diet jobs off the redis stream and run at most `concurrency` of them at
+    a time. Any number of consumers (API pods or solver workers) can share the
+    stream through the consumer group. Runs until cancelled, then stops reading
+    and waits for the jobs it is running to finish.
+    """
+
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    running: set[asyncio.Task] = set()
+
+    try:
+        await _consume_diet_jobs(consumer, concurrency, running)
+    finally:
+        if running:
+            logging.info(f"Waiting for {len(running)} running diet jobs")
+            await asyncio.wait(running)
+
+
+async def _consume_diet_jobs(
+    consumer: str, concurrency: int, running: set[asyncio.Task]
+) -> None:
+    backoff = 1
+    has_group = False
+    while True:
+        if len(running) >= concurrency:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+
+        try:
+            if not has_group:
+                await _ensure_consumer_group()
+                has_group = True
+
+            entries = await _read_diet_jobs(consumer, concurrency - len(running))
+        except RedisError:
+            # keep consuming through redis outages rather than dying quietly,
+            # and recreate the group after in case redis lost it
+            logging.exception(f"Failed to read diet jobs, retrying in {backoff}s")
+            has_group = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, CONSUMER_MAX_BACKOFF_SECONDS)
+            continue
+
+        backoff = 1
+        for _, messages in entries:
+            for message_id, fields in messages:
+                if fields is None:
+                    continue
+
+                task = asyncio.create_task(_run_and_ack(consumer, message_id, fields))
+                running.add(task)
+                task.add_done_callback(running.discard)
+
+
+async def _read_diet_jobs(
+    consumer: str, count: int
+) -> list[tuple[bytes, list[tuple[bytes, dict[bytes, bytes] | None]]]]:
+    async with REDIS.get_connection() as conn:
+        # pick up jobs left behind by consumers that went away mid solve
+        _, claimed, *_ = await conn.xautoclaim(
+            CONFIG.DIET_JOB_STREAM,
+            CONFIG.DIET_JOB_GROUP,
+            consumer,
+            min_idle_time=CONFIG.DIET_JOB_CLAIM_IDLE_SECONDS * 1000,
+            count=count,
+        )
+        if claimed:
+            return [(CONFIG.DIET_JOB_STREAM, claimed)]
+
+        return await conn.xreadgroup(
+            CONFIG.DIET_JOB_GROUP,
+            consumer,
+            {CONFIG.DIET_JOB_STREAM: ">"},
+            count=count,
+            block=5000,
+        )
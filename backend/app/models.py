@@ -413,6 +413,17 @@ class DietOutputVersion(Base):
     diet_id: Mapped[int] = mapped_column(ForeignKey("diet.id"), primary_key=True)
     version: Mapped[int] = mapped_column(primary_key=True)
     status: Mapped[str] = mapped_column(index=True)
+    load_seconds: Mapped[float | None]
+    build_seconds: Mapped[float | None]
+    solve_seconds: Mapped[float | None] = mapped_column(index=True)
+    decode_seconds: Mapped[float | None]
+    solver_conflicts: Mapped[int | None]
+    solver_branches: Mapped[int | None]
+    objective_value: Mapped[float | None]
+    objective_bound: Mapped[float | None]
+    relative_gap: Mapped[float | None]
+    variable_count: Mapped[int | None]
+    constraint_count: Mapped[int | None]
 
 
 class DietIngredientOutput(Base):
@@ -477,8 +488,24 @@ class DietSummaryOutput(Base):
     net_energy_unit_id: Mapped[str | None] = mapped_column(ForeignKey("unit.id"))
 
 
+class DietOutputConflict(Base):
+    id: Mapped[int] = mapped_column(primary_key=True)
+    diet_id: Mapped[int] = mapped_column(ForeignKey("diet.id"), index=True)
+    version: Mapped[int]
+    profile_ingredient_constraint_id: Mapped[int | None] = mapped_column(
+        ForeignKey("profileingredientconstraint.id")
+    )
+    profile_nutrient_constraint_id: Mapped[int | None] = mapped_column(
+        ForeignKey("profilenutrientconstraint.id")
+    )
+    profile_constraint_id: Mapped[int | None] = mapped_column(
+        ForeignKey("profileconstraint.id")
+    )
+
+
 class Diet(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     organization_id: Mapped[str] = mapped_column(ForeignKey("organization.id"))
     name: Mapped[str] = mapped_column(index=True)
     description: Mapped[str | None]
+    solver_backend: Mapped[str | None]
@@ -1,19 +1,63 @@
+import asyncio
+import hashlib
+import json
 import logging
+import math
+import threading
+import time
+import uuid
 from collections import defaultdict
-from typing import Any
-
+from contextlib import contextmanager
+from functools import partial
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Generator,
+    Generic,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+import numpy as np
 from app import models
+from app.config import CONFIG
+from app.db import DB
 from app.graphql import schemas
+from app.redis import REDIS
+from app.solver import SOLVER, SolveProfile
+from app.units import UNITS, UnitTable
+from ortools.linear_solver import pywraplp
 from ortools.sat.python import cp_model
-from pydantic import BaseModel
-from sqlalchemy import func, or_, select
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import func, insert, inspect, or_, select, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+# largest domain any cp-sat variable is given
 MAX_PRECISION = int(1e14)
 FLOAT_SCALING_FACTOR = int(1e10)
-
-VariablesType = dict[tuple[str, ...], cp_model.IntVar]
+# significant digits the smallest value of a diet keeps on the cp-sat scale
+MODEL_PRECISION_DIGITS = 4
+# bump when a change to the model would change the solution for the same inputs
+SOLUTION_CACHE_VERSION = 4
+PROFILE_FRAGMENT_VERSION = 1
+# composition rows are scaled to integers so that no row can overflow int64
+COMPOSITION_ROW_BUDGET = 2**62
+MAX_COMPOSITION_EXPONENT = 12
+# bounds closer than this (on the integral scale) are not a conflict
+BOUND_TOLERANCE = 1e-6 * FLOAT_SCALING_FACTOR
+MAX_PROPAGATION_ROUNDS = 16
+SOLVE_CANCEL_TTL_SECONDS = 60 * 60 * 24
+# objective gaps below this are rounding rather than a missing proof
+OPTIMALITY_GAP_TOLERANCE = 1e-5
+
+ENERGY_TYPES = ("gross", "digestible", "metabolizable", "net")
+
+V = TypeVar("V")
+# ("ingredient_constraint" | "nutrient_constraint" | "profile_constraint", id)
+ConstraintReference = tuple[str, int]
 
 
 class NutrientEnergyValues(BaseModel):
@@ -23,85 +67,416 @@ class NutrientEnergyValues(BaseModel):
     net_energy: int | None
 
 
-def _build_ingredient_variables(
-    model: cp_model.CpModel, ingredients: list[models.Ingredient]
-) -> VariablesType:
-    variables: VariablesType = {}
+class VariableConstraint(BaseModel):
+    id: int
+    variable: tuple[str, str]
+    operator: str
+    literal_value: int | None = None
+    reference_variable: tuple[str, str] | None = None
+
+
+class EnergyConstraint(BaseModel):
+    id: int
+    energy_variable: str
+    operator: str
+    literal_value: int
+
+
+class DietProblem(BaseModel):
+    """
+    Plain description of a diet optimization problem. Everything needed to build
+    and solve the model lives in here so it can be shipped to a solver process.
+    """
+
+    ingredient_ids: list[int]
+    ingredient_category_ids: list[int]
+    nutrient_ids: list[int]
+    nutrient_category_ids: list[int]
+    ingredient_parents: dict[int, int]
+    nutrient_parents: dict[int, int]
+    ingredient_costs: dict[int, int]
+    nutrient_energy_values: dict[int, NutrientEnergyValues]
+    ingredient_compositions: dict[int, dict[int, int]]
+    ingredient_constraints: list[VariableConstraint]
+    nutrient_constraints: list[VariableConstraint]
+    profile_constraints: list[EnergyConstraint]
+    backend: str = "CP_SAT"
+    solve_profile: SolveProfile = SolveProfile()
+    # (diet id, version) being solved, to publish progress for and to cancel
+    output_version: tuple[int, int] | None = None
+    # portfolio race this solve is an entrant of, stopped once another wins
+    race_id: str | None = None
+    # scaled ingredient amounts from a previous solve to warm start from
+    hints: dict[int, int] = {}
+
+
+class ProfileFragment(BaseModel):
+    """
+    A profile compiled into solver independent values and constraints. Diets
+    sharing a profile stitch together the same fragment until one of the
+    profile's rows changes.
+    """
+
+    profile_id: int
+    ingredient_costs: dict[int, int]
+    nutrient_energy_values: dict[int, NutrientEnergyValues]
+    ingredient_compositions: dict[int, dict[int, int]]
+    ingredient_constraints: list[VariableConstraint]
+    nutrient_constraints: list[VariableConstraint]
+    profile_constraints: list[EnergyConstraint]
+
+
+class OptimizerInputs(BaseModel):
+    """
+    Everything read from the database to build the problems of a batch of
+    diets.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    units: UnitTable
+    # diet id -> selected profile ids, in order
+    selected_profiles: dict[int, list[int]]
+    fragments: dict[int, ProfileFragment]
+    catalogs: dict[
+        str,
+        tuple[
+            tuple[list[models.Ingredient], list[models.IngredientCategory]],
+            tuple[list[models.Nutrient], list[models.NutrientCategory]],
+        ],
+    ]
+    # diet id -> scaled ingredient amounts of its latest solved output
+    previous_amounts: dict[int, dict[int, int]]
+
+
+class SolverStatistics(BaseModel):
+    build_seconds: float = 0
+    solve_seconds: float
+    conflicts: int | None = None
+    branches: int | None = None
+    # in base cost units per unit of diet
+    objective_value: float | None = None
+    objective_bound: float | None = None
+    variables: int
+    constraints: int
+
+    @property
+    def relative_gap(self) -> float | None:
+        if self.objective_value is None or self.objective_bound is None:
+            return None
+
+        return abs(self.objective_value - self.objective_bound) / max(
+            abs(self.objective_value), 1e-9
+        )
 
-    for ingredient in ingredients:
-        key = ("ingredient", str(ingredient.id))
-        variables[key] = model.NewIntVar(0, MAX_PRECISION, ".".join(key))
 
-    return variables
+class DietSolution(BaseModel):
+    status: str
+    selected_ingredients: dict[int, int]
+    conflicting_constraints: list[ConstraintReference] = Field(default_factory=list)
+    # only set when a solver actually ran
+    statistics: SolverStatistics | None = None
+
+
+class SolveProgress(BaseModel):
+    diet_id: int
+    version: int
+    # in base cost units per unit of diet
+    objective_value: float
+    objective_bound: float
+    wall_seconds: float
+    # ingredient id -> share of the diet
+    ingredient_shares: dict[int, float]
+
+
+class CompositionMatrix(BaseModel):
+    """
+    Dense arrays of a diet problem in base units. Rows follow the problem's
+    ingredient ids and columns its nutrient ids, the same order the variable
+    registry uses, so one set of arrays builds the model and decodes it.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    ingredient_ids: np.ndarray
+    nutrient_ids: np.ndarray
+    # ingredient x nutrient concentration
+    composition: np.ndarray
+    # cost per ingredient
+    costs: np.ndarray
+    # nutrient x energy type, nan where the nutrient has no value
+    energy: np.ndarray
+    # power of ten the cp-sat model scales base units onto
+    scale: int = FLOAT_SCALING_FACTOR
+
+
+class CostScenarioFormulation(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    status: str
+    ingredient_outputs: list[models.DietIngredientOutput]
+    summary_output: models.DietSummaryOutput | None
+
+
+class PruneReport(BaseModel):
+    ingredients: tuple[int, int]
+    ingredient_categories: tuple[int, int]
+    nutrients: tuple[int, int]
+    nutrient_categories: tuple[int, int]
+
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{name} {kept}/{loaded}"
+            for name, (kept, loaded) in self.model_dump().items()
+        )
 
 
-def _build_ingredient_category_variables(
-    model: cp_model.CpModel, ingredient_categories: list[models.IngredientCategory]
-) -> VariablesType:
-    variables: VariablesType = {}
+class VariableRegistry(Generic[V]):
+    """
+    Model variables indexed by kind ("ingredient", "nutrient_category", ...).
+    Each kind keeps its variables in an array next to the matching ids and an
+    id -> index map, and every category keeps the indices of its children, so
+    building constraints never has to scan the whole model.
+    """
 
-    for ingredient_category in ingredient_categories:
-        key = ("ingredient_category", str(ingredient_category.id))
-        variables[key] = model.NewIntVar(0, MAX_PRECISION, ".".join(key))
+    def __init__(self) -> None:
+        self.ids: dict[str, list[int]] = defaultdict(list)
+        self.variables: dict[str, list[V]] = defaultdict(list)
+        self.indices: dict[str, dict[int, int]] = defaultdict(dict)
+        self.children: dict[tuple[str, int], list[int]] = defaultdict(list)
 
-    return variables
+    def add(self, kind: str, variable_id: int, variable: V) -> None:
+        self.indices[kind][variable_id] = len(self.variables[kind])
+        self.ids[kind].append(variable_id)
+        self.variables[kind].append(variable)
 
+    def link(self, parent: tuple[str, int], child: tuple[str, int]) -> None:
+        # only bind children to parents that are both part of the model
+        if parent not in self or child not in self:
+            return
 
-def _build_nutrient_variables(
-    model: cp_model.CpModel, nutrients: list[models.Nutrient]
-) -> VariablesType:
-    variables: VariablesType = {}
+        self.children[parent].append(self.indices[child[0]][child[1]])
 
-    for nutrient in nutrients:
-        key = ("nutrient", str(nutrient.id))
-        variables[key] = model.NewIntVar(0, MAX_PRECISION, ".".join(key))
+    def of(self, kind: str) -> list[V]:
+        return self.variables.get(kind, [])
 
-    return variables
+    def items_of(self, kind: str) -> list[tuple[int, V]]:
+        return list(zip(self.ids.get(kind, []), self.variables.get(kind, [])))
 
+    def children_of(self, parent_kind: str, parent_id: int, child_kind: str) -> list[V]:
+        child_variables = self.variables[child_kind]
+        return [
+            child_variables[index]
+            for index in self.children.get((parent_kind, parent_id), [])
+        ]
 
-def _build_nutrient_category_variables(
-    model: cp_model.CpModel, nutrient_categories: list[models.NutrientCategory]
-) -> VariablesType:
-    variables: VariablesType = {}
+    def __contains__(self, key: tuple[str, int | str]) -> bool:
+        kind, variable_id = key
+        return int(variable_id) in self.indices.get(kind, {})
 
-    for nutrient_category in nutrient_categories:
-        key = ("nutrient_category", str(nutrient_category.id))
-        variables[key] = model.NewIntVar(0, MAX_PRECISION, ".".join(key))
+    def __getitem__(self, key: tuple[str, int | str]) -> V:
+        # constraints reference variables as (kind, "id") pairs
+        kind, variable_id = key
+        return self.variables[kind][self.indices[kind][int(variable_id)]]
 
-    return variables
 
+VariablesType = VariableRegistry[cp_model.IntVar]
+LinearVariablesType = VariableRegistry[pywraplp.Variable]
 
-def _build_nutrient_energy_variables(
-    model: cp_model.CpModel, nutrient_energy_values: dict[int, NutrientEnergyValues]
-) -> VariablesType:
-    variables: VariablesType = {}
 
-    for nutrient_id in nutrient_energy_values.keys():
-        for energy_type in ("gross", "digestible", "metabolizable", "net"):
-            key = (f"nutrient_{energy_type}_energy", str(nutrient_id))
-            variable = model.NewIntVar(0, MAX_PRECISION, ".".join(key))
-            variables[key] = variable
+def _make_variable_registry(
+    problem: DietProblem, new_variable: Callable[[str, int], V]
+) -> VariableRegistry[V]:
+    registry: VariableRegistry[V] = VariableRegistry()
+
+    for kind, ids in (
+        ("ingredient", problem.ingredient_ids),
+        ("ingredient_category", problem.ingredient_category_ids),
+        ("nutrient", problem.nutrient_ids),
+        ("nutrient_category", problem.nutrient_category_ids),
+    ):
+        for variable_id in ids:
+            registry.add(kind, variable_id, new_variable(kind, variable_id))
+
+    for nutrient_id in problem.nutrient_ids:
+        if nutrient_id not in problem.nutrient_energy_values:
+            continue
+
+        for energy_type in ENERGY_TYPES:
+            kind = f"nutrient_{energy_type}_energy"
+            registry.add(kind, nutrient_id, new_variable(kind, nutrient_id))
+
+    for ingredient_id, ingredient_category_id in problem.ingredient_parents.items():
+        registry.link(
+            ("ingredient_category", ingredient_category_id),
+            ("ingredient", ingredient_id),
+        )
+
+    for nutrient_id, nutrient_category_id in problem.nutrient_parents.items():
+        registry.link(
+            ("nutrient_category", nutrient_category_id), ("nutrient", nutrient_id)
+        )
+
+    return registry
+
+
+def _make_cost_vector(
+    problem: DietProblem, ingredient_costs: dict[int, int]
+) -> np.ndarray:
+    costs = np.array(
+        [ingredient_costs.get(x, 0) for x in problem.ingredient_ids],
+        dtype=np.float64,
+    )
+    return costs / FLOAT_SCALING_FACTOR
+
+
+def _make_composition_matrix(problem: DietProblem) -> CompositionMatrix:
+    ingredient_index = {x: i for i, x in enumerate(problem.ingredient_ids)}
+    nutrient_index = {x: j for j, x in enumerate(problem.nutrient_ids)}
+
+    entries = [
+        (ingredient_index[ingredient_id], nutrient_index[nutrient_id], value)
+        for ingredient_id, composition in problem.ingredient_compositions.items()
+        if ingredient_id in ingredient_index
+        for nutrient_id, value in composition.items()
+        if nutrient_id in nutrient_index
+    ]
+    rows, columns, values = np.array(entries, dtype=np.float64).reshape(-1, 3).T
+    composition = np.zeros((len(ingredient_index), len(nutrient_index)))
+    composition[rows.astype(np.intp), columns.astype(np.intp)] = values
+
+    energy = np.full((len(nutrient_index), len(ENERGY_TYPES)), np.nan)
+    for nutrient_id, energy_values in problem.nutrient_energy_values.items():
+        if nutrient_id not in nutrient_index:
+            continue
+
+        values = [getattr(energy_values, f"{x}_energy") for x in ENERGY_TYPES]
+        energy[nutrient_index[nutrient_id]] = [
+            np.nan if value is None else value for value in values
+        ]
+
+    composition /= FLOAT_SCALING_FACTOR
+    energy /= FLOAT_SCALING_FACTOR
+
+    return CompositionMatrix(
+        ingredient_ids=np.array(problem.ingredient_ids, dtype=np.int64),
+        nutrient_ids=np.array(problem.nutrient_ids, dtype=np.int64),
+        composition=composition,
+        costs=_make_cost_vector(problem, problem.ingredient_costs),
+        energy=energy,
+        scale=_make_model_scale(problem, composition, energy),
+    )
+
+
+def _make_model_scale(
+    problem: DietProblem, composition: np.ndarray, energy: np.ndarray
+) -> int:
+    """
+    Power of ten to scale a diet's base units onto for cp-sat. Ingredient shares,
+    nutrients and energy all share the one scale, so it is chosen fine enough
+    that every constraint literal, every nonzero composition value (what a whole
+    diet of the ingredient brings) and every energy value keeps
+    MODEL_PRECISION_DIGITS digits. Diets that would need a finer scale than the
+    stored data fall back to FLOAT_SCALING_FACTOR, and no scale is so fine that
+    a variable's domain would outgrow MAX_PRECISION.
+    """
+
+    literals = [
+        abs(constraint.literal_value) / FLOAT_SCALING_FACTOR
+        for constraint in (
+            problem.ingredient_constraints
+            + problem.nutrient_constraints
+            + problem.profile_constraints
+        )
+        if constraint.literal_value is not None
+    ]
+    energy_values = np.abs(energy[~np.isnan(energy)]).tolist()
+
+    # a whole diet of one ingredient is the coarsest value a share can take
+    values = [1.0, *np.abs(composition[composition != 0]).tolist()]
+    values += [*literals, *energy_values]
+    magnitudes = [1.0, composition.max(axis=0, initial=0).sum(), *values]
+
+    smallest = min(x for x in values if x > 0)
+    largest = max(magnitudes)
+
+    exponent = min(
+        math.ceil(math.log10(10**MODEL_PRECISION_DIGITS / smallest)),
+        round(math.log10(FLOAT_SCALING_FACTOR)),
+    )
+
+    ceiling = math.floor(math.log10(MAX_PRECISION / largest))
+    if ceiling < 0:
+        raise OverflowError(
+            f"Diet values up to {largest} don't fit a domain of {MAX_PRECISION}"
+        )
+
+    if exponent > ceiling:
+        logging.warning(
+            f"Scaling diet by 1e{ceiling}, values from {smallest} to {largest} "
+            f"lose precision"
+        )
+
+    return 10 ** min(exponent, ceiling)
+
+
+def _to_model_scale(value: int, scale: int) -> int:
+    # problem values are stored on FLOAT_SCALING_FACTOR, the model runs on scale
+    return round(value / (FLOAT_SCALING_FACTOR // scale))
 
-    return variables
+
+def _make_upper_bounds(
+    problem: DietProblem, matrix: CompositionMatrix
+) -> dict[tuple[str, int], int]:
+    # ingredients, and so their categories, are shares of a diet that sums to
+    # the model scale
+    upper_bounds = {
+        ("ingredient", ingredient_id): matrix.scale
+        for ingredient_id in matrix.ingredient_ids.tolist()
+    }
+    for ingredient_category_id in problem.ingredient_category_ids:
+        upper_bounds[("ingredient_category", ingredient_category_id)] = matrix.scale
+
+    # no nutrient can be richer than its richest ingredient (as rounded in its
+    # composition row), and no category richer than all of its nutrients
+    for nutrient_category_id in problem.nutrient_category_ids:
+        upper_bounds[("nutrient_category", nutrient_category_id)] = 0
+
+    scales = _make_composition_scales(matrix)
+    coefficient_max = np.rint(matrix.composition * scales).max(axis=0, initial=0)
+    nutrient_upper_bounds = coefficient_max.astype(np.int64) * matrix.scale // scales
+    for nutrient_id, upper_bound in zip(
+        matrix.nutrient_ids.tolist(), nutrient_upper_bounds.tolist()
+    ):
+        upper_bounds[("nutrient", nutrient_id)] = upper_bound
+
+        category = ("nutrient_category", problem.nutrient_parents.get(nutrient_id))
+        if category in upper_bounds:
+            upper_bounds[category] += upper_bound
+
+    # energy values are constants, unknown ones are left free
+    energy = np.rint(matrix.energy * matrix.scale)
+    for k, energy_type in enumerate(ENERGY_TYPES):
+        for nutrient_id, value in zip(matrix.nutrient_ids.tolist(), energy[:, k]):
+            if not np.isnan(value):
+                upper_bounds[(f"nutrient_{energy_type}_energy", nutrient_id)] = max(
+                    int(value), 0
+                )
+
+    return upper_bounds
 
 
 def _build_variables(
-    model: cp_model.CpModel,
-    ingredients: list[models.Ingredient],
-    ingredient_categories: list[models.IngredientCategory],
-    nutrients: list[models.Nutrient],
-    nutrient_categories: list[models.NutrientCategory],
-    nutrient_energy_values: dict[int, NutrientEnergyValues],
+    model: cp_model.CpModel, problem: DietProblem, matrix: CompositionMatrix
 ) -> VariablesType:
-    return (
-        _build_ingredient_variables(model, ingredients)
-        | _build_ingredient_category_variables(
-            model,
-            ingredient_categories,
-        )
-        | _build_nutrient_variables(model, nutrients)
-        | _build_nutrient_category_variables(model, nutrient_categories)
-        | _build_nutrient_energy_variables(model, nutrient_energy_values)
+    upper_bounds = _make_upper_bounds(problem, matrix)
+    return _make_variable_registry(
+        problem,
+        lambda kind, variable_id: model.NewIntVar(
+            0,
+            upper_bounds.get((kind, variable_id), MAX_PRECISION),
+            f"{kind}.{variable_id}",
+        ),
     )
 
 
@@ -141,513 +516,1080 @@ def _make_literal_value(
     )
 
 
+def _guard_constraint(
+    model: cp_model.CpModel,
+    constraint: cp_model.Constraint,
+    reference: ConstraintReference,
+    assumptions: dict[ConstraintReference, cp_model.IntVar] | None,
+) -> None:
+    # only enforce the constraint while its assumption literal holds, so an
+    # infeasible solve can report which profile constraints are to blame
+    if assumptions is None:
+        return
+
+    if reference not in assumptions:
+        assumptions[reference] = model.NewBoolVar(".".join(map(str, reference)))
+
+    constraint.OnlyEnforceIf(assumptions[reference])
+
+
 def _build_ingredient_constraints(
     model: cp_model.CpModel,
     variables: VariablesType,
-    profile: models.Profile,
+    ingredient_constraints: list[VariableConstraint],
+    scale: int,
+    assumptions: dict[ConstraintReference, cp_model.IntVar] | None = None,
 ) -> None:
-    for ingredient_constraint in profile.profile_ingredient_constraints:
-        if ingredient_constraint.archived:
-            continue
-
-        variable_key = (
-            ("ingredient", str(ingredient_constraint.ingredient_id))
-            if schemas.IngredientConstraintType(ingredient_constraint.type)
-            == schemas.IngredientConstraintType.INGREDIENT
-            else (
-                "ingredient_category",
-                str(ingredient_constraint.ingredient_category_id),
-            )
-        )
+    for ingredient_constraint in ingredient_constraints:
         reference_value = (
-            _make_literal_value(
-                ingredient_constraint.literal_value,
-                ingredient_constraint.literal_unit,
-            )
-            if schemas.IngredientConstraintMode(ingredient_constraint.mode)
-            == schemas.IngredientConstraintMode.LITERAL
-            else variables[
-                (
-                    (
-                        "ingredient",
-                        str(ingredient_constraint.reference_ingredient_id),
-                    )
-                    if schemas.IngredientConstraintType(ingredient_constraint.type)
-                    == schemas.IngredientConstraintType.INGREDIENT
-                    else (
-                        "ingredient_category",
-                        str(ingredient_constraint.reference_ingredient_category_id),
-                    )
-                )
-            ]
+            _to_model_scale(ingredient_constraint.literal_value, scale)
+            if ingredient_constraint.reference_variable is None
+            else variables[ingredient_constraint.reference_variable]
         )
-        model.Add(
+        constraint = model.Add(
             _apply_operator(
-                variables[variable_key],
+                variables[ingredient_constraint.variable],
                 ingredient_constraint.operator,
                 reference_value,
             )
         )
+        _guard_constraint(
+            model,
+            constraint,
+            ("ingredient_constraint", ingredient_constraint.id),
+            assumptions,
+        )
 
 
 def _build_nutrient_constraints(
     model: cp_model.CpModel,
     variables: VariablesType,
-    profile: models.Profile,
+    nutrient_constraints: list[VariableConstraint],
+    scale: int,
+    assumptions: dict[ConstraintReference, cp_model.IntVar] | None = None,
 ) -> None:
-    for nutrient_constraint in profile.profile_nutrient_constraints:
-        if nutrient_constraint.archived:
-            continue
-
-        variable_key = (
-            ("nutrient", str(nutrient_constraint.nutrient_id))
-            if schemas.NutrientConstraintType(nutrient_constraint.type)
-            == schemas.NutrientConstraintType.NUTRIENT
-            else (
-                "nutrient_category",
-                str(nutrient_constraint.nutrient_category_id),
-            )
-        )
+    for nutrient_constraint in nutrient_constraints:
         reference_value = (
-            _make_literal_value(
-                nutrient_constraint.literal_value,
-                nutrient_constraint.literal_unit,
-            )
-            if schemas.NutrientConstraintMode(nutrient_constraint.mode)
-            == schemas.NutrientConstraintMode.LITERAL
-            else variables[
-                (
-                    (
-                        "nutrient",
-                        str(nutrient_constraint.reference_nutrient_id),
-                    )
-                    if schemas.NutrientConstraintType(nutrient_constraint.type)
-                    == schemas.NutrientConstraintType.NUTRIENT
-                    else (
-                        "nutrient_category",
-                        str(nutrient_constraint.reference_nutrient_category_id),
-                    )
-                )
-            ]
+            _to_model_scale(nutrient_constraint.literal_value, scale)
+            if nutrient_constraint.reference_variable is None
+            else variables[nutrient_constraint.reference_variable]
         )
 
-        model.Add(
+        constraint = model.Add(
             _apply_operator(
-                variables[variable_key],
+                variables[nutrient_constraint.variable],
                 nutrient_constraint.operator,
                 reference_value,
             )
         )
+        _guard_constraint(
+            model,
+            constraint,
+            ("nutrient_constraint", nutrient_constraint.id),
+            assumptions,
+        )
 
 
 def _build_profile_constraints(
     model: cp_model.CpModel,
     variables: VariablesType,
-    profile: models.Profile,
+    profile_constraints: list[EnergyConstraint],
+    scale: int,
+    assumptions: dict[ConstraintReference, cp_model.IntVar] | None = None,
 ) -> None:
-    for profile_constraint in profile.profile_constraints:
-        if profile_constraint.archived:
-            continue
-
-        match schemas.ProfileConstraintType(profile_constraint.type):
-            case schemas.ProfileConstraintType.GROSS_ENERGY:
-                constraint = _apply_operator(
-                    cp_model.LinearExpr.Sum(
-                        [
-                            v
-                            for k, v in variables.items()
-                            if k[0] == "nutrient_gross_energy"
-                        ]
-                    ),
-                    profile_constraint.operator,
-                    _make_literal_value(
-                        profile_constraint.literal_value,
-                        profile_constraint.literal_unit,
-                    ),
-                )
-            case schemas.ProfileConstraintType.DIGESTIBLE_ENERGY:
-                constraint = _apply_operator(
-                    cp_model.LinearExpr.Sum(
-                        [
-                            v
-                            for k, v in variables.items()
-                            if k[0] == "nutrient_digestible_energy"
-                        ]
-                    ),
-                    profile_constraint.operator,
-                    _make_literal_value(
-                        profile_constraint.literal_value,
-                        profile_constraint.literal_unit,
-                    ),
-                )
-            case schemas.ProfileConstraintType.METABOLIZABLE_ENERGY:
-                constraint = _apply_operator(
-                    cp_model.LinearExpr.Sum(
-                        [
-                            v
-                            for k, v in variables.items()
-                            if k[0] == "nutrient_metabolizable_energy"
-                        ]
-                    ),
-                    profile_constraint.operator,
-                    _make_literal_value(
-                        profile_constraint.literal_value,
-                        profile_constraint.literal_unit,
-                    ),
-                )
-            case schemas.ProfileConstraintType.NET_ENERGY:
-                constraint = _apply_operator(
-                    cp_model.LinearExpr.Sum(
-                        [
-                            v
-                            for k, v in variables.items()
-                            if k[0] == "nutrient_net_energy"
-                        ]
-                    ),
-                    profile_constraint.operator,
-                    _make_literal_value(
-                        profile_constraint.literal_value,
-                        profile_constraint.literal_unit,
-                    ),
-                )
+    for profile_constraint in profile_constraints:
+        constraint = _apply_operator(
+            cp_model.LinearExpr.Sum(variables.of(profile_constraint.energy_variable)),
+            profile_constraint.operator,
+            _to_model_scale(profile_constraint.literal_value, scale),
+        )
 
-        model.Add(constraint)
+        _guard_constraint(
+            model,
+            model.Add(constraint),
+            ("profile_constraint", profile_constraint.id),
+            assumptions,
+        )
 
 
 def _build_ingredient_weight_constraints(
-    model: cp_model.CpModel, variables: VariablesType
+    model: cp_model.CpModel, variables: VariablesType, scale: int
 ) -> None:
-    constraint = (
-        cp_model.LinearExpr.Sum(
-            [v for k, v in variables.items() if k[0] == "ingredient"]
-        )
-        == FLOAT_SCALING_FACTOR
-    )
+    constraint = cp_model.LinearExpr.Sum(variables.of("ingredient")) == scale
     model.Add(constraint)
 
 
 def _build_category_binding_constraints(
-    model: cp_model.CpModel,
-    variables: VariablesType,
-    ingredients: list[models.Ingredient],
-    nutrients: list[models.Nutrient],
+    model: cp_model.CpModel, variables: VariablesType
 ) -> None:
-    child_id_map = defaultdict(set)
-    for ingredient in ingredients:
-        if ingredient.ingredient_category_id is None:
-            continue
-
-        child_id_map[
-            ("ingredient_category", str(ingredient.ingredient_category_id))
-        ].add(("ingredient", str(ingredient.id)))
-
-    for nutrient in nutrients:
-        if nutrient.nutrient_category_id is None:
-            continue
-
-        child_id_map[("nutrient_category", str(nutrient.nutrient_category_id))].add(
-            ("nutrient", str(nutrient.id))
-        )
-
     for scope in ("ingredient", "nutrient"):
         category_name = f"{scope}_category"
-        for category_id in {k[1] for k in variables if k[0] == category_name}:
-            var = variables[(category_name, category_id)]
-            child_ids = child_id_map.get((category_name, category_id), set())
-            sub_vars = [
-                v for k, v in variables.items() if k[0] == scope and k[1] in child_ids
-            ]
+        for category_id, var in variables.items_of(category_name):
+            sub_vars = variables.children_of(category_name, category_id, scope)
             # category must be sum of all its children
             model.Add(cp_model.LinearExpr.Sum(sub_vars) == var)
 
 
+def _make_composition_scales(matrix: CompositionMatrix) -> np.ndarray:
+    """
+    Power of ten per nutrient that turns its composition column into integer
+    coefficients, as fine as the column's largest value allows without the row
+    overflowing.
+    """
+
+    column_max = matrix.composition.max(axis=0, initial=0)
+    headroom = COMPOSITION_ROW_BUDGET / (
+        (len(matrix.ingredient_ids) + 1) * matrix.scale
+    )
+
+    exponents = np.full(column_max.shape, MAX_COMPOSITION_EXPONENT, dtype=np.float64)
+    nonzero = column_max > 0
+    exponents[nonzero] = np.floor(np.log10(headroom / column_max[nonzero]))
+
+    return 10 ** np.clip(exponents, 0, MAX_COMPOSITION_EXPONENT).astype(np.int64)
+
+
 def _build_ingredient_composition_constraints(
     model: cp_model.CpModel,
     variables: VariablesType,
-    ingredient_compositions: dict[int, dict[int, int]],
+    matrix: CompositionMatrix,
 ) -> None:
-    for ingredient_id, composition in ingredient_compositions.items():
-        for nutrient_id, value in composition.items():
-            ingredient_key = ("ingredient", str(ingredient_id))
-            nutrient_key = ("nutrient", str(nutrient_id))
-            concentration = value / FLOAT_SCALING_FACTOR
-            model.Add(
-                variables[ingredient_key] * concentration == variables[nutrient_key]
+    scales = _make_composition_scales(matrix)
+    coefficients = np.rint(matrix.composition * scales).astype(np.int64)
+    ingredient_variables = variables.of("ingredient")
+
+    for nutrient_variable, scale, column in zip(
+        variables.of("nutrient"), scales.tolist(), coefficients.T
+    ):
+        nonzero = np.flatnonzero(column)
+        # a nutrient is the sum of what every ingredient brings, rounded down
+        # onto the integral scale
+        model.AddLinearConstraint(
+            cp_model.LinearExpr.WeightedSum(
+                [ingredient_variables[i] for i in nonzero], column[nonzero].tolist()
             )
+            - scale * nutrient_variable,
+            0,
+            scale - 1,
+        )
 
 
 def _build_ingredient_energy_constraints(
     model: cp_model.CpModel,
     variables: VariablesType,
-    nutrient_energy_values: dict[int, NutrientEnergyValues],
+    matrix: CompositionMatrix,
 ) -> None:
-    for nutrient_id, energy_values in nutrient_energy_values.items():
-        for energy_type in ("gross", "digestible", "metabolizable", "net"):
-            key = (f"nutrient_{energy_type}_energy", str(nutrient_id))
-            variable = variables[key]
+    nutrient_index = {x: j for j, x in enumerate(matrix.nutrient_ids.tolist())}
+    energy = np.rint(matrix.energy * matrix.scale)
 
-            value = getattr(energy_values, energy_type + "_energy")
+    for k, energy_type in enumerate(ENERGY_TYPES):
+        kind = f"nutrient_{energy_type}_energy"
+        for nutrient_id, variable in variables.items_of(kind):
+            value = energy[nutrient_index[nutrient_id], k]
 
-            if value is None:
+            if np.isnan(value):
                 continue
 
-            model.Add(variable == value)
-            model.AddHint(variable, value)
+            model.Add(variable == int(value))
+            model.AddHint(variable, int(value))
 
 
 def _build_constraints(
     model: cp_model.CpModel,
     variables: VariablesType,
-    selected_profiles: list[models.DietProfileConfiguration],
-    ingredients: list[models.Ingredient],
-    nutrients: list[models.Nutrient],
-    nutrient_energy_values: dict[int, NutrientEnergyValues],
-    ingredient_compositions: dict[int, dict[int, int]],
+    problem: DietProblem,
+    matrix: CompositionMatrix,
+    assumptions: dict[ConstraintReference, cp_model.IntVar] | None = None,
 ) -> None:
     # global constraints
-    _build_ingredient_weight_constraints(model, variables)
-    _build_category_binding_constraints(model, variables, ingredients, nutrients)
-    _build_ingredient_composition_constraints(model, variables, ingredient_compositions)
-    _build_ingredient_energy_constraints(model, variables, nutrient_energy_values)
+    _build_ingredient_weight_constraints(model, variables, matrix.scale)
+    _build_category_binding_constraints(model, variables)
+    _build_ingredient_composition_constraints(model, variables, matrix)
+    _build_ingredient_energy_constraints(model, variables, matrix)
 
     # profile constraints
-    for profile_configuration in selected_profiles:
-        _build_ingredient_constraints(model, variables, profile_configuration.profile)
-        _build_nutrient_constraints(model, variables, profile_configuration.profile)
-        _build_profile_constraints(model, variables, profile_configuration.profile)
+    _build_ingredient_constraints(
+        model, variables, problem.ingredient_constraints, matrix.scale, assumptions
+    )
+    _build_nutrient_constraints(
+        model, variables, problem.nutrient_constraints, matrix.scale, assumptions
+    )
+    _build_profile_constraints(
+        model, variables, problem.profile_constraints, matrix.scale, assumptions
+    )
 
 
 def _build_objective(
     model: cp_model.CpModel,
     variables: VariablesType,
-    ingredient_costs: dict[int, int],
+    costs: np.ndarray,
 ) -> None:
     # minimize cost
     # probably room for other objectives here like: maximize protein, minimize carbs, etc.
     # could even add these as secondary objectives with weights
 
     model.Minimize(
-        cp_model.LinearExpr.WeightedSum(
-            [variables[k] for k in variables.keys() if k[0] == "ingredient"],
-            [
-                float(ingredient_costs.get(int(k[1]), 0) / FLOAT_SCALING_FACTOR)
-                for k in variables.keys()
-                if k[0] == "ingredient"
-            ],
-        )
+        cp_model.LinearExpr.WeightedSum(variables.of("ingredient"), costs.tolist())
     )
 
 
-async def _get_selected_profiles(
-    db: AsyncSession, diet: models.Diet
-) -> list[models.DietProfileConfiguration]:
-    return list(
-        await db.scalars(
-            select(models.DietProfileConfiguration)
-            .where(
-                models.DietProfileConfiguration.diet_id == diet.id,
-                models.DietProfileConfiguration.configuration_version
-                == select(func.max(models.DietConfigurationVersion.version))
-                .where(models.DietConfigurationVersion.diet_id == diet.id)
-                .scalar_subquery(),
-                models.DietProfileConfiguration.archived == False,
+def _build_linear_variables(
+    solver: pywraplp.Solver, problem: DietProblem
+) -> LinearVariablesType:
+    return _make_variable_registry(
+        problem,
+        lambda kind, variable_id: solver.NumVar(
+            0, solver.infinity(), f"{kind}.{variable_id}"
+        ),
+    )
+
+
+def _apply_linear_operator(left: Any, op: str, right: Any) -> Any:
+    # strict bounds are the same as non-strict bounds over continuous variables
+    match schemas.ConstraintOperator(op):
+        case schemas.ConstraintOperator.EQUAL:
+            return left == right
+        case (
+            schemas.ConstraintOperator.LESS_THAN
+            | schemas.ConstraintOperator.LESS_THAN_OR_EQUAL
+        ):
+            return left <= right
+        case (
+            schemas.ConstraintOperator.GREATER_THAN
+            | schemas.ConstraintOperator.GREATER_THAN_OR_EQUAL
+        ):
+            return left >= right
+        case _:
+            raise ValueError(f"Unsupported linear operator: {op}")
+
+
+def _build_linear_constraints(
+    solver: pywraplp.Solver,
+    variables: LinearVariablesType,
+    problem: DietProblem,
+    matrix: CompositionMatrix,
+) -> None:
+    # global constraints
+    solver.Add(solver.Sum(variables.of("ingredient")) == 1)
+
+    for scope in ("ingredient", "nutrient"):
+        category_name = f"{scope}_category"
+        for category_id, var in variables.items_of(category_name):
+            sub_vars = variables.children_of(category_name, category_id, scope)
+            # category must be sum of all its children
+            solver.Add(solver.Sum(sub_vars) == var)
+
+    ingredient_variables = variables.of("ingredient")
+    for nutrient_variable, column in zip(
+        variables.of("nutrient"), matrix.composition.T
+    ):
+        # a nutrient is the sum of what every ingredient brings
+        row = solver.Constraint(0, 0)
+        row.SetCoefficient(nutrient_variable, -1)
+        for i in np.flatnonzero(column):
+            row.SetCoefficient(ingredient_variables[i], column[i])
+
+    nutrient_index = {x: j for j, x in enumerate(matrix.nutrient_ids.tolist())}
+    for k, energy_type in enumerate(ENERGY_TYPES):
+        kind = f"nutrient_{energy_type}_energy"
+        for nutrient_id, variable in variables.items_of(kind):
+            value = matrix.energy[nutrient_index[nutrient_id], k]
+
+            if np.isnan(value):
+                continue
+
+            solver.Add(variable == value)
+
+    # profile constraints
+    for constraint in problem.ingredient_constraints + problem.nutrient_constraints:
+        reference_value = (
+            constraint.literal_value / FLOAT_SCALING_FACTOR
+            if constraint.reference_variable is None
+            else variables[constraint.reference_variable]
+        )
+        solver.Add(
+            _apply_linear_operator(
+                variables[constraint.variable],
+                constraint.operator,
+                reference_value,
             )
-            .order_by(models.DietProfileConfiguration.order)
-            .options(
-                selectinload(models.DietProfileConfiguration.profile).options(
-                    selectinload(
-                        models.Profile.profile_ingredient_constraints,
-                    ).options(
-                        selectinload(
-                            models.ProfileIngredientConstraint.literal_unit,
-                        )
-                    ),
-                    selectinload(
-                        models.Profile.profile_nutrient_constraints,
-                    ).options(
-                        selectinload(
-                            models.ProfileNutrientConstraint.literal_unit,
-                        )
-                    ),
-                    selectinload(models.Profile.profile_constraints).options(
-                        selectinload(
-                            models.ProfileConstraint.literal_unit,
-                        )
-                    ),
-                    selectinload(
-                        models.Profile.profile_ingredient_nutrient_values
-                    ).options(
-                        selectinload(
-                            models.ProfileIngredientNutrientValue.unit,
-                        )
-                    ),
-                    selectinload(models.Profile.profile_ingredient_costs).options(
-                        selectinload(
-                            models.ProfileIngredientCost.literal_cost_unit,
-                        )
-                    ),
-                    selectinload(models.Profile.profile_nutrient_values).options(
-                        selectinload(models.ProfileNutrientValue.gross_energy_unit),
-                        selectinload(
-                            models.ProfileNutrientValue.digestible_energy_unit
-                        ),
-                        selectinload(
-                            models.ProfileNutrientValue.metabolizable_energy_unit
-                        ),
-                        selectinload(models.ProfileNutrientValue.net_energy_unit),
-                    ),
-                ),
+        )
+
+    for profile_constraint in problem.profile_constraints:
+        solver.Add(
+            _apply_linear_operator(
+                solver.Sum(variables.of(profile_constraint.energy_variable)),
+                profile_constraint.operator,
+                profile_constraint.literal_value / FLOAT_SCALING_FACTOR,
             )
         )
-    )
 
 
-async def _get_ingredients(
-    db: AsyncSession, diet: models.Diet
-) -> tuple[list[models.Ingredient], list[models.IngredientCategory]]:
-    ingredients = await db.scalars(
-        select(models.Ingredient).where(
-            or_(
-                models.Ingredient.organization_id == diet.organization_id,
-                models.Ingredient.organization_id == None,
-            ),
-            models.Ingredient.archived == False,
+def _build_linear_objective(
+    solver: pywraplp.Solver,
+    variables: LinearVariablesType,
+    costs: np.ndarray,
+) -> None:
+    # minimize cost
+    solver.Minimize(
+        solver.Sum(
+            [v * cost for v, cost in zip(variables.of("ingredient"), costs.tolist())]
         )
     )
 
-    ingredient_categories = await db.scalars(
-        select(models.IngredientCategory).where(
-            or_(
-                models.IngredientCategory.organization_id == diet.organization_id,
-                models.IngredientCategory.organization_id == None,
-            ),
-            models.IngredientCategory.archived == False,
-        )
-    )
 
-    return list(ingredients), list(ingredient_categories)
+def _build_hints(
+    model: cp_model.CpModel,
+    variables: VariablesType,
+    hints: dict[int, int],
+    scale: int,
+) -> None:
+    if not hints:
+        return
 
+    # hint every ingredient so the previous mix is a complete assignment
+    for ingredient_id, variable in variables.items_of("ingredient"):
+        model.AddHint(variable, _to_model_scale(hints.get(ingredient_id, 0), scale))
 
-async def _get_nutrients(
-    db: AsyncSession, diet: models.Diet
-) -> tuple[list[models.Nutrient], list[models.NutrientCategory]]:
-    nutrients = await db.scalars(
-        select(models.Nutrient).where(
-            or_(
-                models.Nutrient.organization_id == diet.organization_id,
-                models.Nutrient.organization_id == None,
-            ),
-            models.Nutrient.archived == False,
+
+async def _get_selected_profiles(
+    db: AsyncSession, diets: list[models.Diet]
+) -> dict[int, list[models.DietProfileConfiguration]]:
+    profile_configurations = await db.scalars(
+        select(models.DietProfileConfiguration)
+        .where(
+            models.DietProfileConfiguration.diet_id.in_([diet.id for diet in diets]),
+            models.DietProfileConfiguration.configuration_version
+            == select(func.max(models.DietConfigurationVersion.version))
+            .where(
+                models.DietConfigurationVersion.diet_id
+                == models.DietProfileConfiguration.diet_id
+            )
+            .scalar_subquery(),
+            models.DietProfileConfiguration.archived == False,
         )
+        .order_by(models.DietProfileConfiguration.order)
     )
 
-    nutrient_categories = await db.scalars(
-        select(models.NutrientCategory).where(
+    selected_profiles = {diet.id: [] for diet in diets}
+    for profile_configuration in profile_configurations:
+        selected_profiles[profile_configuration.diet_id].append(profile_configuration)
+
+    return selected_profiles
+
+
+async def _get_catalog_rows(
+    db: AsyncSession, catalog_model: type[models.Base], organization_ids: list[str]
+) -> list[Any]:
+    # rows of several organizations at once, shared rows have no organization
+    rows = await db.scalars(
+        select(catalog_model).where(
             or_(
-                models.NutrientCategory.organization_id == diet.organization_id,
-                models.NutrientCategory.organization_id == None,
+                catalog_model.organization_id.in_(organization_ids),
+                catalog_model.organization_id == None,
             ),
-            models.NutrientCategory.archived == False,
+            catalog_model.archived == False,
         )
     )
 
-    return list(nutrients), list(nutrient_categories)
+    return list(rows)
+
+
+def _make_catalog(
+    organization_id: str,
+    ingredients: list[models.Ingredient],
+    ingredient_categories: list[models.IngredientCategory],
+    nutrients: list[models.Nutrient],
+    nutrient_categories: list[models.NutrientCategory],
+) -> tuple[
+    tuple[list[models.Ingredient], list[models.IngredientCategory]],
+    tuple[list[models.Nutrient], list[models.NutrientCategory]],
+]:
+    def visible(rows: list[Any]) -> list[Any]:
+        return [x for x in rows if x.organization_id in (organization_id, None)]
+
+    return (
+        (visible(ingredients), visible(ingredient_categories)),
+        (visible(nutrients), visible(nutrient_categories)),
+    )
 
 
 def _build_ingredient_costs(
-    selected_profiles: list[models.DietProfileConfiguration],
+    profile_ingredient_costs: list[models.ProfileIngredientCost],
+    units: UnitTable,
 ) -> dict[int, int]:
     ingredient_costs = {}
-    for profile_configuration in selected_profiles:
-        for ingredient_cost in profile_configuration.profile.profile_ingredient_costs:
-            if (
-                ingredient_cost.archived
-                or ingredient_cost.ingredient_id in ingredient_costs
-            ):
-                continue
+    for ingredient_cost in profile_ingredient_costs:
+        if (
+            ingredient_cost.archived
+            or ingredient_cost.ingredient_id in ingredient_costs
+        ):
+            continue
 
-            ingredient_costs[ingredient_cost.ingredient_id] = _make_literal_value(
-                ingredient_cost.literal_cost, ingredient_cost.literal_cost_unit
-            )
+        ingredient_costs[ingredient_cost.ingredient_id] = _make_literal_value(
+            ingredient_cost.literal_cost,
+            units.get(ingredient_cost.literal_cost_unit_id),
+        )
 
     return ingredient_costs
 
 
 def _build_nutrient_energy_values(
-    selected_profiles: list[models.DietProfileConfiguration],
+    profile_nutrient_values: list[models.ProfileNutrientValue],
+    units: UnitTable,
 ) -> dict[int, NutrientEnergyValues]:
     nutrient_energy_values = {}
-    for profile_configuration in selected_profiles:
-        for nutrient_energy in profile_configuration.profile.profile_nutrient_values:
-            if (
-                nutrient_energy.archived
-                or nutrient_energy.nutrient_id in nutrient_energy_values
-            ):
-                continue
+    for nutrient_energy in profile_nutrient_values:
+        if (
+            nutrient_energy.archived
+            or nutrient_energy.nutrient_id in nutrient_energy_values
+        ):
+            continue
 
-            nutrient_energy_values[nutrient_energy.nutrient_id] = NutrientEnergyValues(
-                gross_energy=(
-                    _make_literal_value(
-                        nutrient_energy.gross_energy, nutrient_energy.gross_energy_unit
-                    )
-                    if nutrient_energy.gross_energy is not None
-                    else None
-                ),
-                digestible_energy=(
-                    _make_literal_value(
-                        nutrient_energy.digestible_energy,
-                        nutrient_energy.digestible_energy_unit,
-                    )
-                    if nutrient_energy.digestible_energy is not None
-                    else None
-                ),
-                metabolizable_energy=(
-                    _make_literal_value(
-                        nutrient_energy.metabolizable_energy,
-                        nutrient_energy.metabolizable_energy_unit,
-                    )
-                    if nutrient_energy.metabolizable_energy is not None
-                    else None
-                ),
-                net_energy=(
-                    _make_literal_value(
-                        nutrient_energy.net_energy, nutrient_energy.net_energy_unit
-                    )
-                    if nutrient_energy.net_energy is not None
-                    else None
-                ),
-            )
+        nutrient_energy_values[nutrient_energy.nutrient_id] = NutrientEnergyValues(
+            gross_energy=(
+                _make_literal_value(
+                    nutrient_energy.gross_energy,
+                    units.get(nutrient_energy.gross_energy_unit_id),
+                )
+                if nutrient_energy.gross_energy is not None
+                else None
+            ),
+            digestible_energy=(
+                _make_literal_value(
+                    nutrient_energy.digestible_energy,
+                    units.get(nutrient_energy.digestible_energy_unit_id),
+                )
+                if nutrient_energy.digestible_energy is not None
+                else None
+            ),
+            metabolizable_energy=(
+                _make_literal_value(
+                    nutrient_energy.metabolizable_energy,
+                    units.get(nutrient_energy.metabolizable_energy_unit_id),
+                )
+                if nutrient_energy.metabolizable_energy is not None
+                else None
+            ),
+            net_energy=(
+                _make_literal_value(
+                    nutrient_energy.net_energy,
+                    units.get(nutrient_energy.net_energy_unit_id),
+                )
+                if nutrient_energy.net_energy is not None
+                else None
+            ),
+        )
 
     return nutrient_energy_values
 
 
 def _build_ingredient_compositions(
-    selected_profiles: list[models.DietProfileConfiguration],
+    profile_ingredient_nutrient_values: list[models.ProfileIngredientNutrientValue],
+    units: UnitTable,
 ) -> dict[int, dict[int, int]]:
-    ingredient_compositions = defaultdict(dict)
-    for profile_configuration in selected_profiles:
-        for (
-            ingredient_nutrient_value
-        ) in profile_configuration.profile.profile_ingredient_nutrient_values:
-            if (
-                ingredient_nutrient_value.archived
-                or ingredient_nutrient_value.nutrient_id
-                in ingredient_compositions[ingredient_nutrient_value.ingredient_id]
-            ):
-                continue
+    # the first value of each pair wins
+    ingredient_nutrient_values = {}
+    for ingredient_nutrient_value in profile_ingredient_nutrient_values:
+        if ingredient_nutrient_value.archived:
+            continue
 
-            ingredient_compositions[ingredient_nutrient_value.ingredient_id][
-                ingredient_nutrient_value.nutrient_id
-            ] = _make_literal_value(
-                ingredient_nutrient_value.value, ingredient_nutrient_value.unit
-            )
+        ingredient_nutrient_values.setdefault(
+            (
+                ingredient_nutrient_value.ingredient_id,
+                ingredient_nutrient_value.nutrient_id,
+            ),
+            ingredient_nutrient_value,
+        )
 
-    return ingredient_compositions
+    # the profile's largest table, so it is converted a column at a time
+    rows = list(ingredient_nutrient_values.values())
+    if any(row.value is None for row in rows):
+        raise ValueError("Value and unit must be provided")
 
+    scaled_values = units.to_base(
+        [row.value for row in rows], [row.unit_id for row in rows]
+    )
+    ingredient_compositions = defaultdict(dict)
+    for (ingredient_id, nutrient_id), scaled_value in zip(
+        ingredient_nutrient_values, (scaled_values * FLOAT_SCALING_FACTOR).tolist()
+    ):
+        ingredient_compositions[ingredient_id][nutrient_id] = int(scaled_value)
 
-async def _get_units(db: AsyncSession) -> dict[str, models.Unit]:
-    units = await db.scalars(select(models.Unit))
-    return {unit.id: unit for unit in units}
+    return ingredient_compositions
+
+
+def _make_ingredient_constraints(
+    profile_ingredient_constraints: list[models.ProfileIngredientConstraint],
+    units: UnitTable,
+) -> list[VariableConstraint]:
+    ingredient_constraints = []
+    for ingredient_constraint in profile_ingredient_constraints:
+        if ingredient_constraint.archived:
+            continue
+
+        is_ingredient = (
+            schemas.IngredientConstraintType(ingredient_constraint.type)
+            == schemas.IngredientConstraintType.INGREDIENT
+        )
+        is_literal = (
+            schemas.IngredientConstraintMode(ingredient_constraint.mode)
+            == schemas.IngredientConstraintMode.LITERAL
+        )
+        ingredient_constraints.append(
+            VariableConstraint(
+                id=ingredient_constraint.id,
+                variable=(
+                    ("ingredient", str(ingredient_constraint.ingredient_id))
+                    if is_ingredient
+                    else (
+                        "ingredient_category",
+                        str(ingredient_constraint.ingredient_category_id),
+                    )
+                ),
+                operator=ingredient_constraint.operator,
+                literal_value=(
+                    _make_literal_value(
+                        ingredient_constraint.literal_value,
+                        units.get(ingredient_constraint.literal_unit_id),
+                    )
+                    if is_literal
+                    else None
+                ),
+                reference_variable=(
+                    None
+                    if is_literal
+                    else (
+                        (
+                            "ingredient",
+                            str(ingredient_constraint.reference_ingredient_id),
+                        )
+                        if is_ingredient
+                        else (
+                            "ingredient_category",
+                            str(ingredient_constraint.reference_ingredient_category_id),
+                        )
+                    )
+                ),
+            )
+        )
+
+    return ingredient_constraints
+
+
+def _make_nutrient_constraints(
+    profile_nutrient_constraints: list[models.ProfileNutrientConstraint],
+    units: UnitTable,
+) -> list[VariableConstraint]:
+    nutrient_constraints = []
+    for nutrient_constraint in profile_nutrient_constraints:
+        if nutrient_constraint.archived:
+            continue
+
+        is_nutrient = (
+            schemas.NutrientConstraintType(nutrient_constraint.type)
+            == schemas.NutrientConstraintType.NUTRIENT
+        )
+        is_literal = (
+            schemas.NutrientConstraintMode(nutrient_constraint.mode)
+            == schemas.NutrientConstraintMode.LITERAL
+        )
+        nutrient_constraints.append(
+            VariableConstraint(
+                id=nutrient_constraint.id,
+                variable=(
+                    ("nutrient", str(nutrient_constraint.nutrient_id))
+                    if is_nutrient
+                    else (
+                        "nutrient_category",
+                        str(nutrient_constraint.nutrient_category_id),
+                    )
+                ),
+                operator=nutrient_constraint.operator,
+                literal_value=(
+                    _make_literal_value(
+                        nutrient_constraint.literal_value,
+                        units.get(nutrient_constraint.literal_unit_id),
+                    )
+                    if is_literal
+                    else None
+                ),
+                reference_variable=(
+                    None
+                    if is_literal
+                    else (
+                        ("nutrient", str(nutrient_constraint.reference_nutrient_id))
+                        if is_nutrient
+                        else (
+                            "nutrient_category",
+                            str(nutrient_constraint.reference_nutrient_category_id),
+                        )
+                    )
+                ),
+            )
+        )
+
+    return nutrient_constraints
+
+
+def _make_profile_constraints(
+    profile_constraints: list[models.ProfileConstraint],
+    units: UnitTable,
+) -> list[EnergyConstraint]:
+    profile_constraints = []
+    for profile_constraint in profile_constraints:
+        if profile_constraint.archived:
+            continue
+
+        match schemas.ProfileConstraintType(profile_constraint.type):
+            case schemas.ProfileConstraintType.GROSS_ENERGY:
+                energy_variable = "nutrient_gross_energy"
+            case schemas.ProfileConstraintType.DIGESTIBLE_ENERGY:
+                energy_variable = "nutrient_digestible_energy"
+            case schemas.ProfileConstraintType.METABOLIZABLE_ENERGY:
+                energy_variable = "nutrient_metabolizable_energy"
+            case schemas.ProfileConstraintType.NET_ENERGY:
+                energy_variable = "nutrient_net_energy"
+
+        profile_constraints.append(
+            EnergyConstraint(
+                id=profile_constraint.id,
+                energy_variable=energy_variable,
+                operator=profile_constraint.operator,
+                literal_value=_make_literal_value(
+                    profile_constraint.literal_value,
+                    units.get(profile_constraint.literal_unit_id),
+                ),
+            )
+        )
+
+    return profile_constraints
+
+
+def _compile_profile(
+    profile_id: int,
+    profile_rows: dict[type[models.Base], list[Any]],
+    units: UnitTable,
+) -> ProfileFragment:
+    return ProfileFragment(
+        profile_id=profile_id,
+        ingredient_costs=_build_ingredient_costs(
+            profile_rows[models.ProfileIngredientCost], units
+        ),
+        nutrient_energy_values=_build_nutrient_energy_values(
+            profile_rows[models.ProfileNutrientValue], units
+        ),
+        ingredient_compositions=_build_ingredient_compositions(
+            profile_rows[models.ProfileIngredientNutrientValue], units
+        ),
+        ingredient_constraints=_make_ingredient_constraints(
+            profile_rows[models.ProfileIngredientConstraint], units
+        ),
+        nutrient_constraints=_make_nutrient_constraints(
+            profile_rows[models.ProfileNutrientConstraint], units
+        ),
+        profile_constraints=_make_profile_constraints(
+            profile_rows[models.ProfileConstraint], units
+        ),
+    )
+
+
+def _make_diet_problem(
+    fragments: list[ProfileFragment],
+    backend: str,
+    ingredients: list[models.Ingredient],
+    ingredient_categories: list[models.IngredientCategory],
+    nutrients: list[models.Nutrient],
+    nutrient_categories: list[models.NutrientCategory],
+    hints: dict[int, int],
+) -> DietProblem:
+    # values come from the first profile that sets them, constraints from all
+    ingredient_costs = {}
+    nutrient_energy_values = {}
+    ingredient_compositions = defaultdict(dict)
+    for fragment in fragments:
+        for ingredient_id, cost in fragment.ingredient_costs.items():
+            ingredient_costs.setdefault(ingredient_id, cost)
+
+        for nutrient_id, energy_values in fragment.nutrient_energy_values.items():
+            nutrient_energy_values.setdefault(nutrient_id, energy_values)
+
+        for ingredient_id, composition in fragment.ingredient_compositions.items():
+            for nutrient_id, value in composition.items():
+                ingredient_compositions[ingredient_id].setdefault(nutrient_id, value)
+
+    return DietProblem(
+        ingredient_ids=[ingredient.id for ingredient in ingredients],
+        ingredient_category_ids=[category.id for category in ingredient_categories],
+        nutrient_ids=[nutrient.id for nutrient in nutrients],
+        nutrient_category_ids=[category.id for category in nutrient_categories],
+        ingredient_parents={
+            ingredient.id: ingredient.ingredient_category_id
+            for ingredient in ingredients
+            if ingredient.ingredient_category_id is not None
+        },
+        nutrient_parents={
+            nutrient.id: nutrient.nutrient_category_id
+            for nutrient in nutrients
+            if nutrient.nutrient_category_id is not None
+        },
+        ingredient_costs=ingredient_costs,
+        nutrient_energy_values=nutrient_energy_values,
+        ingredient_compositions=ingredient_compositions,
+        ingredient_constraints=[
+            constraint
+            for fragment in fragments
+            for constraint in fragment.ingredient_constraints
+        ],
+        nutrient_constraints=[
+            constraint
+            for fragment in fragments
+            for constraint in fragment.nutrient_constraints
+        ],
+        profile_constraints=[
+            constraint
+            for fragment in fragments
+            for constraint in fragment.profile_constraints
+        ],
+        backend=backend,
+        hints=hints,
+    )
+
+
+def _prune_diet_problem(problem: DietProblem) -> tuple[DietProblem, PruneReport]:
+    """
+    Drop the nutrients and categories that no selected profile composes or
+    constrains, so the model tracks the diet instead of the whole catalog.
+    Returns the pruned problem and the kept/loaded counts.
+
+    Every ingredient is kept: even one no profile prices, composes or
+    constrains costs nothing and takes up a share of the diet, so dropping it
+    could change the solution.
+    """
+
+    constraints = problem.ingredient_constraints + problem.nutrient_constraints
+    referenced = defaultdict(set)
+    for constraint in constraints:
+        for kind, variable_id in filter(
+            None, (constraint.variable, constraint.reference_variable)
+        ):
+            referenced[kind].add(int(variable_id))
+
+    nutrient_ids = (
+        {
+            nutrient_id
+            for composition in problem.ingredient_compositions.values()
+            for nutrient_id in composition.keys()
+        }
+        | set(problem.nutrient_energy_values)
+        | referenced["nutrient"]
+        | {
+            nutrient_id
+            for nutrient_id, nutrient_category_id in problem.nutrient_parents.items()
+            if nutrient_category_id in referenced["nutrient_category"]
+        }
+    )
+
+    kept_ingredient_category_ids = [
+        x
+        for x in problem.ingredient_category_ids
+        if x in referenced["ingredient_category"]
+    ]
+    kept_nutrient_ids = [x for x in problem.nutrient_ids if x in nutrient_ids]
+    kept_nutrient_category_ids = [
+        x for x in problem.nutrient_category_ids if x in referenced["nutrient_category"]
+    ]
+
+    report = PruneReport(
+        ingredients=(len(problem.ingredient_ids), len(problem.ingredient_ids)),
+        ingredient_categories=(
+            len(kept_ingredient_category_ids),
+            len(problem.ingredient_category_ids),
+        ),
+        nutrients=(len(kept_nutrient_ids), len(problem.nutrient_ids)),
+        nutrient_categories=(
+            len(kept_nutrient_category_ids),
+            len(problem.nutrient_category_ids),
+        ),
+    )
+
+    pruned_problem = problem.model_copy(
+        update={
+            "ingredient_category_ids": kept_ingredient_category_ids,
+            "nutrient_ids": kept_nutrient_ids,
+            "nutrient_category_ids": kept_nutrient_category_ids,
+            "nutrient_parents": {
+                k: v for k, v in problem.nutrient_parents.items() if k in nutrient_ids
+            },
+        }
+    )
+
+    return pruned_problem, report
+
+
+PROFILE_ROW_MODELS = (
+    models.ProfileIngredientConstraint,
+    models.ProfileNutrientConstraint,
+    models.ProfileConstraint,
+    models.ProfileIngredientNutrientValue,
+    models.ProfileNutrientValue,
+    models.ProfileIngredientCost,
+)
+
+# profile id -> (stamp, fragment), replaced whenever the stamp moves on
+_profile_fragments: dict[int, tuple[str, ProfileFragment]] = {}
+# pooled connections the optimizer's loaders may hold at once, per process
+_load_connections = asyncio.Semaphore(CONFIG.OPTIMIZER_LOAD_CONNECTIONS)
+
+
+async def _get_profile_stamps(
+    db: AsyncSession, profile_ids: list[int], units: UnitTable
+) -> dict[int, str]:
+    """
+    Latest `updated_at` across each profile and its rows. Rows are archived
+    rather than deleted, so any change to a profile moves its stamp. The unit
+    table's version is folded in since literals are converted through it.
+    """
+
+    updated_at = union_all(
+        select(
+            models.Profile.id.label("profile_id"),
+            models.Profile.updated_at.label("updated_at"),
+        ).where(models.Profile.id.in_(profile_ids)),
+        *(
+            select(row_model.profile_id, func.max(row_model.updated_at))
+            .where(row_model.profile_id.in_(profile_ids))
+            .group_by(row_model.profile_id)
+            for row_model in PROFILE_ROW_MODELS
+        ),
+    ).subquery()
+    stamps = await db.execute(
+        select(updated_at.c.profile_id, func.max(updated_at.c.updated_at)).group_by(
+            updated_at.c.profile_id
+        )
+    )
+
+    return {
+        profile_id: f"{profile_updated_at.isoformat()}:{units.version}"
+        for profile_id, profile_updated_at in stamps
+    }
+
+
+def _profile_fragment_key(profile_id: int, stamp: str) -> str:
+    return f"profile-fragment:{PROFILE_FRAGMENT_VERSION}:{profile_id}:{stamp}"
+
+
+async def _get_profile_rows(
+    db: AsyncSession, row_model: type[models.Base], profile_ids: list[int]
+) -> list[Any]:
+    rows = await db.scalars(
+        select(row_model)
+        .where(row_model.profile_id.in_(profile_ids))
+        .order_by(row_model.id)
+    )
+
+    return list(rows)
+
+
+async def _get_profile_fragments(
+    profile_ids: list[int], units: UnitTable
+) -> dict[int, ProfileFragment]:
+    """
+    Compiled fragments for the given profiles. Fragments are looked up in
+    process, then in redis, and only the profiles missing from both are loaded
+    and compiled.
+    """
+
+    (stamps,) = await _run_concurrently(
+        lambda db: _get_profile_stamps(db, profile_ids, units)
+    )
+
+    fragments = {}
+    for profile_id, stamp in stamps.items():
+        cached = _profile_fragments.get(profile_id)
+        if cached is not None and cached[0] == stamp:
+            fragments[profile_id] = cached[1]
+
+    missing = [profile_id for profile_id in stamps if profile_id not in fragments]
+    if missing:
+        async with REDIS.get_connection() as conn:
+            cached_fragments = await conn.mget(
+                [_profile_fragment_key(x, stamps[x]) for x in missing]
+            )
+
+        for profile_id, fragment in zip(missing, cached_fragments):
+            if fragment is not None:
+                fragments[profile_id] = ProfileFragment.model_validate_json(fragment)
+
+    missing = [profile_id for profile_id in stamps if profile_id not in fragments]
+    if missing:
+        # units come from the unit map rather than one relationship load each
+        profile_rows = defaultdict(lambda: defaultdict(list))
+        for row_model, rows in zip(
+            PROFILE_ROW_MODELS,
+            await _run_concurrently(
+                *(
+                    partial(_get_profile_rows, row_model=x, profile_ids=missing)
+                    for x in PROFILE_ROW_MODELS
+                )
+            ),
+        ):
+            for row in rows:
+                profile_rows[row.profile_id][row_model].append(row)
+
+        async with REDIS.get_connection() as conn:
+            for profile_id in missing:
+                # diets using a profile that can't be compiled fail on their own
+                try:
+                    fragment = _compile_profile(
+                        profile_id, profile_rows[profile_id], units
+                    )
+                except Exception:
+                    logging.exception(f"Failed to compile profile {profile_id}")
+                    continue
+
+                fragments[profile_id] = fragment
+                await conn.set(
+                    _profile_fragment_key(profile_id, stamps[profile_id]),
+                    fragment.model_dump_json(),
+                    ex=CONFIG.PROFILE_FRAGMENT_TTL_SECONDS,
+                )
+
+    logging.info(
+        f"Compiled {len(missing)} of {len(stamps)} profiles, the rest were cached"
+    )
+    for profile_id, fragment in fragments.items():
+        _profile_fragments[profile_id] = (stamps[profile_id], fragment)
+
+    return fragments
+
+
+async def _get_previous_ingredient_outputs(
+    db: AsyncSession, diets: list[models.Diet]
+) -> list[models.DietIngredientOutput]:
+    latest_solved = (
+        select(
+            models.DietOutputVersion.diet_id,
+            func.max(models.DietOutputVersion.version).label("version"),
+        )
+        .where(
+            models.DietOutputVersion.diet_id.in_([diet.id for diet in diets]),
+            models.DietOutputVersion.status.in_(
+                [
+                    schemas.DietOutputStatus.OPTIMAL.value,
+                    schemas.DietOutputStatus.FEASIBLE.value,
+                ]
+            ),
+        )
+        .group_by(models.DietOutputVersion.diet_id)
+        .subquery()
+    )
+    ingredient_outputs = await db.scalars(
+        select(models.DietIngredientOutput).join(
+            latest_solved,
+            (models.DietIngredientOutput.diet_id == latest_solved.c.diet_id)
+            & (models.DietIngredientOutput.version == latest_solved.c.version),
+        )
+    )
+
+    return list(ingredient_outputs)
+
+
+def _make_previous_amounts(
+    ingredient_outputs: list[models.DietIngredientOutput],
+    units: UnitTable,
+) -> dict[int, dict[int, int]]:
+    """
+    Scaled ingredient amounts of the latest solved output of each diet, used
+    to warm start the next solve.
+    """
+
+    base_unit_amounts = units.to_base(
+        [x.amount for x in ingredient_outputs],
+        [x.amount_unit_id for x in ingredient_outputs],
+    )
+
+    previous_amounts = defaultdict(dict)
+    for ingredient_output, base_unit_amount in zip(
+        ingredient_outputs, base_unit_amounts.tolist()
+    ):
+        previous_amounts[ingredient_output.diet_id][ingredient_output.ingredient_id] = (
+            round(base_unit_amount * FLOAT_SCALING_FACTOR)
+        )
+
+    return previous_amounts
+
+
+async def _run_concurrently(
+    *loaders: Callable[[AsyncSession], Awaitable[Any]]
+) -> list[Any]:
+    # an AsyncSession runs one statement at a time, so each loader gets its
+    # own session and pooled connection. Every load in the process shares a
+    # few of them, so concurrent jobs can't drain the pool.
+    async def run(loader: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+        async with _load_connections, DB.session_maker() as db:
+            return await loader(db)
+
+    return await asyncio.gather(*(run(loader) for loader in loaders))
+
+
+async def _load_optimizer_inputs(diets: list[models.Diet]) -> OptimizerInputs:
+    """
+    Everything needed to build the problems of a batch of diets, in three
+    rounds of concurrent queries: the catalogs, selected profiles and previous
+    outputs, then the profile stamps, then the rows of any profile missing from
+    the fragment caches. Units come from the process wide registry.
+    """
+
+    units = await UNITS.get()
+    organization_ids = list({diet.organization_id for diet in diets})
+    (
+        selected_profiles,
+        ingredients,
+        ingredient_categories,
+        nutrients,
+        nutrient_categories,
+        previous_ingredient_outputs,
+    ) = await _run_concurrently(
+        lambda db: _get_selected_profiles(db, diets),
+        lambda db: _get_catalog_rows(db, models.Ingredient, organization_ids),
+        lambda db: _get_catalog_rows(db, models.IngredientCategory, organization_ids),
+        lambda db: _get_catalog_rows(db, models.Nutrient, organization_ids),
+        lambda db: _get_catalog_rows(db, models.NutrientCategory, organization_ids),
+        lambda db: _get_previous_ingredient_outputs(db, diets),
+    )
+
+    # profiles shared between the diets are only compiled once
+    fragments = await _get_profile_fragments(
+        list(
+            {
+                profile_configuration.profile_id
+                for profile_configurations in selected_profiles.values()
+                for profile_configuration in profile_configurations
+            }
+        ),
+        units,
+    )
+
+    return OptimizerInputs(
+        units=units,
+        selected_profiles={
+            diet_id: [x.profile_id for x in profile_configurations]
+            for diet_id, profile_configurations in selected_profiles.items()
+        },
+        fragments=fragments,
+        catalogs={
+            organization_id: _make_catalog(
+                organization_id,
+                ingredients,
+                ingredient_categories,
+                nutrients,
+                nutrient_categories,
+            )
+            for organization_id in organization_ids
+        },
+        previous_amounts=_make_previous_amounts(previous_ingredient_outputs, units),
+    )
 
 
 def _make_ingredient_output(
@@ -660,14 +1602,13 @@ def _make_ingredient_output(
     cost_unit_id: str,
     amount_unit: models.Unit,
     cost_unit: models.Unit,
-    ingredient_costs: dict[int, int],
+    base_unit_cost: float,
     ingredient_nutrient_outputs: list[models.DietIngredientNutrientOutput],
 ) -> models.DietIngredientOutput:
     base_unit_amount = scaled_amount / FLOAT_SCALING_FACTOR
     amount = (
         base_unit_amount - amount_unit.base_unit_offset
     ) / amount_unit.base_unit_multiplier
-    base_unit_cost = ingredient_costs.get(ingredient_id, 0) / FLOAT_SCALING_FACTOR
     cost = (
         base_unit_cost - cost_unit.base_unit_offset
     ) / cost_unit.base_unit_multiplier
@@ -709,83 +1650,18 @@ def _make_ingredient_nutrient_outputs(
     diet: models.Diet,
     version: int,
     ingredient_id: int,
-    scaled_amount: int,
+    nutrient_ids: list[int],
+    base_unit_amounts: np.ndarray,
+    energies: np.ndarray,
     amount_unit: models.Unit,
     energy_unit: models.Unit,
-    nutrient_energy_values: dict[int, NutrientEnergyValues],
-    ingredient_compositions: dict[int, dict[int, int]],
 ) -> list[models.DietIngredientNutrientOutput]:
     ingredient_nutrient_outputs = []
-    ingredient_compositions.get(ingredient_id, {})
-    for nutrient_id, concentration in ingredient_compositions.get(
-        ingredient_id, {}
-    ).items():
-        nutrient_energy_value = nutrient_energy_values.get(nutrient_id)
-        if nutrient_energy_value is None:
-            continue
-
-        base_unit_amount = (scaled_amount / FLOAT_SCALING_FACTOR) * (
-            concentration / FLOAT_SCALING_FACTOR
-        )
-
-        gross_energy = (
-            (
-                (
-                    (
-                        (nutrient_energy_value.gross_energy / FLOAT_SCALING_FACTOR)
-                        - energy_unit.base_unit_offset
-                    )
-                    / energy_unit.base_unit_multiplier
-                )
-                * base_unit_amount
-            )
-            if nutrient_energy_value.gross_energy is not None
-            else None
-        )
-        digestible_energy = (
-            (
-                (
-                    (
-                        (nutrient_energy_value.digestible_energy / FLOAT_SCALING_FACTOR)
-                        - energy_unit.base_unit_offset
-                    )
-                    / energy_unit.base_unit_multiplier
-                )
-                * base_unit_amount
-            )
-            if nutrient_energy_value.digestible_energy is not None
-            else None
-        )
-        metabolizable_energy = (
-            (
-                (
-                    (
-                        (
-                            nutrient_energy_value.metabolizable_energy
-                            / FLOAT_SCALING_FACTOR
-                        )
-                        - energy_unit.base_unit_offset
-                    )
-                    / energy_unit.base_unit_multiplier
-                )
-                * base_unit_amount
-            )
-            if nutrient_energy_value.metabolizable_energy is not None
-            else None
-        )
-        net_energy = (
-            (
-                (
-                    (
-                        (nutrient_energy_value.net_energy / FLOAT_SCALING_FACTOR)
-                        - energy_unit.base_unit_offset
-                    )
-                    / energy_unit.base_unit_multiplier
-                )
-                * base_unit_amount
-            )
-            if nutrient_energy_value.net_energy is not None
-            else None
+    for nutrient_id, base_unit_amount, nutrient_energies in zip(
+        nutrient_ids, base_unit_amounts.tolist(), energies.tolist()
+    ):
+        gross_energy, digestible_energy, metabolizable_energy, net_energy = (
+            None if np.isnan(energy) else energy for energy in nutrient_energies
         )
 
         amount = (
@@ -814,35 +1690,17 @@ def _make_ingredient_nutrient_outputs(
     return ingredient_nutrient_outputs
 
 
-async def _decode_solution(
-    db: AsyncSession,
+def _make_outputs(
     diet: models.Diet,
-    status: "schemas.DietOutputStatus",
+    version: int,
     selected_ingredients: dict[int, int],
-    units: dict[str, models.Unit],
-    ingredient_costs: dict[int, int],
-) -> models.DietOutputVersion:
-    version = (
-        await db.scalar(
-            select(func.max(models.DietOutputVersion.version)).where(
-                models.DietOutputVersion.diet_id == diet.id
-            )
-        )
-        or 0
-    ) + 1
-    diet_output_version = models.DietOutputVersion(
-        diet_id=diet.id,
-        status=status.value,
-        version=version,
-    )
-    db.add(diet_output_version)
-
-    if status not in (
-        schemas.DietOutputStatus.OPTIMAL,
-        schemas.DietOutputStatus.FEASIBLE,
-    ):
-        return diet_output_version
-
+    units: UnitTable,
+    matrix: CompositionMatrix,
+) -> tuple[
+    list[models.DietIngredientOutput],
+    list[models.DietIngredientNutrientOutput],
+    models.DietSummaryOutput,
+]:
     amount_unit_id = "%"
     cost_unit_id = "$-kg"
     energy_unit_id = "mj-kg"
@@ -856,19 +1714,34 @@ async def _decode_solution(
     total_metabolizable_energy = 0
     total_net_energy = 0
 
-    for ingredient_id, scaled_amount in selected_ingredients.items():
+    # base unit amount of every nutrient each selected ingredient brings, and
+    # the energy of it in the output unit
+    ingredient_index = {x: i for i, x in enumerate(matrix.ingredient_ids.tolist())}
+    rows = [ingredient_index[x] for x in selected_ingredients.keys()]
+    shares = np.array(list(selected_ingredients.values())) / FLOAT_SCALING_FACTOR
+    nutrient_amounts = matrix.composition[rows] * shares[:, None]
+    nutrient_energies = nutrient_amounts[:, :, None] * (
+        (matrix.energy - energy_unit.base_unit_offset)
+        / energy_unit.base_unit_multiplier
+    )
+    has_energy = ~np.isnan(matrix.energy).all(axis=1)
+
+    ingredient_outputs = []
+    nutrient_outputs = []
+    for n, (ingredient_id, scaled_amount) in enumerate(selected_ingredients.items()):
+        columns = np.flatnonzero((nutrient_amounts[n] != 0) & has_energy)
         ingredient_nutrient_outputs = _make_ingredient_nutrient_outputs(
             diet=diet,
             version=version,
             ingredient_id=ingredient_id,
-            scaled_amount=scaled_amount,
+            nutrient_ids=matrix.nutrient_ids[columns].tolist(),
+            base_unit_amounts=nutrient_amounts[n, columns],
+            energies=nutrient_energies[n, columns],
             amount_unit=amount_unit,
             energy_unit=energy_unit,
-            nutrient_energy_values={},
-            ingredient_compositions={},
         )
         for nutrient_output in ingredient_nutrient_outputs:
-            db.add(nutrient_output)
+            nutrient_outputs.append(nutrient_output)
             total_gross_energy += nutrient_output.gross_energy or 0
             total_digestible_energy += nutrient_output.digestible_energy or 0
             total_metabolizable_energy += nutrient_output.metabolizable_energy or 0
@@ -884,10 +1757,10 @@ async def _decode_solution(
             cost_unit_id=cost_unit_id,
             amount_unit=amount_unit,
             cost_unit=cost_unit,
-            ingredient_costs=ingredient_costs,
+            base_unit_cost=matrix.costs[rows[n]].item(),
             ingredient_nutrient_outputs=ingredient_nutrient_outputs,
         )
-        db.add(ingredient_output)
+        ingredient_outputs.append(ingredient_output)
 
         total_cost += ingredient_output.cost or 0
 
@@ -906,105 +1779,1293 @@ async def _decode_solution(
         net_energy=total_net_energy,
         net_energy_unit_id=energy_unit_id,
     )
-    db.add(diet_summary_output)
 
-    return diet_output_version
+    return ingredient_outputs, nutrient_outputs, diet_summary_output
 
 
-async def generate_diet(
-    db: AsyncSession, diet: models.Diet
-) -> models.DietOutputVersion:
-    # get data
-    selected_profiles = await _get_selected_profiles(db, diet)
-    ingredients, ingredient_categories = await _get_ingredients(db, diet)
-    nutrients, nutrient_categories = await _get_nutrients(db, diet)
-    units = await _get_units(db)
-    ingredient_costs = _build_ingredient_costs(selected_profiles)
-    nutrient_energy_values = _build_nutrient_energy_values(selected_profiles)
-    ingredient_compositions = _build_ingredient_compositions(selected_profiles)
+def _make_conflict_output(
+    diet: models.Diet, version: int, reference: ConstraintReference
+) -> models.DietOutputConflict:
+    kind, constraint_id = reference
+    return models.DietOutputConflict(
+        diet_id=diet.id,
+        version=version,
+        profile_ingredient_constraint_id=(
+            constraint_id if kind == "ingredient_constraint" else None
+        ),
+        profile_nutrient_constraint_id=(
+            constraint_id if kind == "nutrient_constraint" else None
+        ),
+        profile_constraint_id=constraint_id if kind == "profile_constraint" else None,
+    )
 
-    # apply constraints
-    model = cp_model.CpModel()
 
-    # setup variables
-    variables = _build_variables(
-        model,
-        ingredients=ingredients,
-        ingredient_categories=ingredient_categories,
-        nutrients=nutrients,
-        nutrient_categories=nutrient_categories,
-        nutrient_energy_values=nutrient_energy_values,
+async def _insert_outputs(db: AsyncSession, outputs: list[models.Base]) -> None:
+    """
+    Write output rows with one bulk INSERT per table rather than letting the
+    unit of work flush them one at a time. Only attributes that were set are
+    sent so column defaults still apply.
+    """
+
+    if not outputs:
+        return
+
+    output_model = type(outputs[0])
+    columns = {column.key for column in inspect(output_model).column_attrs}
+    await db.execute(
+        insert(output_model),
+        [
+            {
+                key: value
+                for key, value in inspect(output).dict.items()
+                if key in columns
+            }
+            for output in outputs
+        ],
     )
 
-    # setup constraints
-    _build_constraints(
-        model,
-        variables=variables,
-        selected_profiles=selected_profiles,
-        ingredients=ingredients,
-        nutrients=nutrients,
-        nutrient_energy_values=nutrient_energy_values,
-        ingredient_compositions=ingredient_compositions,
+
+async def _decode_solution(
+    db: AsyncSession,
+    diet: models.Diet,
+    diet_output_version: models.DietOutputVersion,
+    status: "schemas.DietOutputStatus",
+    selected_ingredients: dict[int, int],
+    units: UnitTable,
+    matrix: CompositionMatrix,
+    conflicting_constraints: Optional[list[ConstraintReference]] = None,
+) -> models.DietOutputVersion:
+    if conflicting_constraints is None:
+        conflicting_constraints = []
+
+    diet_output_version.status = status.value
+    await _insert_outputs(
+        db,
+        [
+            _make_conflict_output(diet, diet_output_version.version, reference)
+            for reference in conflicting_constraints
+        ],
     )
 
-    # setup objective function
-    _build_objective(model, variables, ingredient_costs=ingredient_costs)
+    if status not in (
+        schemas.DietOutputStatus.OPTIMAL,
+        schemas.DietOutputStatus.FEASIBLE,
+    ):
+        return diet_output_version
 
-    # get the optimized diet
-    solver = cp_model.CpSolver()
-    # solver.parameters.log_search_progress = True
-    solver.parameters.max_time_in_seconds = 60
-    solver_status = solver.Solve(model)
+    ingredient_outputs, nutrient_outputs, diet_summary_output = _make_outputs(
+        diet,
+        version=diet_output_version.version,
+        selected_ingredients=selected_ingredients,
+        units=units,
+        matrix=matrix,
+    )
+    await _insert_outputs(db, nutrient_outputs)
+    await _insert_outputs(db, ingredient_outputs)
+    await _insert_outputs(db, [diet_summary_output])
 
-    match solver_status:
-        case cp_model.UNKNOWN:
-            status = schemas.DietOutputStatus.UNKNOWN
-        case cp_model.MODEL_INVALID:
-            status = schemas.DietOutputStatus.MODEL_INVALID
-        case cp_model.INFEASIBLE:
-            status = schemas.DietOutputStatus.INFEASIBLE
-        case cp_model.OPTIMAL:
-            status = schemas.DietOutputStatus.OPTIMAL
-        case cp_model.FEASIBLE:
-            status = schemas.DietOutputStatus.FEASIBLE
-        case _:
-            raise Exception(f"Unknown solver status: {solver_status}")
+    return diet_output_version
 
-    logging.info(f"Solver Status: {status}")
+
+def _make_problem_fingerprint(problem: DietProblem) -> str:
+    """
+    Hash of everything that can affect the solution. Collections are sorted so
+    the same diet hashes the same regardless of the order rows were loaded in.
+    """
+
+    canonical = problem.model_dump(
+        mode="json", exclude={"solve_profile", "output_version", "race_id", "hints"}
+    )
+    for key in (
+        "ingredient_ids",
+        "ingredient_category_ids",
+        "nutrient_ids",
+        "nutrient_category_ids",
+    ):
+        canonical[key] = sorted(canonical[key])
+
+    for key in (
+        "ingredient_constraints",
+        "nutrient_constraints",
+        "profile_constraints",
+    ):
+        canonical[key] = sorted(
+            canonical[key], key=lambda x: json.dumps(x, sort_keys=True)
+        )
+
+    canonical["version"] = SOLUTION_CACHE_VERSION
+    return hashlib.sha256(
+        json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def _solution_cache_key(fingerprint: str) -> str:
+    return f"diet-solution:{fingerprint}"
+
+
+async def _get_cached_solution(fingerprint: str) -> DietSolution | None:
+    async with REDIS.get_connection() as conn:
+        solution = await conn.get(_solution_cache_key(fingerprint))
+
+    if solution is None:
+        return None
+
+    return DietSolution.model_validate_json(solution)
+
+
+async def _cache_solution(fingerprint: str, solution: DietSolution) -> None:
+    # anything short of a proof depends on the time budget, so solve it again
+    if schemas.DietOutputStatus(solution.status) not in (
+        schemas.DietOutputStatus.OPTIMAL,
+        schemas.DietOutputStatus.INFEASIBLE,
+    ):
+        return
+
+    async with REDIS.get_connection() as conn:
+        await conn.set(
+            _solution_cache_key(fingerprint),
+            # a cache hit runs no solver, so it has no statistics of its own
+            solution.model_dump_json(exclude={"statistics"}),
+            ex=CONFIG.SOLUTION_CACHE_TTL_SECONDS,
+        )
+
+
+class _BoundConflict(Exception):
+    def __init__(self, constraints: frozenset[ConstraintReference]) -> None:
+        super().__init__(f"Conflicting constraints: {sorted(constraints)}")
+        self.constraints = constraints
+
+
+class _IntervalBounds:
+    """
+    Lower and upper bound of every model variable, each remembering the profile
+    constraints it was derived from so a conflict can name them.
+    """
+
+    def __init__(self) -> None:
+        self.lower: dict[tuple[str, int], float] = {}
+        self.upper: dict[tuple[str, int], float] = {}
+        self.lower_reasons: dict[tuple[str, int], frozenset[ConstraintReference]] = {}
+        self.upper_reasons: dict[tuple[str, int], frozenset[ConstraintReference]] = {}
+
+    def add(self, key: tuple[str, int], lower: float, upper: float) -> None:
+        self.lower[key] = lower
+        self.upper[key] = upper
+        self.lower_reasons[key] = frozenset()
+        self.upper_reasons[key] = frozenset()
+
+    def tighten_lower(
+        self,
+        key: tuple[str, int],
+        value: float,
+        reasons: Callable[[], frozenset[ConstraintReference]],
+    ) -> bool:
+        if value <= self.lower[key] + BOUND_TOLERANCE:
+            return False
+
+        self.lower[key] = value
+        self.lower_reasons[key] = reasons()
+        if value > self.upper[key] + BOUND_TOLERANCE:
+            raise _BoundConflict(self.lower_reasons[key] | self.upper_reasons[key])
+
+        return True
+
+    def tighten_upper(
+        self,
+        key: tuple[str, int],
+        value: float,
+        reasons: Callable[[], frozenset[ConstraintReference]],
+    ) -> bool:
+        if value >= self.upper[key] - BOUND_TOLERANCE:
+            return False
+
+        self.upper[key] = value
+        self.upper_reasons[key] = reasons()
+        if value < self.lower[key] - BOUND_TOLERANCE:
+            raise _BoundConflict(self.lower_reasons[key] | self.upper_reasons[key])
+
+        return True
+
+    def reasons_of(
+        self,
+        reasons: dict[tuple[str, int], frozenset[ConstraintReference]],
+        keys: list[tuple[str, int]],
+    ) -> frozenset[ConstraintReference]:
+        return frozenset().union(*(reasons[key] for key in keys))
+
+
+def _propagate_row(
+    bounds: _IntervalBounds,
+    total: tuple[str, int],
+    terms: list[tuple[tuple[str, int], float]],
+) -> bool:
+    """
+    Tighten the bounds of `total == sum(coefficient * term)` in both directions,
+    for non-negative coefficients.
+    """
+
+    keys = [key for key, _ in terms]
+    lower_sum = sum(c * bounds.lower[key] for key, c in terms)
+    finite_upper_sum = sum(
+        c * bounds.upper[key] for key, c in terms if bounds.upper[key] != math.inf
+    )
+    infinite_uppers = sum(bounds.upper[key] == math.inf for key in keys)
+
+    changed = bounds.tighten_lower(
+        total, lower_sum, lambda: bounds.reasons_of(bounds.lower_reasons, keys)
+    )
+    if infinite_uppers == 0:
+        changed |= bounds.tighten_upper(
+            total,
+            finite_upper_sum,
+            lambda: bounds.reasons_of(bounds.upper_reasons, keys),
+        )
+
+    for key, c in terms:
+        others = lambda: [x for x in keys if x != key]
+
+        # the rest of the row takes at least its lower bounds
+        others_lower = lower_sum - c * bounds.lower[key]
+        changed |= bounds.tighten_upper(
+            key,
+            (bounds.upper[total] - others_lower) / c,
+            lambda: bounds.upper_reasons[total]
+            | bounds.reasons_of(bounds.lower_reasons, others()),
+        )
+
+        # and at most its upper bounds
+        key_is_infinite = bounds.upper[key] == math.inf
+        if infinite_uppers - key_is_infinite > 0:
+            continue
+
+        others_upper = finite_upper_sum - (
+            0 if key_is_infinite else c * bounds.upper[key]
+        )
+        changed |= bounds.tighten_lower(
+            key,
+            (bounds.lower[total] - others_upper) / c,
+            lambda: bounds.lower_reasons[total]
+            | bounds.reasons_of(bounds.upper_reasons, others()),
+        )
+
+    return changed
+
+
+def _propagate_reference(
+    bounds: _IntervalBounds,
+    key: tuple[str, int],
+    operator: "schemas.ConstraintOperator",
+    other: tuple[str, int],
+    reference: ConstraintReference,
+) -> bool:
+    changed = False
+    if operator in (
+        schemas.ConstraintOperator.EQUAL,
+        schemas.ConstraintOperator.LESS_THAN,
+        schemas.ConstraintOperator.LESS_THAN_OR_EQUAL,
+    ):
+        changed |= bounds.tighten_upper(
+            key, bounds.upper[other], lambda: bounds.upper_reasons[other] | {reference}
+        )
+        changed |= bounds.tighten_lower(
+            other, bounds.lower[key], lambda: bounds.lower_reasons[key] | {reference}
+        )
+    if operator in (
+        schemas.ConstraintOperator.EQUAL,
+        schemas.ConstraintOperator.GREATER_THAN,
+        schemas.ConstraintOperator.GREATER_THAN_OR_EQUAL,
+    ):
+        changed |= bounds.tighten_lower(
+            key, bounds.lower[other], lambda: bounds.lower_reasons[other] | {reference}
+        )
+        changed |= bounds.tighten_upper(
+            other, bounds.upper[key], lambda: bounds.upper_reasons[key] | {reference}
+        )
+
+    return changed
+
+
+def _find_energy_conflicts(problem: DietProblem) -> list[ConstraintReference]:
+    # energy variables are fixed per nutrient, so every profile constraint is a
+    # check against a constant (or unbounded when a value is missing) total
+    conflicts = []
+    for profile_constraint in problem.profile_constraints:
+        values = [
+            getattr(
+                energy_values,
+                profile_constraint.energy_variable.removeprefix("nutrient_"),
+            )
+            for nutrient_id, energy_values in problem.nutrient_energy_values.items()
+            if nutrient_id in problem.nutrient_ids
+        ]
+        lower = sum(value for value in values if value is not None)
+        upper = math.inf if None in values else lower
+
+        match schemas.ConstraintOperator(profile_constraint.operator):
+            case schemas.ConstraintOperator.EQUAL:
+                conflict = not lower <= profile_constraint.literal_value <= upper
+            case (
+                schemas.ConstraintOperator.LESS_THAN
+                | schemas.ConstraintOperator.LESS_THAN_OR_EQUAL
+            ):
+                conflict = lower > profile_constraint.literal_value
+            case (
+                schemas.ConstraintOperator.GREATER_THAN
+                | schemas.ConstraintOperator.GREATER_THAN_OR_EQUAL
+            ):
+                conflict = upper < profile_constraint.literal_value
+            case _:
+                conflict = False
+
+        if conflict:
+            conflicts.append(("profile_constraint", profile_constraint.id))
+
+    return conflicts
+
+
+def _find_conflicting_constraints(
+    problem: DietProblem, matrix: CompositionMatrix
+) -> list[ConstraintReference]:
+    """
+    Cheap interval bound propagation over the diet's constraints. Returns the
+    profile constraints behind a bound that can't be met, or nothing when no
+    conflict was found, which doesn't prove the diet is feasible.
+    """
+
+    energy_conflicts = _find_energy_conflicts(problem)
+    if energy_conflicts:
+        return energy_conflicts
+
+    bounds = _IntervalBounds()
+    total = ("diet", 0)
+    bounds.add(total, FLOAT_SCALING_FACTOR, FLOAT_SCALING_FACTOR)
+    for ingredient_id in problem.ingredient_ids:
+        bounds.add(("ingredient", ingredient_id), 0, FLOAT_SCALING_FACTOR)
+    for ingredient_category_id in problem.ingredient_category_ids:
+        bounds.add(("ingredient_category", ingredient_category_id), 0, math.inf)
+    for nutrient_category_id in problem.nutrient_category_ids:
+        bounds.add(("nutrient_category", nutrient_category_id), 0, math.inf)
+
+    # a nutrient is a blend of its ingredients, so it sits between the poorest
+    # and the richest one
+    column_min = matrix.composition.min(axis=0, initial=math.inf)
+    column_max = matrix.composition.max(axis=0, initial=0)
+    for nutrient_id, lower, upper in zip(
+        problem.nutrient_ids, column_min.tolist(), column_max.tolist()
+    ):
+        bounds.add(
+            ("nutrient", nutrient_id),
+            0 if lower == math.inf else lower * FLOAT_SCALING_FACTOR,
+            upper * FLOAT_SCALING_FACTOR,
+        )
+
+    # structural rows: total = sum of ingredients, category = sum of children,
+    # nutrient = sum of what its ingredients bring
+    ingredient_keys = [("ingredient", x) for x in problem.ingredient_ids]
+    rows = [(total, [(key, 1.0) for key in ingredient_keys])]
+    children = defaultdict(list)
+    for kind, parents in (
+        ("ingredient", problem.ingredient_parents),
+        ("nutrient", problem.nutrient_parents),
+    ):
+        for child_id, parent_id in parents.items():
+            parent = (f"{kind}_category", parent_id)
+            child = (kind, child_id)
+            if parent in bounds.lower and child in bounds.lower:
+                children[parent].append((child, 1.0))
+    rows += [
+        (parent, children.get(parent, []))
+        for parent in bounds.lower
+        if parent[0] in ("ingredient_category", "nutrient_category")
+    ]
+    for nutrient_id, column in zip(problem.nutrient_ids, matrix.composition.T):
+        nonzero = np.flatnonzero(column)
+        rows.append(
+            (
+                ("nutrient", nutrient_id),
+                [(ingredient_keys[i], column[i].item()) for i in nonzero],
+            )
+        )
+
+    constraints = [
+        (("ingredient_constraint", x.id), x) for x in problem.ingredient_constraints
+    ] + [(("nutrient_constraint", x.id), x) for x in problem.nutrient_constraints]
+
+    try:
+        # literal bounds only need applying once
+        for reference, constraint in constraints:
+            key = (constraint.variable[0], int(constraint.variable[1]))
+            if constraint.literal_value is None or key not in bounds.lower:
+                continue
+
+            operator = schemas.ConstraintOperator(constraint.operator)
+            reasons = frozenset([reference])
+            if operator in (
+                schemas.ConstraintOperator.EQUAL,
+                schemas.ConstraintOperator.GREATER_THAN,
+                schemas.ConstraintOperator.GREATER_THAN_OR_EQUAL,
+            ):
+                bounds.tighten_lower(key, constraint.literal_value, lambda: reasons)
+            if operator in (
+                schemas.ConstraintOperator.EQUAL,
+                schemas.ConstraintOperator.LESS_THAN,
+                schemas.ConstraintOperator.LESS_THAN_OR_EQUAL,
+            ):
+                bounds.tighten_upper(key, constraint.literal_value, lambda: reasons)
+
+        for _ in range(MAX_PROPAGATION_ROUNDS):
+            changed = False
+            for row_total, terms in rows:
+                changed |= _propagate_row(bounds, row_total, terms)
+
+            for reference, constraint in constraints:
+                if constraint.reference_variable is None:
+                    continue
+
+                key = (constraint.variable[0], int(constraint.variable[1]))
+                other = (
+                    constraint.reference_variable[0],
+                    int(constraint.reference_variable[1]),
+                )
+                if key not in bounds.lower or other not in bounds.lower:
+                    continue
+
+                changed |= _propagate_reference(
+                    bounds,
+                    key,
+                    schemas.ConstraintOperator(constraint.operator),
+                    other,
+                    reference,
+                )
+
+            if not changed:
+                break
+    except _BoundConflict as e:
+        return sorted(e.constraints)
+
+    return []
+
+
+def _make_cp_sat_solver(solve_profile: SolveProfile) -> cp_model.CpSolver:
+    solver = cp_model.CpSolver()
+    # solver.parameters.log_search_progress = True
+    solver.parameters.max_time_in_seconds = solve_profile.max_time_in_seconds
+    solver.parameters.relative_gap_limit = solve_profile.relative_gap_limit
+    if solve_profile.workers:
+        solver.parameters.num_workers = solve_profile.workers
+
+    return solver
+
+
+def _solve_progress_channel(diet_id: int) -> str:
+    return f"diet-solve-progress:{diet_id}"
+
+
+class _SolveProgressCallback(cp_model.CpSolverSolutionCallback):
+    """
+    Publishes every improving solution of a running solve so clients see a good
+    diet long before it is proven optimal. Runs on the solver process, so it
+    talks to redis synchronously.
+    """
+
+    def __init__(
+        self, variables: VariablesType, scale: int, diet_id: int, version: int
+    ) -> None:
+        super().__init__()
+        self.variables = variables
+        self.scale = scale
+        self.diet_id = diet_id
+        self.version = version
+
+    def on_solution_callback(self) -> None:
+        amounts = {
+            ingredient_id: self.Value(variable)
+            for ingredient_id, variable in self.variables.items_of("ingredient")
+        }
+        progress = SolveProgress(
+            diet_id=self.diet_id,
+            version=self.version,
+            objective_value=self.ObjectiveValue() / self.scale,
+            objective_bound=self.BestObjectiveBound() / self.scale,
+            wall_seconds=self.WallTime(),
+            ingredient_shares={
+                ingredient_id: amount / self.scale
+                for ingredient_id, amount in amounts.items()
+                if amount > 0
+            },
+        )
+
+        # progress is best effort and must never fail the solve
+        try:
+            with REDIS.get_sync_connection() as conn:
+                conn.publish(
+                    _solve_progress_channel(self.diet_id), progress.model_dump_json()
+                )
+        except Exception:
+            logging.exception(f"Failed to publish solve progress: {self.diet_id}")
+
+
+def _cancel_solve_key(diet_id: int, version: int) -> str:
+    return f"diet-solve-cancel:{diet_id}:{version}"
+
+
+async def cancel_solve(diet_id: int, version: int) -> None:
+    async with REDIS.get_connection() as conn:
+        await conn.set(
+            _cancel_solve_key(diet_id, version), 1, ex=SOLVE_CANCEL_TTL_SECONDS
+        )
+
+
+async def is_solve_cancelled(diet_id: int, version: int) -> bool:
+    async with REDIS.get_connection() as conn:
+        return bool(await conn.exists(_cancel_solve_key(diet_id, version)))
+
+
+def _cancel_race_key(race_id: str) -> str:
+    return f"diet-solve-race-cancel:{race_id}"
+
+
+def _make_cancel_keys(problem: DietProblem) -> list[str]:
+    keys = []
+    if problem.output_version is not None:
+        keys.append(_cancel_solve_key(*problem.output_version))
+    if problem.race_id is not None:
+        keys.append(_cancel_race_key(problem.race_id))
+
+    return keys
+
+
+@contextmanager
+def _watch_cancellation(
+    cancel_keys: Sequence[str], stop: Callable[[], Any]
+) -> Generator[threading.Event, None, None]:
+    """
+    Poll for a cancel request on a thread next to a running solve, and stop the
+    solver as soon as any of its keys is set. Yields an event that is set if it
+    was.
+    """
+
+    cancelled = threading.Event()
+    if not cancel_keys:
+        yield cancelled
+        return
+
+    done = threading.Event()
+
+    def watch() -> None:
+        while not done.wait(CONFIG.SOLVE_CANCEL_POLL_SECONDS):
+            try:
+                with REDIS.get_sync_connection() as conn:
+                    if not conn.exists(*cancel_keys):
+                        continue
+            except Exception:
+                logging.exception(
+                    f"Failed to check for a cancelled solve: {cancel_keys}"
+                )
+                continue
+
+            cancelled.set()
+            stop()
+            return
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        yield cancelled
+    finally:
+        done.set()
+        watcher.join()
+
+
+async def subscribe_solve_progress(
+    diet_id: int,
+) -> AsyncGenerator[SolveProgress, None]:
+    async with REDIS.get_connection() as conn:
+        async with conn.pubsub() as pubsub:
+            await pubsub.subscribe(_solve_progress_channel(diet_id))
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+
+                yield SolveProgress.model_validate_json(message["data"])
+
+
+def _run_cp_sat(
+    model: cp_model.CpModel,
+    variables: VariablesType,
+    solve_profile: SolveProfile,
+    scale: int,
+    output_version: tuple[int, int] | None = None,
+    cancel_keys: Sequence[str] = (),
+) -> DietSolution:
+    # get the optimized diet
+    solver = _make_cp_sat_solver(solve_profile)
+    callback = (
+        _SolveProgressCallback(variables, scale, *output_version)
+        if output_version is not None
+        else None
+    )
+    with _watch_cancellation(cancel_keys, solver.StopSearch) as cancelled:
+        solver_status = solver.Solve(model, callback)
+    has_solution = solver_status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    statistics = SolverStatistics(
+        solve_seconds=solver.WallTime(),
+        conflicts=solver.NumConflicts(),
+        branches=solver.NumBranches(),
+        # ingredient variables are scaled, so is the objective
+        objective_value=solver.ObjectiveValue() / scale if has_solution else None,
+        objective_bound=(solver.BestObjectiveBound() / scale if has_solution else None),
+        variables=len(model.Proto().variables),
+        constraints=len(model.Proto().constraints),
+    )
+
+    match solver_status:
+        case _ if cancelled.is_set():
+            status = schemas.DietOutputStatus.CANCELLED
+        case cp_model.UNKNOWN:
+            status = schemas.DietOutputStatus.UNKNOWN
+        case cp_model.MODEL_INVALID:
+            status = schemas.DietOutputStatus.MODEL_INVALID
+        case cp_model.INFEASIBLE:
+            status = schemas.DietOutputStatus.INFEASIBLE
+        case cp_model.OPTIMAL if statistics.relative_gap > OPTIMALITY_GAP_TOLERANCE:
+            # stopped at the gap limit, the optimum is only bounded
+            status = schemas.DietOutputStatus.FEASIBLE
+        case cp_model.OPTIMAL:
+            status = schemas.DietOutputStatus.OPTIMAL
+        case cp_model.FEASIBLE:
+            status = schemas.DietOutputStatus.FEASIBLE
+        case _:
+            raise Exception(f"Unknown solver status: {solver_status}")
+
+    logging.info(f"Solver Status: {status}")
 
     if status in (
         schemas.DietOutputStatus.UNKNOWN,
         schemas.DietOutputStatus.MODEL_INVALID,
         schemas.DietOutputStatus.INFEASIBLE,
+        schemas.DietOutputStatus.CANCELLED,
     ):
-        return await _decode_solution(
-            db,
-            diet=diet,
-            status=status,
-            selected_ingredients={},
-            units=units,
-            ingredient_costs=ingredient_costs,
+        return DietSolution(
+            status=status.value, selected_ingredients={}, statistics=statistics
         )
 
-    # decode solution
+    # decode solution back onto the scale the rest of the optimizer stores
     selected_ingredients = {}
-    for key, variable in variables.items():
-        if key[0] == "ingredient" and solver.Value(variable) > 0:
-            selected_ingredients[int(key[1])] = solver.Value(variable)
+    for ingredient_id, variable in variables.items_of("ingredient"):
+        if solver.Value(variable) > 0:
+            selected_ingredients[ingredient_id] = solver.Value(variable) * (
+                FLOAT_SCALING_FACTOR // scale
+            )
+
+    return DietSolution(
+        status=status.value,
+        selected_ingredients=selected_ingredients,
+        statistics=statistics,
+    )
+
+
+def _solve_cp_sat(
+    problem: DietProblem, scenario_costs: list[np.ndarray]
+) -> list[DietSolution]:
+    # apply constraints
+    build_start = time.perf_counter()
+    model = cp_model.CpModel()
+
+    # setup variables
+    matrix = _make_composition_matrix(problem)
+    variables = _build_variables(model, problem, matrix)
+
+    # setup constraints
+    _build_constraints(model, variables, problem, matrix)
+
+    # warm start
+    _build_hints(model, variables, problem.hints, matrix.scale)
+    build_seconds = time.perf_counter() - build_start
+
+    # the constraints are compiled once, each scenario only swaps the objective
+    # and starts from the previous scenario's diet
+    solutions = []
+    for costs in scenario_costs:
+        _build_objective(model, variables, costs)
+        solution = _run_cp_sat(
+            model,
+            variables,
+            problem.solve_profile,
+            matrix.scale,
+            problem.output_version,
+            _make_cancel_keys(problem),
+        )
+        solution.statistics.build_seconds = build_seconds
+        solutions.append(solution)
+
+        if solution.selected_ingredients:
+            model.ClearHints()
+            _build_hints(model, variables, solution.selected_ingredients, matrix.scale)
+
+    return solutions
+
+
+def _find_infeasible_core(problem: DietProblem) -> list[ConstraintReference]:
+    """
+    Solve the constraints alone with every profile constraint behind an
+    assumption literal, and map the infeasible subset CP-SAT reports back to
+    the profile constraints. The subset is sufficient for infeasibility but
+    not guaranteed to be minimal.
+    """
+
+    model = cp_model.CpModel()
+    matrix = _make_composition_matrix(problem)
+    variables = _build_variables(model, problem, matrix)
+    assumptions: dict[ConstraintReference, cp_model.IntVar] = {}
+    _build_constraints(model, variables, problem, matrix, assumptions)
+    model.AddAssumptions(list(assumptions.values()))
+
+    # a diagnostic, so it gets a short budget of its own rather than the
+    # diet's, and stops with the solve it explains when that is cancelled
+    solver = _make_cp_sat_solver(
+        problem.solve_profile.model_copy(
+            update={
+                "max_time_in_seconds": min(
+                    problem.solve_profile.max_time_in_seconds,
+                    CONFIG.SOLVE_DIAGNOSTIC_TIME_SECONDS,
+                )
+            }
+        )
+    )
+    with _watch_cancellation(_make_cancel_keys(problem), solver.StopSearch):
+        solver_status = solver.Solve(model)
+
+    if solver_status != cp_model.INFEASIBLE:
+        return []
 
-    descaled_selected_ingredients = {
-        ingredient_id: amount / FLOAT_SCALING_FACTOR
-        for ingredient_id, amount in selected_ingredients.items()
+    core = set(solver.SufficientAssumptionsForInfeasibility())
+    return sorted(
+        reference
+        for reference, literal in assumptions.items()
+        if literal.Index() in core
+    )
+
+
+def _run_linear(
+    solver: pywraplp.Solver,
+    variables: LinearVariablesType,
+    max_time_in_seconds: float,
+    cancel_keys: Sequence[str] = (),
+) -> DietSolution:
+    # get the optimized diet
+    solver.SetTimeLimit(int(max_time_in_seconds * 1000))
+    with _watch_cancellation(cancel_keys, solver.InterruptSolve) as cancelled:
+        solver_status = solver.Solve()
+    has_solution = solver_status in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE)
+    statistics = SolverStatistics(
+        solve_seconds=solver.wall_time() / 1000,
+        objective_value=solver.Objective().Value() if has_solution else None,
+        # a linear program only has a bound once it is solved to optimality
+        objective_bound=(
+            solver.Objective().Value()
+            if solver_status == pywraplp.Solver.OPTIMAL
+            else None
+        ),
+        variables=solver.NumVariables(),
+        constraints=solver.NumConstraints(),
+    )
+
+    match solver_status:
+        case _ if cancelled.is_set():
+            status = schemas.DietOutputStatus.CANCELLED
+        case pywraplp.Solver.NOT_SOLVED:
+            status = schemas.DietOutputStatus.UNKNOWN
+        case pywraplp.Solver.MODEL_INVALID | pywraplp.Solver.UNBOUNDED:
+            status = schemas.DietOutputStatus.MODEL_INVALID
+        case pywraplp.Solver.ABNORMAL:
+            status = schemas.DietOutputStatus.UNKNOWN
+        case pywraplp.Solver.INFEASIBLE:
+            status = schemas.DietOutputStatus.INFEASIBLE
+        case pywraplp.Solver.OPTIMAL:
+            status = schemas.DietOutputStatus.OPTIMAL
+        case pywraplp.Solver.FEASIBLE:
+            status = schemas.DietOutputStatus.FEASIBLE
+        case _:
+            raise Exception(f"Unknown solver status: {solver_status}")
+
+    logging.info(f"Solver Status: {status}")
+
+    if status in (
+        schemas.DietOutputStatus.UNKNOWN,
+        schemas.DietOutputStatus.MODEL_INVALID,
+        schemas.DietOutputStatus.INFEASIBLE,
+        schemas.DietOutputStatus.CANCELLED,
+    ):
+        return DietSolution(
+            status=status.value, selected_ingredients={}, statistics=statistics
+        )
+
+    # decode solution back onto the same integral scale as the cp-sat backend
+    selected_ingredients = {}
+    for ingredient_id, variable in variables.items_of("ingredient"):
+        scaled_amount = round(variable.solution_value() * FLOAT_SCALING_FACTOR)
+        if scaled_amount > 0:
+            selected_ingredients[ingredient_id] = scaled_amount
+
+    return DietSolution(
+        status=status.value,
+        selected_ingredients=selected_ingredients,
+        statistics=statistics,
+    )
+
+
+def _solve_linear(
+    problem: DietProblem, scenario_costs: list[np.ndarray]
+) -> list[DietSolution]:
+    solver = pywraplp.Solver.CreateSolver(problem.backend)
+    if solver is None:
+        raise Exception(f"Linear solver backend unavailable: {problem.backend}")
+
+    # setup variables
+    build_start = time.perf_counter()
+    matrix = _make_composition_matrix(problem)
+    variables = _build_linear_variables(solver, problem)
+
+    # setup constraints
+    _build_linear_constraints(solver, variables, problem, matrix)
+
+    # warm start, only honoured by solvers that support hints
+    if problem.hints:
+        solver.SetHint(
+            variables.of("ingredient"),
+            [
+                problem.hints.get(ingredient_id, 0) / FLOAT_SCALING_FACTOR
+                for ingredient_id in variables.ids["ingredient"]
+            ],
+        )
+    build_seconds = time.perf_counter() - build_start
+
+    # the solver keeps its basis between solves, so every scenario after the
+    # first starts from the previous optimum
+    solutions = []
+    for costs in scenario_costs:
+        _build_linear_objective(solver, variables, costs)
+        solution = _run_linear(
+            solver,
+            variables,
+            problem.solve_profile.max_time_in_seconds,
+            _make_cancel_keys(problem),
+        )
+        solution.statistics.build_seconds = build_seconds
+        solutions.append(solution)
+
+    return solutions
+
+
+def _is_linear(problem: DietProblem) -> bool:
+    # "not equal" is a disjunction, which a linear program can't express
+    return all(
+        schemas.ConstraintOperator(constraint.operator)
+        != schemas.ConstraintOperator.NOT_EQUAL
+        for constraint in (
+            problem.ingredient_constraints
+            + problem.nutrient_constraints
+            + problem.profile_constraints
+        )
+    )
+
+
+def solve_diet_problem(problem: DietProblem, screen: bool = True) -> DietSolution:
+    """
+    Screen a diet problem for conflicting constraints, then build and solve its
+    model on the selected backend. This is CPU bound and blocking, so it is
+    meant to be run on the solver process pool.
+    """
+
+    if screen:
+        solution = _screen_diet_problem(problem)
+        if solution is not None:
+            return solution
+
+    solution = solve_cost_scenarios(problem, [problem.ingredient_costs])[0]
+
+    if schemas.DietOutputStatus(solution.status) == schemas.DietOutputStatus.INFEASIBLE:
+        # one diagnostic solve to name the conflicting profile constraints
+        solution.conflicting_constraints = _find_infeasible_core(problem)
+        logging.info(
+            f"Infeasible subset (not necessarily minimal): "
+            f"{solution.conflicting_constraints}"
+        )
+
+    return solution
+
+
+def solve_cost_scenarios(
+    problem: DietProblem, scenario_costs: list[dict[int, int]]
+) -> list[DietSolution]:
+    """
+    Solve a diet problem once per set of ingredient costs. The constraints are
+    only built once, and every scenario is warm started from the one before it.
+    """
+
+    costs = [_make_cost_vector(problem, x) for x in scenario_costs]
+
+    match schemas.SolverBackend(problem.backend):
+        case schemas.SolverBackend.CP_SAT:
+            return _solve_cp_sat(problem, costs)
+        case schemas.SolverBackend.GLOP | schemas.SolverBackend.PDLP:
+            if not _is_linear(problem):
+                logging.info(
+                    f"Falling back to {schemas.SolverBackend.CP_SAT.value}, "
+                    f"{problem.backend} can't express the diet's constraints"
+                )
+                return _solve_cp_sat(problem, costs)
+
+            return _solve_linear(problem, costs)
+        case schemas.SolverBackend.PORTFOLIO:
+            # scenarios run back to back from one warm start, so they go to the
+            # fastest backend that can express the diet instead of racing
+            backend = _get_portfolio_backends(problem)[0]
+            return solve_cost_scenarios(
+                problem.model_copy(update={"backend": backend.value}), scenario_costs
+            )
+
+
+def _get_portfolio_backends(problem: DietProblem) -> list["schemas.SolverBackend"]:
+    # a simplex proves pure linear programs optimal far sooner than cp-sat, but
+    # only cp-sat can express "not equal"
+    if _is_linear(problem):
+        return [schemas.SolverBackend.GLOP, schemas.SolverBackend.CP_SAT]
+
+    return [schemas.SolverBackend.CP_SAT]
+
+
+def _rank_portfolio_solution(solution: DietSolution) -> tuple[int, float]:
+    # proofs first, then feasible diets by cost, then whatever is left
+    match schemas.DietOutputStatus(solution.status):
+        case schemas.DietOutputStatus.OPTIMAL | schemas.DietOutputStatus.INFEASIBLE:
+            rank = 0
+        case schemas.DietOutputStatus.FEASIBLE:
+            rank = 1
+        case schemas.DietOutputStatus.CANCELLED:
+            rank = 3
+        case _:
+            rank = 2
+
+    objective_value = (
+        solution.statistics.objective_value
+        if solution.statistics is not None
+        and solution.statistics.objective_value is not None
+        else math.inf
+    )
+    return rank, objective_value
+
+
+async def _solve_portfolio(problem: DietProblem) -> DietSolution:
+    """
+    Solve a diet on every backend that can express it at once, each on its own
+    solver process. The first proven result wins and the other entrants are
+    cancelled; if none proves anything the best diet found is kept.
+    """
+
+    backends = _get_portfolio_backends(problem)
+    if len(backends) == 1:
+        return await SOLVER.run(solve_diet_problem, problem)
+
+    # screened once up front instead of by every entrant
+    solution = await SOLVER.run(_screen_diet_problem, problem)
+    if solution is not None:
+        return solution
+
+    race_id = uuid.uuid4().hex
+    entrants = {
+        asyncio.create_task(
+            SOLVER.run(
+                solve_diet_problem,
+                problem.model_copy(
+                    update={"backend": backend.value, "race_id": race_id}
+                ),
+                False,
+            )
+        ): backend
+        for backend in backends
     }
+    pending = set(entrants)
+
+    solutions = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    solution = task.result()
+                except Exception:
+                    logging.exception(f"Portfolio entrant failed: {entrants[task]}")
+                    continue
+
+                if _rank_portfolio_solution(solution)[0] == 0:
+                    logging.info(f"Portfolio won by {entrants[task].value}")
+                    return solution
+
+                solutions.append(solution)
+    finally:
+        # the losers stop on their next poll, and otherwise run out their time
+        if pending:
+            try:
+                async with REDIS.get_connection() as conn:
+                    await conn.set(
+                        _cancel_race_key(race_id), 1, ex=SOLVE_CANCEL_TTL_SECONDS
+                    )
+            except Exception:
+                logging.exception(f"Failed to cancel portfolio race: {race_id}")
 
-    logging.info(f"Selected Ingredients: {selected_ingredients}")
-    logging.info(f"Descaled Selected Ingredients: {descaled_selected_ingredients}")
+    if not solutions:
+        raise Exception("Every portfolio entrant failed")
 
-    return await _decode_solution(
+    return min(solutions, key=_rank_portfolio_solution)
+
+
+def _make_diet_problem_for(
+    diet: models.Diet,
+    inputs: OptimizerInputs,
+    solve_profile: SolveProfile | None = None,
+) -> DietProblem:
+    (ingredients, ingredient_categories), (nutrients, nutrient_categories) = (
+        inputs.catalogs[diet.organization_id]
+    )
+
+    problem = _make_diet_problem(
+        [inputs.fragments[x] for x in inputs.selected_profiles[diet.id]],
+        backend=diet.solver_backend or CONFIG.SOLVER_BACKEND,
+        ingredients=ingredients,
+        ingredient_categories=ingredient_categories,
+        nutrients=nutrients,
+        nutrient_categories=nutrient_categories,
+        hints=inputs.previous_amounts.get(diet.id, {}),
+    )
+    problem.solve_profile = solve_profile or SolveProfile()
+    problem, prune_report = _prune_diet_problem(problem)
+    logging.info(f"Pruned model for diet {diet.id} (kept/loaded): {prune_report}")
+
+    return problem
+
+
+def _screen_diet_problem(problem: DietProblem) -> DietSolution | None:
+    conflicting_constraints = _find_conflicting_constraints(
+        problem, _make_composition_matrix(problem)
+    )
+    if not conflicting_constraints:
+        return None
+
+    logging.info(
+        f"Conflicting constraints found before solving: {conflicting_constraints}"
+    )
+    return DietSolution(
+        status=schemas.DietOutputStatus.INFEASIBLE.value,
+        selected_ingredients={},
+        conflicting_constraints=conflicting_constraints,
+    )
+
+
+async def _run_solver(problem: DietProblem) -> DietSolution:
+    if schemas.SolverBackend(problem.backend) == schemas.SolverBackend.PORTFOLIO:
+        return await _solve_portfolio(problem)
+
+    return await SOLVER.run(solve_diet_problem, problem)
+
+
+async def _solve_diet_problem(problem: DietProblem) -> DietSolution:
+    # reuse the result of an identical problem, otherwise screen and solve it
+    # on the solver pool
+    fingerprint = _make_problem_fingerprint(problem)
+    solution = await _get_cached_solution(fingerprint)
+    if solution is None:
+        solution = await _run_solver(problem)
+        await _cache_solution(fingerprint, solution)
+    else:
+        logging.info(f"Reusing cached solution {fingerprint}")
+
+    return solution
+
+
+def _record_statistics(
+    diet_output_version: models.DietOutputVersion,
+    build_seconds: float,
+    solve_seconds: float,
+    decode_seconds: float,
+    statistics: SolverStatistics | None,
+) -> None:
+    # without statistics the problem was screened out or served from the cache
+    # and the solve time is just the time that took
+    diet_output_version.build_seconds = build_seconds + (
+        statistics.build_seconds if statistics is not None else 0
+    )
+    diet_output_version.solve_seconds = (
+        statistics.solve_seconds if statistics is not None else solve_seconds
+    )
+    diet_output_version.decode_seconds = decode_seconds
+
+    if statistics is None:
+        return
+
+    diet_output_version.solver_conflicts = statistics.conflicts
+    diet_output_version.solver_branches = statistics.branches
+    diet_output_version.objective_value = statistics.objective_value
+    diet_output_version.objective_bound = statistics.objective_bound
+    diet_output_version.relative_gap = statistics.relative_gap
+    diet_output_version.variable_count = statistics.variables
+    diet_output_version.constraint_count = statistics.constraints
+
+
+async def _lock_unfinished_output_version(
+    db: AsyncSession, diet_output_version: models.DietOutputVersion
+) -> bool:
+    # a slow consumer's job can be reclaimed and solved by another one too. The
+    # row lock holds whichever decodes second until the first has committed,
+    # so it finds the version finished instead of inserting its outputs again.
+    status = await db.scalar(
+        select(models.DietOutputVersion.status)
+        .where(
+            models.DietOutputVersion.diet_id == diet_output_version.diet_id,
+            models.DietOutputVersion.version == diet_output_version.version,
+        )
+        .with_for_update()
+    )
+    return status in (
+        schemas.DietOutputStatus.QUEUED.value,
+        schemas.DietOutputStatus.RUNNING.value,
+    )
+
+
+async def generate_diet(
+    db: AsyncSession,
+    diet: models.Diet,
+    diet_output_version: models.DietOutputVersion,
+    solve_profile: SolveProfile | None = None,
+) -> models.DietOutputVersion:
+    """
+    Formulate a diet within `solve_profile` and decode the solution into its
+    output version. Units and profile fragments come from the process wide
+    caches, so only the diet's own rows are loaded.
+    """
+
+    # get data
+    load_start = time.perf_counter()
+    inputs = await _load_optimizer_inputs([diet])
+    diet_output_version.load_seconds = time.perf_counter() - load_start
+
+    build_start = time.perf_counter()
+    problem = _make_diet_problem_for(diet, inputs, solve_profile)
+    problem.output_version = (diet.id, diet_output_version.version)
+    build_seconds = time.perf_counter() - build_start
+
+    solve_start = time.perf_counter()
+    solution = await _solve_diet_problem(problem)
+    solve_seconds = time.perf_counter() - solve_start
+
+    logging.info(
+        f"Selected Ingredients for diet {diet.id}: {solution.selected_ingredients}"
+    )
+
+    if not await _lock_unfinished_output_version(db, diet_output_version):
+        logging.info(
+            f"Discarding solution for diet {diet.id}, version "
+            f"{diet_output_version.version} already finished"
+        )
+        await db.refresh(diet_output_version)
+        return diet_output_version
+
+    decode_start = time.perf_counter()
+    await _decode_solution(
         db,
         diet=diet,
-        status=status,
-        selected_ingredients=selected_ingredients,
-        units=units,
-        ingredient_costs=ingredient_costs,
+        diet_output_version=diet_output_version,
+        status=schemas.DietOutputStatus(solution.status),
+        selected_ingredients=solution.selected_ingredients,
+        units=inputs.units,
+        matrix=_make_composition_matrix(problem),
+        conflicting_constraints=solution.conflicting_constraints,
+    )
+    _record_statistics(
+        diet_output_version,
+        build_seconds=build_seconds,
+        solve_seconds=solve_seconds,
+        decode_seconds=time.perf_counter() - decode_start,
+        statistics=solution.statistics,
+    )
+
+    return diet_output_version
+
+
+async def generate_cost_scenarios(
+    diet: models.Diet,
+    cost_multipliers: list[dict[int, float]],
+) -> list[CostScenarioFormulation]:
+    """
+    Formulate a diet under several sets of ingredient cost multipliers in one
+    solve. Nothing is persisted, the formulations are only returned.
+    """
+
+    inputs = await _load_optimizer_inputs([diet])
+    return await SOLVER.run(formulate_cost_scenarios, diet, inputs, cost_multipliers)
+
+
+def formulate_cost_scenarios(
+    diet: models.Diet,
+    inputs: OptimizerInputs,
+    cost_multipliers: list[dict[int, float]],
+) -> list[CostScenarioFormulation]:
+    """
+    Build, screen and solve a diet's cost scenarios and turn them into outputs.
+    This is CPU bound and blocking, so it is meant to be run on the solver
+    process pool.
+    """
+
+    problem = _make_diet_problem_for(diet, inputs)
+
+    scenario_costs = [
+        {
+            ingredient_id: round(cost * multipliers.get(ingredient_id, 1))
+            for ingredient_id, cost in problem.ingredient_costs.items()
+        }
+        for multipliers in cost_multipliers
+    ]
+    # costs can't change whether the diet is feasible
+    infeasible = _screen_diet_problem(problem)
+    solutions = (
+        [infeasible] * len(scenario_costs)
+        if infeasible is not None
+        else solve_cost_scenarios(problem, scenario_costs)
     )
+
+    matrix = _make_composition_matrix(problem)
+    formulations = []
+    for ingredient_costs, solution in zip(scenario_costs, solutions):
+        if schemas.DietOutputStatus(solution.status) not in (
+            schemas.DietOutputStatus.OPTIMAL,
+            schemas.DietOutputStatus.FEASIBLE,
+        ):
+            formulations.append(
+                CostScenarioFormulation(
+                    status=solution.status, ingredient_outputs=[], summary_output=None
+                )
+            )
+            continue
+
+        # outputs are never written, so they don't belong to a version
+        ingredient_outputs, _, summary_output = _make_outputs(
+            diet,
+            version=0,
+            selected_ingredients=solution.selected_ingredients,
+            units=inputs.units,
+            matrix=matrix.model_copy(
+                update={"costs": _make_cost_vector(problem, ingredient_costs)}
+            ),
+        )
+        formulations.append(
+            CostScenarioFormulation(
+                status=solution.status,
+                ingredient_outputs=ingredient_outputs,
+                summary_output=summary_output,
+            )
+        )
+
+    return formulations
@@ -1,12 +1,24 @@
+import redis as sync_redis
 import redis.asyncio as redis
 
 from app.config import CONFIG
-from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncGenerator, Generator
 
 
 class REDIS:
     POOL = redis.ConnectionPool.from_url(CONFIG.REDIS_URI)
+    # for code that runs off the event loop, like solver callbacks
+    SYNC_POOL = sync_redis.ConnectionPool.from_url(CONFIG.REDIS_URI)
+
+    @classmethod
+    @contextmanager
+    def get_sync_connection(cls) -> Generator[sync_redis.Redis, None, None]:
+        conn = sync_redis.Redis(connection_pool=cls.SYNC_POOL)
+        try:
+            yield conn
+        finally:
+            conn.close()
 
     @classmethod
     @asynccontextmanager
@@ -18,4 +30,4 @@ class REDIS:
         finally:
             if conn is None:
                 return
-            await conn.aclose()
\ No newline at end of file
+            await conn.aclose()
@@ -0,0 +1,37 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, TypeVar
+
+from app.config import CONFIG
+from pydantic import BaseModel
+
+R = TypeVar("R")
+
+
+class SolveProfile(BaseModel):
+    """
+    How much effort one solve may spend. Client requests are capped by the
+    server before they get here.
+    """
+
+    max_time_in_seconds: float = CONFIG.SOLVE_TIME_SECONDS
+    # stop as soon as the objective is proven this close to the optimum
+    relative_gap_limit: float = 0
+    # cp-sat search workers, 0 lets the solver choose
+    workers: int = 0
+
+
+class SOLVER:
+    PROCESSES = CONFIG.SOLVER_PROCESSES or os.cpu_count() or 1
+    # spawn so workers don't inherit the event loop or pooled connections
+    POOL = ProcessPoolExecutor(
+        max_workers=PROCESSES,
+        mp_context=get_context("spawn"),
+    )
+
+    @classmethod
+    async def run(cls, fn: Callable[..., R], *args: Any) -> R:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls.POOL, fn, *args)
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+from typing import Iterable, Sequence
+
+import numpy as np
+from app import models
+from app.config import CONFIG
+from app.db import DB
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class UnitTable(dict[str, models.Unit]):
+    """
+    Snapshot of the unit table by id, with the base unit conversion of every
+    unit precomputed into arrays so whole columns of values convert at once.
+    """
+
+    def __init__(self, units: Iterable[models.Unit], version: str = "") -> None:
+        super().__init__((unit.id, unit) for unit in units)
+        self.version = version
+        self.index = {unit_id: i for i, unit_id in enumerate(self)}
+        self.multipliers = np.array(
+            [unit.base_unit_multiplier for unit in self.values()], dtype=np.float64
+        )
+        self.offsets = np.array(
+            [unit.base_unit_offset for unit in self.values()], dtype=np.float64
+        )
+
+    def to_base(self, values: Sequence[float], unit_ids: Sequence[str]) -> np.ndarray:
+        try:
+            indices = np.array([self.index[x] for x in unit_ids], dtype=np.intp)
+        except KeyError as e:
+            raise ValueError(f"Unknown unit: {e.args[0]}")
+
+        return (
+            np.asarray(values, dtype=np.float64) * self.multipliers[indices]
+            + self.offsets[indices]
+        )
+
+
+async def _get_unit_version(db: AsyncSession) -> str:
+    # units are merged rather than deleted, so count and latest update are
+    # enough to notice any change
+    count, updated_at = (
+        await db.execute(
+            select(func.count(models.Unit.id), func.max(models.Unit.updated_at))
+        )
+    ).one()
+    return f"{count}:{updated_at.isoformat() if updated_at else ''}"
+
+
+class UNITS:
+    """
+    Process wide unit registry. The table is loaded once and only reloaded when
+    its version stamp moves, which is checked at most every
+    UNIT_REGISTRY_CHECK_SECONDS.
+    """
+
+    TABLE = UnitTable([])
+    CHECKED_AT = -float("inf")
+    LOCK = asyncio.Lock()
+
+    @classmethod
+    async def get(cls) -> UnitTable:
+        if time.monotonic() - cls.CHECKED_AT < CONFIG.UNIT_REGISTRY_CHECK_SECONDS:
+            return cls.TABLE
+
+        async with cls.LOCK:
+            # another task may have refreshed while this one waited
+            if time.monotonic() - cls.CHECKED_AT < CONFIG.UNIT_REGISTRY_CHECK_SECONDS:
+                return cls.TABLE
+
+            return await cls.refresh()
+
+    @classmethod
+    async def refresh(cls) -> UnitTable:
+        async with DB.session_maker() as db:
+            version = await _get_unit_version(db)
+            if version != cls.TABLE.version:
+                units = await db.scalars(select(models.Unit).order_by(models.Unit.id))
+                cls.TABLE = UnitTable(units, version)
+                logging.info(f"Loaded {len(cls.TABLE)} units at version {version}")
+
+        cls.CHECKED_AT = time.monotonic()
+        return cls.TABLE
@@ -0,0 +1,639 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import numpy as np
+import ortools
+from app import models, optimizer
+from app.db import DB
+from app.graphql import schemas
+from app.solver import SolveProfile
+from app.units import UnitTable
+from ortools.linear_solver import pywraplp
+from ortools.sat.python import cp_model
+from pydantic import BaseModel
+
+# synthetic rows get ids far above anything a real database hands out, so a
+# run against a throwaway database never collides with existing rows
+ID_OFFSET = 1_000_000_000
+UNITS_PATH = os.path.join(os.path.dirname(__file__), "data", "managed_units.json")
+
+
+class BenchmarkSize(BaseModel):
+    ingredients: int
+    nutrients: int
+    profiles: int
+
+    @staticmethod
+    def parse(value: str) -> "BenchmarkSize":
+        ingredients, nutrients, profiles = value.split("x")
+        return BenchmarkSize(
+            ingredients=int(ingredients),
+            nutrients=int(nutrients),
+            profiles=int(profiles),
+        )
+
+
+class SyntheticOrganization(BaseModel):
+    """
+    A generated organization with a catalog and profiles that are feasible by
+    construction: every constraint holds for a hidden reference diet.
+    """
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    organization: models.Organization
+    units: UnitTable
+    ingredient_categories: list[models.IngredientCategory]
+    ingredients: list[models.Ingredient]
+    nutrient_categories: list[models.NutrientCategory]
+    nutrients: list[models.Nutrient]
+    # profile id -> row model -> rows
+    profile_rows: dict[int, dict[type[models.Base], list[Any]]]
+    diet: models.Diet
+
+
+class BenchmarkRun(BaseModel):
+    size: BenchmarkSize
+    backend: str
+    seed: int
+    status: str
+    variables: int
+    constraints: int
+    outputs: int
+    timings: dict[str, float]
+
+
+class _RecordingSession:
+    """
+    In-memory stand-in for the session `_decode_solution` writes through. It
+    only counts the rows of each bulk insert.
+    """
+
+    def __init__(self) -> None:
+        self.rows = 0
+
+    async def execute(self, statement: Any, parameters: list[Any] = []) -> None:
+        self.rows += len(parameters)
+
+
+def _make_category_tree(
+    model: type[models.Base],
+    parent_column: str,
+    organization_id: str,
+    depth: int,
+    branching: int,
+    next_id: Iterator[int],
+) -> list[Any]:
+    categories = []
+    parents = [None]
+    for level in range(depth):
+        children = []
+        for parent in parents:
+            for _ in range(branching):
+                category_id = next(next_id)
+                children.append(
+                    model(
+                        id=category_id,
+                        organization_id=organization_id,
+                        name=f"{model.__name__} {category_id}",
+                        **{parent_column: parent},
+                    )
+                )
+
+        categories.extend(children)
+        parents = [x.id for x in children]
+
+    return categories
+
+
+def generate_organization(size: BenchmarkSize, seed: int) -> SyntheticOrganization:
+    rng = random.Random(seed)
+    next_id = iter(range(ID_OFFSET, 2**31 - 1))
+    organization = models.Organization(id=f"benchmark-{seed}")
+
+    with open(UNITS_PATH) as f:
+        units = UnitTable(models.Unit(**x) for x in json.load(f))
+
+    ingredient_categories = _make_category_tree(
+        models.IngredientCategory,
+        "parent_ingredient_category_id",
+        organization.id,
+        depth=2,
+        branching=max(2, round(size.ingredients**0.25)),
+        next_id=next_id,
+    )
+    nutrient_categories = _make_category_tree(
+        models.NutrientCategory,
+        "parent_nutrient_category_id",
+        organization.id,
+        depth=2,
+        branching=max(2, round(size.nutrients**0.25)),
+        next_id=next_id,
+    )
+    leaf_ingredient_categories = [
+        x for x in ingredient_categories if x.parent_ingredient_category_id is not None
+    ]
+    leaf_nutrient_categories = [
+        x for x in nutrient_categories if x.parent_nutrient_category_id is not None
+    ]
+
+    ingredients = []
+    for _ in range(size.ingredients):
+        ingredient_id = next(next_id)
+        ingredients.append(
+            models.Ingredient(
+                id=ingredient_id,
+                organization_id=organization.id,
+                ingredient_category_id=rng.choice(leaf_ingredient_categories).id,
+                name=f"Ingredient {ingredient_id}",
+            )
+        )
+
+    nutrients = []
+    for _ in range(size.nutrients):
+        nutrient_id = next(next_id)
+        nutrients.append(
+            models.Nutrient(
+                id=nutrient_id,
+                organization_id=organization.id,
+                nutrient_category_id=rng.choice(leaf_nutrient_categories).id,
+                name=f"Nutrient {nutrient_id}",
+            )
+        )
+
+    # each ingredient carries a sparse share of the nutrients, in percent
+    compositions = {}
+    for ingredient in ingredients:
+        carried = rng.sample(nutrients, max(1, round(0.4 * len(nutrients))))
+        values = [rng.uniform(0.1, 1) for _ in carried]
+        scale = rng.uniform(20, 90) / sum(values)
+        compositions[ingredient.id] = {
+            nutrient.id: value * scale for nutrient, value in zip(carried, values)
+        }
+
+    # the reference diet every generated constraint is satisfied by
+    reference_ingredients = rng.sample(ingredients, min(len(ingredients), 12))
+    weights = np.random.default_rng(seed).dirichlet(np.ones(len(reference_ingredients)))
+    reference_amounts = defaultdict(float)
+    for ingredient, weight in zip(reference_ingredients, weights):
+        reference_amounts[ingredient.id] = float(weight)
+    reference_levels = defaultdict(float)
+    for ingredient_id, amount in reference_amounts.items():
+        for nutrient_id, value in compositions[ingredient_id].items():
+            reference_levels[nutrient_id] += amount * value
+    reference_category_amounts = defaultdict(float)
+    for ingredient in ingredients:
+        reference_category_amounts[
+            ingredient.ingredient_category_id
+        ] += reference_amounts[ingredient.id]
+
+    profile_ids = [next(next_id) for _ in range(size.profiles)]
+    profile_rows = {
+        x: {row_model: [] for row_model in optimizer.PROFILE_ROW_MODELS}
+        for x in profile_ids
+    }
+
+    # the first profile plays the role of a feed library with the costs,
+    # compositions and energy values, the rest are requirement sets
+    library = profile_rows[profile_ids[0]]
+    for ingredient in ingredients:
+        library[models.ProfileIngredientCost].append(
+            models.ProfileIngredientCost(
+                id=next(next_id),
+                profile_id=profile_ids[0],
+                ingredient_id=ingredient.id,
+                literal_cost=rng.uniform(0.1, 2),
+                literal_cost_unit_id="$-kg",
+                archived=False,
+            )
+        )
+        for nutrient_id, value in compositions[ingredient.id].items():
+            library[models.ProfileIngredientNutrientValue].append(
+                models.ProfileIngredientNutrientValue(
+                    id=next(next_id),
+                    profile_id=profile_ids[0],
+                    ingredient_id=ingredient.id,
+                    nutrient_id=nutrient_id,
+                    value=value,
+                    unit_id="%",
+                    archived=False,
+                )
+            )
+
+    for nutrient in rng.sample(nutrients, max(1, round(0.2 * len(nutrients)))):
+        library[models.ProfileNutrientValue].append(
+            models.ProfileNutrientValue(
+                id=next(next_id),
+                profile_id=profile_ids[0],
+                nutrient_id=nutrient.id,
+                metabolizable_energy=rng.uniform(1, 20),
+                metabolizable_energy_unit_id="mj-kg",
+                archived=False,
+            )
+        )
+
+    requirement_profiles = profile_ids[1:] or profile_ids
+    for profile_id in requirement_profiles:
+        rows = profile_rows[profile_id]
+        for nutrient in rng.sample(nutrients, max(1, len(nutrients) // 4)):
+            level = reference_levels[nutrient.id]
+            rows[models.ProfileNutrientConstraint].append(
+                _make_nutrient_constraint(
+                    next(next_id),
+                    profile_id,
+                    nutrient,
+                    schemas.ConstraintOperator.GREATER_THAN_OR_EQUAL,
+                    0.9 * level,
+                )
+            )
+            rows[models.ProfileNutrientConstraint].append(
+                _make_nutrient_constraint(
+                    next(next_id),
+                    profile_id,
+                    nutrient,
+                    schemas.ConstraintOperator.LESS_THAN_OR_EQUAL,
+                    1.1 * level + 1,
+                )
+            )
+
+        for ingredient in rng.sample(ingredients, max(1, len(ingredients) // 10)):
+            rows[models.ProfileIngredientConstraint].append(
+                _make_ingredient_constraint(
+                    next(next_id),
+                    profile_id,
+                    ingredient,
+                    schemas.ConstraintOperator.LESS_THAN_OR_EQUAL,
+                    min(100, 100 * reference_amounts[ingredient.id] + 10),
+                )
+            )
+
+        for category in rng.sample(
+            leaf_ingredient_categories, max(1, len(leaf_ingredient_categories) // 4)
+        ):
+            rows[models.ProfileIngredientConstraint].append(
+                models.ProfileIngredientConstraint(
+                    id=next(next_id),
+                    profile_id=profile_id,
+                    ingredient_category_id=category.id,
+                    type=schemas.IngredientConstraintType.INGREDIENT_CATEGORY.value,
+                    mode=schemas.IngredientConstraintMode.LITERAL.value,
+                    operator=schemas.ConstraintOperator.LESS_THAN_OR_EQUAL.value,
+                    literal_value=min(
+                        100, 100 * reference_category_amounts[category.id] + 10
+                    ),
+                    literal_unit_id="%",
+                    archived=False,
+                )
+            )
+
+        # a reference constraint between two ingredients in the right order
+        smaller, larger = sorted(
+            rng.sample(ingredients, min(2, len(ingredients))),
+            key=lambda x: reference_amounts[x.id],
+        )[:2] * (2 if len(ingredients) == 1 else 1)
+        rows[models.ProfileIngredientConstraint].append(
+            models.ProfileIngredientConstraint(
+                id=next(next_id),
+                profile_id=profile_id,
+                ingredient_id=smaller.id,
+                type=schemas.IngredientConstraintType.INGREDIENT.value,
+                mode=schemas.IngredientConstraintMode.REFERENCE.value,
+                operator=schemas.ConstraintOperator.LESS_THAN_OR_EQUAL.value,
+                reference_ingredient_id=larger.id,
+                archived=False,
+            )
+        )
+
+        rows[models.ProfileConstraint].append(
+            models.ProfileConstraint(
+                id=next(next_id),
+                profile_id=profile_id,
+                type=schemas.ProfileConstraintType.METABOLIZABLE_ENERGY.value,
+                mode="LITERAL",
+                operator=schemas.ConstraintOperator.GREATER_THAN_OR_EQUAL.value,
+                literal_value=0,
+                literal_unit_id="mj-kg",
+                archived=False,
+            )
+        )
+
+    return SyntheticOrganization(
+        organization=organization,
+        units=units,
+        ingredient_categories=ingredient_categories,
+        ingredients=ingredients,
+        nutrient_categories=nutrient_categories,
+        nutrients=nutrients,
+        profile_rows=profile_rows,
+        diet=models.Diet(
+            id=next(next_id),
+            organization_id=organization.id,
+            name=f"Benchmark {seed}",
+        ),
+    )
+
+
+def _make_ingredient_constraint(
+    constraint_id: int,
+    profile_id: int,
+    ingredient: models.Ingredient,
+    operator: "schemas.ConstraintOperator",
+    percent: float,
+) -> models.ProfileIngredientConstraint:
+    return models.ProfileIngredientConstraint(
+        id=constraint_id,
+        profile_id=profile_id,
+        ingredient_id=ingredient.id,
+        type=schemas.IngredientConstraintType.INGREDIENT.value,
+        mode=schemas.IngredientConstraintMode.LITERAL.value,
+        operator=operator.value,
+        literal_value=percent,
+        literal_unit_id="%",
+        archived=False,
+    )
+
+
+def _make_nutrient_constraint(
+    constraint_id: int,
+    profile_id: int,
+    nutrient: models.Nutrient,
+    operator: "schemas.ConstraintOperator",
+    percent: float,
+) -> models.ProfileNutrientConstraint:
+    return models.ProfileNutrientConstraint(
+        id=constraint_id,
+        profile_id=profile_id,
+        nutrient_id=nutrient.id,
+        type=schemas.NutrientConstraintType.NUTRIENT.value,
+        mode=schemas.NutrientConstraintMode.LITERAL.value,
+        operator=operator.value,
+        literal_value=percent,
+        literal_unit_id="%",
+        archived=False,
+    )
+
+
+@contextmanager
+def _timed(timings: dict[str, float], phase: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = time.perf_counter() - start
+
+
+async def _persist_organization(db: Any, synthetic: SyntheticOrganization) -> None:
+    # everything the output rows reference, rolled back after the run
+    db.add(synthetic.organization)
+    for unit in synthetic.units.values():
+        await db.merge(unit)
+    db.add_all(synthetic.ingredient_categories)
+    db.add_all(synthetic.nutrient_categories)
+    await db.flush()
+    db.add_all(synthetic.ingredients)
+    db.add_all(synthetic.nutrients)
+    db.add(synthetic.diet)
+    await db.flush()
+
+
+async def run_benchmark(
+    size: BenchmarkSize,
+    backend: str,
+    seed: int,
+    max_time_in_seconds: float,
+    database: bool,
+) -> BenchmarkRun:
+    timings = {}
+    with _timed(timings, "generate"):
+        synthetic = generate_organization(size, seed)
+
+    with _timed(timings, "compile_profiles"):
+        fragments = {
+            profile_id: optimizer._compile_profile(profile_id, rows, synthetic.units)
+            for profile_id, rows in synthetic.profile_rows.items()
+        }
+
+    with _timed(timings, "make_problem"):
+        inputs = optimizer.OptimizerInputs(
+            units=synthetic.units,
+            selected_profiles={synthetic.diet.id: list(fragments)},
+            fragments=fragments,
+            catalogs={
+                synthetic.organization.id: (
+                    (synthetic.ingredients, synthetic.ingredient_categories),
+                    (synthetic.nutrients, synthetic.nutrient_categories),
+                )
+            },
+            previous_amounts={},
+        )
+        problem = optimizer._make_diet_problem_for(synthetic.diet, inputs)
+        problem.backend = backend
+        problem.solve_profile = SolveProfile(max_time_in_seconds=max_time_in_seconds)
+        matrix = optimizer._make_composition_matrix(problem)
+        costs = optimizer._make_cost_vector(problem, problem.ingredient_costs)
+
+    if schemas.SolverBackend(backend) == schemas.SolverBackend.PORTFOLIO:
+        # the race runs on the solver pool, so only the whole solve is timed
+        with _timed(timings, "solve"):
+            solution = await optimizer._solve_portfolio(problem)
+        variable_count = solution.statistics.variables if solution.statistics else 0
+        constraint_count = solution.statistics.constraints if solution.statistics else 0
+    elif schemas.SolverBackend(backend) != schemas.SolverBackend.CP_SAT:
+        solver = pywraplp.Solver.CreateSolver(backend)
+        with _timed(timings, "build_variables"):
+            variables = optimizer._build_linear_variables(solver, problem)
+        with _timed(timings, "build_constraints"):
+            optimizer._build_linear_constraints(solver, variables, problem, matrix)
+        with _timed(timings, "solve"):
+            optimizer._build_linear_objective(solver, variables, costs)
+            solution = optimizer._run_linear(solver, variables, max_time_in_seconds)
+        variable_count = solver.NumVariables()
+        constraint_count = solver.NumConstraints()
+    else:
+        model = cp_model.CpModel()
+        with _timed(timings, "build_variables"):
+            variables = optimizer._build_variables(model, problem, matrix)
+        with _timed(timings, "build_constraints"):
+            optimizer._build_constraints(model, variables, problem, matrix)
+        with _timed(timings, "solve"):
+            optimizer._build_objective(model, variables, costs)
+            solution = optimizer._run_cp_sat(
+                model, variables, problem.solve_profile, matrix.scale
+            )
+        variable_count = len(model.Proto().variables)
+        constraint_count = len(model.Proto().constraints)
+
+    diet_output_version = models.DietOutputVersion(
+        diet_id=synthetic.diet.id, version=1, status=solution.status
+    )
+    if database:
+        async with DB.session_maker() as db:
+            await _persist_organization(db, synthetic)
+            db.add(diet_output_version)
+            await db.flush()
+
+            with _timed(timings, "decode"):
+                await optimizer._decode_solution(
+                    db,
+                    diet=synthetic.diet,
+                    diet_output_version=diet_output_version,
+                    status=schemas.DietOutputStatus(solution.status),
+                    selected_ingredients=solution.selected_ingredients,
+                    units=synthetic.units,
+                    matrix=matrix,
+                )
+                await db.flush()
+
+            await db.rollback()
+        outputs = -1
+    else:
+        db = _RecordingSession()
+        with _timed(timings, "decode"):
+            await optimizer._decode_solution(
+                db,
+                diet=synthetic.diet,
+                diet_output_version=diet_output_version,
+                status=schemas.DietOutputStatus(solution.status),
+                selected_ingredients=solution.selected_ingredients,
+                units=synthetic.units,
+                matrix=matrix,
+            )
+        outputs = db.rows
+
+    return BenchmarkRun(
+        size=size,
+        backend=backend,
+        seed=seed,
+        status=solution.status,
+        variables=variable_count,
+        constraints=constraint_count,
+        outputs=outputs,
+        timings=timings,
+    )
+
+
+def check_trace_nutrients() -> None:
+    """
+    Regression check for the cp-sat model scale: a nutrient only one ingredient
+    carries, in trace amounts, must still hold its minimum. GLOP solves the
+    same diet in floating point and is the reference.
+    """
+
+    scale = optimizer.FLOAT_SCALING_FACTOR
+    problem = optimizer.DietProblem(
+        ingredient_ids=[1, 2],
+        ingredient_category_ids=[],
+        nutrient_ids=[1],
+        nutrient_category_ids=[],
+        ingredient_parents={},
+        nutrient_parents={},
+        ingredient_costs={1: scale, 2: scale // 10},
+        nutrient_energy_values={},
+        ingredient_compositions={1: {1: round(1e-6 * scale)}},
+        ingredient_constraints=[],
+        nutrient_constraints=[
+            optimizer.VariableConstraint(
+                id=1,
+                variable=("nutrient", "1"),
+                operator=schemas.ConstraintOperator.GREATER_THAN_OR_EQUAL.value,
+                literal_value=round(3e-7 * scale),
+            )
+        ],
+        profile_constraints=[],
+    )
+
+    solutions = {
+        backend: optimizer.solve_diet_problem(
+            problem.model_copy(update={"backend": backend.value})
+        )
+        for backend in (schemas.SolverBackend.CP_SAT, schemas.SolverBackend.GLOP)
+    }
+    cp_sat, glop = solutions.values()
+    if cp_sat.status != glop.status or any(
+        abs(cp_sat.selected_ingredients.get(x, 0) - glop.selected_ingredients.get(x, 0))
+        > 1e-6 * scale
+        for x in problem.ingredient_ids
+    ):
+        raise AssertionError(
+            f"CP-SAT lost a trace nutrient: {cp_sat.status} "
+            f"{cp_sat.selected_ingredients}, GLOP gives {glop.status} "
+            f"{glop.selected_ingredients}"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Time every phase of the diet optimizer on synthetic diets."
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=BenchmarkSize.parse,
+        default=[BenchmarkSize.parse(x) for x in ("50x20x2", "200x60x3", "1000x120x5")],
+        help="INGREDIENTSxNUTRIENTSxPROFILES, e.g. 200x60x3",
+    )
+    parser.add_argument("--backends", nargs="+", default=["CP_SAT"])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-time", type=float, default=60)
+    parser.add_argument(
+        "--database",
+        action="store_true",
+        help="decode into the configured database inside a rolled back transaction",
+    )
+    parser.add_argument("--output", help="write the JSON results here")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only run the solver regression checks",
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        check_trace_nutrients()
+        return
+
+    runs = []
+    for size in args.sizes:
+        for backend in args.backends:
+            for repeat in range(args.repeat):
+                run = await run_benchmark(
+                    size,
+                    backend,
+                    seed=args.seed + repeat,
+                    max_time_in_seconds=args.max_time,
+                    database=args.database,
+                )
+                logging.info(f"{size} {backend}: {run.status} {run.timings}")
+                runs.append(run.model_dump(mode="json"))
+
+    results = json.dumps(
+        {
+            "environment": {
+                "python": platform.python_version(),
+                "ortools": ortools.__version__,
+                "cpus": os.cpu_count(),
+            },
+            "runs": runs,
+        },
+        indent=2,
+    )
+    if args.output is None:
+        print(results)
+    else:
+        with open(args.output, "w") as f:
+            f.write(results)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
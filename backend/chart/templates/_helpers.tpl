@@ -50,6 +50,26 @@ app.kubernetes.io/name: {{ include "backend.name" . }}
 app.kubernetes.io/instance: {{ .Release.Name }}
 {{- end }}
 
+{{/*
+Worker labels, kept apart from the api selector so the service never routes to workers
+*/}}
+{{- define "backend.workerLabels" -}}
+helm.sh/chart: {{ include "backend.chart" . }}
+{{ include "backend.workerSelectorLabels" . }}
+{{- if .Chart.AppVersion }}
+app.kubernetes.io/version: {{ .Chart.AppVersion | quote }}
+{{- end }}
+app.kubernetes.io/managed-by: {{ .Release.Service }}
+{{- end }}
+
+{{/*
+Worker selector labels
+*/}}
+{{- define "backend.workerSelectorLabels" -}}
+app.kubernetes.io/name: {{ include "backend.name" . }}-worker
+app.kubernetes.io/instance: {{ .Release.Name }}
+{{- end }}
+
 {{/*
 Create the name of the service account to use
 */}}
@@ -1,14 +1,37 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncGenerator
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app import jobs
 from app.config import CONFIG
 from app.graphql.schemas import graphql_app
+from app.solver import SOLVER
+from app.units import UNITS
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    await UNITS.refresh()
+
+    consumer = None
+    if CONFIG.RUN_DIET_JOB_CONSUMER:
+        consumer = asyncio.create_task(jobs.consume_diet_jobs(SOLVER.PROCESSES))
+
+    yield
+
+    if consumer is not None:
+        consumer.cancel()
+        with suppress(asyncio.CancelledError):
+            await consumer
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(graphql_app, prefix="/graphql")
 app.add_middleware(
     CORSMiddleware,
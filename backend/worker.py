@@ -0,0 +1,29 @@
+import asyncio
+import logging
+import signal
+
+from app import jobs
+from app.solver import SOLVER
+from app.units import UNITS
+
+
+async def main():
+    await UNITS.refresh()
+    consumer = asyncio.create_task(jobs.consume_diet_jobs(SOLVER.PROCESSES))
+
+    # stop pulling jobs on shutdown and let the running ones finish, anything
+    # still unacked when the pod is killed is reclaimed by another worker
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, consumer.cancel)
+
+    logging.info(f"Solver worker consuming diet jobs with {SOLVER.PROCESSES} processes")
+    try:
+        await consumer
+    except asyncio.CancelledError:
+        logging.info("Solver worker stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -6,14 +6,19 @@ import {
   CardHeader,
   CardTitle,
 } from "@/components/ui/card";
-import { useGraphQLMutation } from "@/lib/graphql";
+import { useGraphQLMutation, useGraphQLQuery } from "@/lib/graphql";
 import { generateDietOutputMutaiton } from "@/lib/mutations/generate-diet-output";
+import {
+  getDietOutputVersionKey,
+  getDietOutputVersionQuery,
+} from "@/lib/queries/get-diet-output-version";
 import { IconRepeat } from "@tabler/icons-react";
-import { useMutation } from "@tanstack/react-query";
+import { useMutation, useQuery } from "@tanstack/react-query";
 import { useDiet } from "./use-diet";
 import { toast } from "sonner";
 import {
   DietIngredientOutput,
+  DietOutputStatus,
   DietOutputVersion,
   Ingredient,
 } from "@/lib/gql/graphql";
@@ -24,6 +29,17 @@ import "ag-grid-community/styles/ag-theme-quartz.css";
 import { Badge } from "@/components/ui/badge";
 import { ClipLoader } from "react-spinners";
 
+// how often to check on a queued or running output version
+const OUTPUT_POLL_INTERVAL_MS = 1000;
+
+function isFinished(status?: DietOutputStatus | null): boolean {
+  return (
+    !!status &&
+    status !== DietOutputStatus.Queued &&
+    status !== DietOutputStatus.Running
+  );
+}
+
 function getTotals(output: DietOutputVersion): DietIngredientOutput {
   // weighted sums of all rows
   const weights = output.ingredientOutputs.reduce((acc, output) => {
@@ -139,25 +155,77 @@ export function Output() {
       filter: true,
     },
   ]);
+  // the output version being generated, until it reaches a final status
+  const [pendingOutputId, setPendingOutputId] = useState<string | null>(null);
   const generateDietOutput = useGraphQLMutation(generateDietOutputMutaiton);
   const mutation = useMutation({
     ...generateDietOutput,
     onSuccess: (data) => {
-      toast.success("Diet regenerated successfully.");
-      console.log(data);
-      setOutput(data.generateDietOutput as DietOutputVersion);
+      setPendingOutputId(data.generateDietOutput.id);
     },
     onError: (error) => {
       toast.error("Failed to regenerate diet.");
     },
   });
+  const getDietOutputVersion = useGraphQLQuery(getDietOutputVersionQuery, {
+    outputVersionId: pendingOutputId ?? "",
+  });
+  const pendingOutput = useQuery({
+    ...getDietOutputVersion,
+    queryKey: getDietOutputVersionKey({
+      outputVersionId: pendingOutputId ?? "",
+    }),
+    enabled: pendingOutputId !== null,
+    refetchInterval: (query) => {
+      const version = query.state.data?.node as DietOutputVersion | undefined;
+      return isFinished(version?.status) ? false : OUTPUT_POLL_INTERVAL_MS;
+    },
+  });
+
+  useEffect(() => {
+    const version = pendingOutput.data?.node as DietOutputVersion | undefined;
+    if (pendingOutputId === null || !isFinished(version?.status)) {
+      return;
+    }
+
+    setPendingOutputId(null);
+    setOutput(version as DietOutputVersion);
+    if (
+      version?.status === DietOutputStatus.Optimal ||
+      version?.status === DietOutputStatus.Feasible
+    ) {
+      toast.success("Diet regenerated successfully.");
+    } else {
+      toast.error(`Diet regeneration finished as ${version?.status}.`);
+    }
+  }, [pendingOutput.data, pendingOutputId, setOutput]);
+
+  useEffect(() => {
+    if (pendingOutput.isError) {
+      setPendingOutputId(null);
+      toast.error("Failed to regenerate diet.");
+    }
+  }, [pendingOutput.isError]);
+
+  useEffect(() => {
+    // pick a solve that was still going when the diet loaded back up
+    if (output && !isFinished(output.status) && pendingOutputId === null) {
+      setPendingOutputId(output.id);
+    }
+  }, [output, pendingOutputId]);
 
   useEffect(() => {
     if (output) {
-      setRows([...output.ingredientOutputs, getTotals(output)]);
+      setRows(
+        output.ingredientOutputs.length > 0
+          ? [...output.ingredientOutputs, getTotals(output)]
+          : []
+      );
     }
   }, [output]);
 
+  const isGenerating = mutation.isPending || pendingOutputId !== null;
+
   async function handleRegenerate() {
     await mutation.mutateAsync({
       input: {
@@ -181,7 +249,7 @@ export function Output() {
             <Button
               size="sm"
               className="flex items-center space-x-2"
-              loading={mutation.isPending}
+              loading={isGenerating}
               onClick={handleRegenerate}
             >
               <IconRepeat size={16} />
@@ -191,7 +259,7 @@ export function Output() {
         </div>
       </CardHeader>
       <CardContent>
-        {mutation.isPending && (
+        {isGenerating && (
           <div className="flex justify-center p-20 h-[500px]">
             <ClipLoader />
           </div>
@@ -201,7 +269,7 @@ export function Output() {
             <p>Error generating output</p>
           </div>
         )}
-        {!(mutation.isPending || mutation.isError) && output && (
+        {!(isGenerating || mutation.isError) && output && (
           <div className="w-full h-[500px] ag-theme-quartz">
             <AgGridReact columnDefs={columns} rowData={rows} rowHeight={32} />
           </div>
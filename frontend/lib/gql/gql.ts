@@ -37,7 +37,7 @@ const documents = {
     "\nmutation DeleteProfileNutrientConstraint($input: DeleteNodeInput!) {\n  deleteProfileNutrientConstraint(input: $input) {\n    success\n  }\n}\n": types.DeleteProfileNutrientConstraintDocument,
     "\nmutation DeleteProfileNutrientValueMutation($input: DeleteNodeInput!) {\n  deleteProfileNutrientValue(input: $input) {\n    success\n  }\n}\n": types.DeleteProfileNutrientValueMutationDocument,
     "\nmutation DeleteProfile($input: DeleteNodeInput!) {\n  deleteProfile(input: $input) {\n    success\n  }\n}\n": types.DeleteProfileDocument,
-    "\n  mutation GenerateDietOutput($input: GenerateDietOutputInput!) {\n    generateDietOutput(input: $input) {\n      id\n      status\n      version\n      ingredientOutputs {\n        id\n        ingredient {\n          name\n        }\n        cost\n        costUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        amount\n        amountUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        grossEnergy\n        grossEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        digestibleEnergy\n        digestibleEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        metabolizableEnergy\n        metabolizableEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        netEnergy\n        netEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n      }\n    }\n  }\n": types.GenerateDietOutputDocument,
+    "\n  mutation GenerateDietOutput($input: GenerateDietOutputInput!) {\n    generateDietOutput(input: $input) {\n      id\n      status\n      version\n    }\n  }\n": types.GenerateDietOutputDocument,
     "\n  mutation UpdateDietProfiles($input: UpdateDietProfilesInput!) {\n    updateDietProfiles(input: $input) {\n      id\n    }\n  }\n": types.UpdateDietProfilesDocument,
     "\n  mutation UpdateDiet($input: UpdateDietInput!) {\n    updateDiet(input: $input) {\n      id\n    }\n  }\n": types.UpdateDietDocument,
     "\nmutation UpdateIngredientCategory($input: UpdateIngredientCategoryInput!) {\n  updateIngredientCategory(input: $input) {\n    id\n  }\n}\n": types.UpdateIngredientCategoryDocument,
@@ -56,6 +56,7 @@ const documents = {
     "\nquery GetAllNutrientsAndCategories {\n  nutrients {\n    edges {\n      node {\n        id\n        name\n        description\n        managed\n        nutrientCategoryId\n      }\n    }\n  }\n  nutrientCategories {\n    edges {\n      node {\n        id\n        name\n        description\n        parentNutrientCategoryId\n        managed\n      }\n    }\n  }\n}\n": types.GetAllNutrientsAndCategoriesDocument,
     "\nquery GetAllProfiles {\n  profiles {\n    edges {\n      node {\n        id\n        name\n        description\n        managed\n      }\n    }\n  }\n}\n": types.GetAllProfilesDocument,
     "\n  query GetAllUnits {\n    units {\n      edges {\n        node {\n          id\n          name\n          type\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n      }\n    }\n  }\n": types.GetAllUnitsDocument,
+    "\n  query GetDietOutputVersion($outputVersionId: GlobalID!) {\n    node(id: $outputVersionId) {\n      ... on DietOutputVersion {\n        id\n        status\n        version\n        ingredientOutputs {\n          id\n          ingredient {\n            name\n          }\n          cost\n          costUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          amount\n          amountUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          grossEnergy\n          grossEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          digestibleEnergy\n          digestibleEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          metabolizableEnergy\n          metabolizableEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          netEnergy\n          netEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n        }\n      }\n    }\n  }\n": types.GetDietOutputVersionDocument,
     "\n  query GetDiet($dietId: GlobalID!) {\n    node(id: $dietId) {\n      ... on Diet {\n        id\n        name\n        description\n        latestConfigurationVersion {\n          profiles {\n            id\n            name\n            description\n          }\n        }\n        latestOutputVersion {\n          id\n          status\n          version\n          ingredientOutputs {\n            id\n            ingredient {\n              name\n            }\n            cost\n            costUnit {\n              symbol\n              baseUnitMultiplier\n              baseUnitOffset\n            }\n            amount\n            amountUnit {\n              symbol\n              baseUnitMultiplier\n              baseUnitOffset\n            }\n            grossEnergy\n            grossEnergyUnit {\n              symbol\n              baseUnitMultiplier\n              baseUnitOffset\n            }\n            digestibleEnergy\n            digestibleEnergyUnit {\n              symbol\n              baseUnitMultiplier\n              baseUnitOffset\n            }\n            metabolizableEnergy\n            metabolizableEnergyUnit {\n              symbol\n              baseUnitMultiplier\n              baseUnitOffset\n            }\n            netEnergy\n            netEnergyUnit {\n              symbol\n              baseUnitMultiplier\n              baseUnitOffset\n            }\n          }\n        }\n      }\n    }\n  }\n": types.GetDietDocument,
     "\n  query GetProfile($profileId: GlobalID!) {\n    node(id: $profileId) {\n      ... on Profile {\n        id\n        name\n        description\n        ingredientConstraints {\n          id\n          type\n          mode\n          operator\n          literalValue\n          ingredient {\n            id\n            name\n          }\n          ingredientCategory {\n            id\n            name\n          }\n          literalUnit {\n            id\n            symbol\n          }\n          referenceIngredient {\n            id\n            name\n          }\n          referenceIngredientCategory {\n            id\n            name\n          }\n        }\n        nutrientConstraints {\n          id\n          type\n          mode\n          operator\n          literalValue\n          nutrient {\n            id\n            name\n          }\n          nutrientCategory {\n            id\n            name\n          }\n          literalUnit {\n            id\n            symbol\n          }\n          referenceNutrient {\n            id\n            name\n          }\n          referenceNutrientCategory {\n            id\n            name\n          }\n        }\n        ingredientNutrientValues {\n          id\n          value\n          unit {\n            id\n            symbol\n          }\n          ingredient {\n            id\n            name\n          }\n          nutrient {\n            id\n            name\n          }\n        }\n        nutrientValues {\n          id\n          grossEnergy\n          digestibleEnergy\n          metabolizableEnergy\n          netEnergy\n          nutrient {\n            id\n            name\n          }\n          grossEnergyUnit {\n            id\n            symbol\n          }\n          digestibleEnergyUnit {\n            id\n            symbol\n          }\n          metabolizableEnergyUnit {\n            id\n            symbol\n          }\n          netEnergyUnit {\n            id\n            symbol\n          }\n        }\n        ingredientCosts {\n          id\n          mode\n          ingredient {\n            id\n            name\n          }\n          literalCost\n          literalCostUnit {\n            id\n            symbol\n          }\n        }\n        constraints {\n          id\n          type\n          mode\n          operator\n          literalValue\n          literalUnit {\n            id\n            symbol\n          }\n        }\n      }\n    }\n  }\n": types.GetProfileDocument,
 };
@@ -173,7 +174,7 @@ export function graphql(source: "\nmutation DeleteProfile($input: DeleteNodeInpu
 /**
  * The graphql function is used to parse GraphQL queries into a document that can be used by GraphQL clients.
  */
-export function graphql(source: "\n  mutation GenerateDietOutput($input: GenerateDietOutputInput!) {\n    generateDietOutput(input: $input) {\n      id\n      status\n      version\n      ingredientOutputs {\n        id\n        ingredient {\n          name\n        }\n        cost\n        costUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        amount\n        amountUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        grossEnergy\n        grossEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        digestibleEnergy\n        digestibleEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        metabolizableEnergy\n        metabolizableEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        netEnergy\n        netEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n      }\n    }\n  }\n"): (typeof documents)["\n  mutation GenerateDietOutput($input: GenerateDietOutputInput!) {\n    generateDietOutput(input: $input) {\n      id\n      status\n      version\n      ingredientOutputs {\n        id\n        ingredient {\n          name\n        }\n        cost\n        costUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        amount\n        amountUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        grossEnergy\n        grossEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        digestibleEnergy\n        digestibleEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        metabolizableEnergy\n        metabolizableEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n        netEnergy\n        netEnergyUnit {\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n      }\n    }\n  }\n"];
+export function graphql(source: "\n  mutation GenerateDietOutput($input: GenerateDietOutputInput!) {\n    generateDietOutput(input: $input) {\n      id\n      status\n      version\n    }\n  }\n"): (typeof documents)["\n  mutation GenerateDietOutput($input: GenerateDietOutputInput!) {\n    generateDietOutput(input: $input) {\n      id\n      status\n      version\n    }\n  }\n"];
 /**
  * The graphql function is used to parse GraphQL queries into a document that can be used by GraphQL clients.
  */
@@ -246,6 +247,10 @@ export function graphql(source: "\nquery GetAllProfiles {\n  profiles {\n    edg
  * The graphql function is used to parse GraphQL queries into a document that can be used by GraphQL clients.
  */
 export function graphql(source: "\n  query GetAllUnits {\n    units {\n      edges {\n        node {\n          id\n          name\n          type\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n      }\n    }\n  }\n"): (typeof documents)["\n  query GetAllUnits {\n    units {\n      edges {\n        node {\n          id\n          name\n          type\n          symbol\n          baseUnitMultiplier\n          baseUnitOffset\n        }\n      }\n    }\n  }\n"];
+/**
+ * The graphql function is used to parse GraphQL queries into a document that can be used by GraphQL clients.
+ */
+export function graphql(source: "\n  query GetDietOutputVersion($outputVersionId: GlobalID!) {\n    node(id: $outputVersionId) {\n      ... on DietOutputVersion {\n        id\n        status\n        version\n        ingredientOutputs {\n          id\n          ingredient {\n            name\n          }\n          cost\n          costUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          amount\n          amountUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          grossEnergy\n          grossEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          digestibleEnergy\n          digestibleEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          metabolizableEnergy\n          metabolizableEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          netEnergy\n          netEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n        }\n      }\n    }\n  }\n"): (typeof documents)["\n  query GetDietOutputVersion($outputVersionId: GlobalID!) {\n    node(id: $outputVersionId) {\n      ... on DietOutputVersion {\n        id\n        status\n        version\n        ingredientOutputs {\n          id\n          ingredient {\n            name\n          }\n          cost\n          costUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          amount\n          amountUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          grossEnergy\n          grossEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          digestibleEnergy\n          digestibleEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          metabolizableEnergy\n          metabolizableEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n          netEnergy\n          netEnergyUnit {\n            symbol\n            baseUnitMultiplier\n            baseUnitOffset\n          }\n        }\n      }\n    }\n  }\n"];
 /**
  * The graphql function is used to parse GraphQL queries into a document that can be used by GraphQL clients.
  */
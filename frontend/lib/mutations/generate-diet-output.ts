@@ -6,48 +6,6 @@ export const generateDietOutputMutaiton = graphql(`
       id
       status
       version
-      ingredientOutputs {
-        id
-        ingredient {
-          name
-        }
-        cost
-        costUnit {
-          symbol
-          baseUnitMultiplier
-          baseUnitOffset
-        }
-        amount
-        amountUnit {
-          symbol
-          baseUnitMultiplier
-          baseUnitOffset
-        }
-        grossEnergy
-        grossEnergyUnit {
-          symbol
-          baseUnitMultiplier
-          baseUnitOffset
-        }
-        digestibleEnergy
-        digestibleEnergyUnit {
-          symbol
-          baseUnitMultiplier
-          baseUnitOffset
-        }
-        metabolizableEnergy
-        metabolizableEnergyUnit {
-          symbol
-          baseUnitMultiplier
-          baseUnitOffset
-        }
-        netEnergy
-        netEnergyUnit {
-          symbol
-          baseUnitMultiplier
-          baseUnitOffset
-        }
-      }
     }
   }
 `);
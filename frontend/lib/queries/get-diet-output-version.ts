@@ -0,0 +1,61 @@
+import { graphql } from "../gql";
+
+export const getDietOutputVersionQuery = graphql(`
+  query GetDietOutputVersion($outputVersionId: GlobalID!) {
+    node(id: $outputVersionId) {
+      ... on DietOutputVersion {
+        id
+        status
+        version
+        ingredientOutputs {
+          id
+          ingredient {
+            name
+          }
+          cost
+          costUnit {
+            symbol
+            baseUnitMultiplier
+            baseUnitOffset
+          }
+          amount
+          amountUnit {
+            symbol
+            baseUnitMultiplier
+            baseUnitOffset
+          }
+          grossEnergy
+          grossEnergyUnit {
+            symbol
+            baseUnitMultiplier
+            baseUnitOffset
+          }
+          digestibleEnergy
+          digestibleEnergyUnit {
+            symbol
+            baseUnitMultiplier
+            baseUnitOffset
+          }
+          metabolizableEnergy
+          metabolizableEnergyUnit {
+            symbol
+            baseUnitMultiplier
+            baseUnitOffset
+          }
+          netEnergy
+          netEnergyUnit {
+            symbol
+            baseUnitMultiplier
+            baseUnitOffset
+          }
+        }
+      }
+    }
+  }
+`);
+
+export const getDietOutputVersionKey = ({
+  outputVersionId,
+}: {
+  outputVersionId: string;
+}) => ["GetDietOutputVersion", { outputVersionId }];